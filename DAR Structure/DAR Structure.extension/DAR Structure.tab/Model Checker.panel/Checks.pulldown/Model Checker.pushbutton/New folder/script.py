@@ -7,10 +7,40 @@ __title__ = "Model Checker with XML"
 __author__ = "Your Name"
 
 # Imports
-from pyrevit import forms, script
+from pyrevit import forms, script, revit, DB
+from System import Enum
 import os
+import re
+import sys
+import time
 import xml.etree.ElementTree as ET  # For parsing XML templates
 
+# Custom modules in lib/
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "lib"))
+from template_store import session_store
+from rule_utils import required_fields, CategoryIndex, check_categories, skip_checks
+from bitset_utils import evaluate_shared
+from snapshot_utils import SnapshotCollector, write_snapshot
+from parallel_utils import evaluate_in_helper, find_python
+from incremental_utils import ResultStore, evaluate_incremental, store_path
+from profile_utils import CheckProfiler, profile_path, slowest_table
+from planner_utils import plan_checks
+from report_utils import ReportWriter
+from chunk_utils import evaluate_chunked, batch_size_setting
+from template_lint import TemplateError
+
+# Snapshots of this size are evaluated in a CPython helper with a worker pool
+PARALLEL_MIN_ELEMENTS = 20000
+
+# Snapshots of this size have their filters reordered by sampled selectivity
+PLAN_MIN_ELEMENTS = 20000
+
+# Columns of the failing element tables of the report
+REPORT_COLUMNS = ["Element Id", "Category", "Family", "Type", "Level"]
+
+# Template errors listed in the alert, the rest are printed
+ALERT_ERRORS = 10
+
 # Step 1: Prompt user to select between Structural Concrete or Structural Steel
 structure_type = forms.alert(
     "Select Structure Type", 
@@ -47,70 +77,187 @@ def get_xml_path(structure, template):
         return xml_paths_steel.get(template)
     return None
 
-# Step 5: Function to parse XML and extract checks
+# Step 5a: Function to let the user pick the template sections to run
+def select_sections(template):
+    """Show the section outline of the template and return the selected sections."""
+    options = {}
+    for heading, section in template.iter_sections():
+        if not section.check_count:
+            continue
+        label = "{0}. {1} / {2} ({3} checks)".format(
+            len(options) + 1, heading.text, section.full_name, section.check_count)
+        options[label] = section
+    selected = forms.SelectFromList.show(
+        sorted(options.keys(), key=lambda label: options[label].position),
+        title="Select Sections to Check",
+        width=600,
+        button_name="Run Checks",
+        multiselect=True)
+    return [options[label] for label in selected or []]
+
+
+# Step 5b: Function to parse XML and compile checks
 def parse_xml_for_checks(xml_file):
-    """Parse the XML file to extract model check rules."""
+    """Read the template (from the local cache if unchanged) and compile the checks of the selected sections."""
     checks = []
     try:
-        # Print the first few lines of the file for debugging
-        with open(xml_file, 'r') as f:
-            print("File contents (first 100 characters):", f.read(100))
-        
-        # Check if file is readable and contains valid XML structure
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        
-        # Assume XML contains 'Check' elements with a 'Name' attribute and 'Condition' elements
-        for check in root.findall('Check'):
-            check_name = check.get('Name')
-            condition = check.find('Condition').text
-            checks.append((check_name, condition))
-    
+        # Templates on the K: share are only parsed and linted again when their content
+        # changes, checks shared between templates are built and compiled once per session.
+        # A cache miss parses the outline only, the checks of the picked sections are
+        # read afterwards and added to the cache
+        store = session_store()
+        template = store.load(xml_file, set(Enum.GetNames(DB.BuiltInCategory)))
+        sections = select_sections(template)
+
+        # Every filter of the enabled checks of the picked sections is validated
+        # before the model is touched; only a malformed template stops the run,
+        # checks with bad filters are skipped and reported
+        positions = [section.position for section in sections]
+        for problem in template.lint.warnings(sections=positions):
+            print(problem)
+        template.lint.raise_errors(sections=positions)
+        store.expand(template, sections)
+        checks = [store.compile(spec) for section in sections
+                  for spec in section.checks if spec.is_checked]
+        checks = skip_checks(checks, template.lint.skipped_checks(positions))
+    except TemplateError as e:
+        for problem in e.problems:
+            print(problem)
+        lines = [str(problem) for problem in e.problems[:ALERT_ERRORS]]
+        if len(e.problems) > ALERT_ERRORS:
+            lines.append("... {0} more, see the output window".format(
+                len(e.problems) - ALERT_ERRORS))
+        forms.alert("Template {0} is malformed:\n{1}".format(xml_file, "\n".join(lines)),
+                    title="Template Error", warn_icon=True)
     except ET.ParseError as e:
         forms.alert("Error parsing XML file: {0}".format(e), title="XML Error", warn_icon=True)
     except IOError as e:
         forms.alert("File error: {0}".format(e), title="File Error", warn_icon=True)
     except Exception as e:
         forms.alert("Unexpected error: {0}".format(e), title="Unexpected Error", warn_icon=True)
-    
+
     return checks
 
 
-def run_model_checks_from_xml(xml_file_path):
-    """Run model checks based on an XML template."""
-    if not os.path.exists(xml_file_path):
-        forms.alert("The specified XML file does not exist: {0}".format(xml_file_path), 
-                    title="File Not Found", warn_icon=True)
-        return
+# Step 5c: Function to limit the checks to the categories that were modified
+def select_recheck_checks(checks):
+    """Ask for a full run, a low memory run, a snapshot export or a recheck of some categories.
 
-    # Parse the XML file for checks
-    checks = parse_xml_for_checks(xml_file_path)
-    
-    if not checks:
-        forms.alert("No checks found in the XML file.", title="No Checks", warn_icon=True)
-        return
-
-    # Run checks and output the result
-    for check_name, condition in checks:
-        # Placeholder for running the actual check - logic will depend on Revit API specifics
-        print("Running check: {0} with condition: {1}".format(check_name, condition))
-        # Simulate running the check (this would be integrated with Revit API in a real scenario)
-        # result = run_check_in_revit(check_name, condition)
-        # print("Check result for {0}: {1}".format(check_name, result))
-
-
-# Example of setting an XML file path, modify as needed
-xml_template_path = os.path.join(os.path.dirname(__file__), 
-                                 "Templates", 
-                                 "0-GN", 
-                                 "DAR_GN_Revit Model Quality Checks.xml")
-
-print("XML Path:", xml_template_path)
-
-# Run the checks using the XML file
-run_model_checks_from_xml(xml_template_path)# Step 6: Function to run checks based on XML template
-def run_model_checks_from_xml(structure, template):
-    """Run compliance checks based on structure and XML template selection."""
+    Returns the checks to run and the run mode: "Full Run", "Low Memory Run" (evaluate in
+    element batches) or "Export Snapshot" (write the element records for batch_utils).
+    """
+    mode = forms.CommandSwitchWindow.show(
+        ["Full Run", "Low Memory Run", "Export Snapshot", "Recheck Categories"],
+        message="Select run mode:")
+    if mode in ("Low Memory Run", "Export Snapshot"):
+        return checks, mode
+    if mode != "Recheck Categories":
+        return checks, "Full Run"
+
+    index = CategoryIndex(checks)
+    categories = forms.SelectFromList.show(
+        index.categories,
+        title="Select Modified Categories",
+        width=500,
+        button_name="Recheck",
+        multiselect=True)
+    if not categories:
+        return checks, "Full Run"
+    return index.affected_checks(categories), "Full Run"
+
+
+# Step 5d: Function to evaluate checks, in a worker pool for large snapshots
+def evaluate_elements(checks, elements, profiler=None, full=False, tables=None):
+    """Evaluate the checks on element records and return their CheckResults."""
+    # Only an interpreter that passed a short probe is used, e.g. not the WindowsApps stub
+    python = find_python() if len(elements) >= PARALLEL_MIN_ELEMENTS else None
+    if python:
+        try:
+            return evaluate_in_helper(checks, elements, python=python, profiler=profiler,
+                                      full=full, tables=tables)
+        except (RuntimeError, OSError) as e:
+            print("Parallel evaluation failed, evaluating in Revit: {0}".format(e))
+    return evaluate_shared(checks, elements, profiler=profiler, full=full, tables=tables)
+
+
+# Step 5e: Function to report the slowest checks of a run
+def report_profile(profiler, template):
+    """Write the check profile of the run to JSONL and show the 20 slowest checks."""
+    path = profile_path(template)
+    try:
+        profiler.write_jsonl(path)
+    except (IOError, OSError) as e:
+        print("Check profile could not be written: {0}".format(e))
+        path = None
+    rows, columns = slowest_table(profiler, 20)
+    if rows:
+        script.get_output().print_table(
+            table_data=rows,
+            columns=columns,
+            title="Top 20 Slowest Checks ({0:.1f} s in total)".format(profiler.total_seconds))
+    if path:
+        print("Check profile: {0}".format(path))
+
+
+# Step 5f: Function to export the element records of the checks for headless batch runs
+def export_snapshot(collector, save_folder):
+    """Write the element records and the workset/phase tables to a snapshot file.
+
+    The snapshot holds the elements and values the selected checks read, so it can be
+    checked outside of Revit with batch_utils and a template of the same checks; the batch
+    reports have to go to another folder.
+    Returns the path of the snapshot file.
+    """
+    title = revit.doc.Title
+    name = re.sub(r"[^\w.-]+", "_", os.path.splitext(title)[0]).strip("_") or "model"
+    path = os.path.join(save_folder, name + ".jsonl")
+    # The tables are only complete once every element was read, they go to the header line
+    elements = list(collector.iter_elements())
+    # The header lists what was collected, batch runs skip checks reading anything else
+    header = collector.contents()
+    count = write_snapshot(path, elements, collector.tables, model=title,
+                           model_path=revit.doc.PathName,
+                           created=time.strftime("%Y-%m-%dT%H:%M:%S"), **header)
+    print("{0} elements written to {1}".format(count, path))
+    return path
+
+
+# Step 6: Function to describe failing elements in the report tables
+def element_describer(elements):
+    """Return a function giving the report columns of an element id."""
+    records = dict((element["id"], element) for element in elements)
+
+    def describe(element_id):
+        element = records.get(element_id)
+        if element is None:
+            return [element_id, "", "", "", ""]
+        return [element_id, element["category_name"], element["family"],
+                element["type_name"], element["level"]]
+    return describe
+
+
+# Step 7: Function to open the HTML report and the JSONL file in the selected folder
+def open_report(save_folder, structure, template, elements):
+    """Return a ReportWriter the results are streamed to while the checks run."""
+    report_name = "Model_Check_Report_{0}_{1}".format(structure, template)
+    details = [("Structure Type", structure),
+               ("Template Type", template),
+               ("XML Path", get_xml_path(structure, template))]
+    return ReportWriter(os.path.join(save_folder, report_name + ".html"),
+                        "Model Checker Report", details,
+                        jsonl_path=os.path.join(save_folder, report_name + ".jsonl"),
+                        describe=element_describer(elements),
+                        columns=REPORT_COLUMNS)
+
+
+# Step 8: Function to run checks based on XML template
+def run_model_checks_from_xml(structure, template, save_folder):
+    """Run compliance checks based on structure and XML template selection.
+
+    Every check result is written to the report as soon as it is known.
+    Returns the path of the HTML report, or None when no checks were run or
+    a snapshot was exported instead.
+    """
     xml_path = get_xml_path(structure, template)
     
     # Debugging: Print XML Path for reference
@@ -122,77 +269,80 @@ def run_model_checks_from_xml(structure, template):
         xml_path = forms.pick_file(file_ext='xml', title="Select the XML Template")
     
     if not xml_path:
-        return "XML template path not found or not selected. Exiting."
+        forms.alert("XML template path not found or not selected. Exiting.", title="No Template")
+        return None
 
     # Parse the XML template to get checks
     checks = parse_xml_for_checks(xml_path)
     
     if not checks:
-        return "No checks found in the XML template."
-
-    # Placeholder logic for applying the checks (to be customized)
-    check_results = []
-    for check_name, condition in checks:
-        # Example: Check could be applied using Revit API logic here
-        # Assuming all checks are passing for demonstration
-        check_result = "Pass" if condition == "True" else "Fail"  # Example evaluation, replace with real logic
-        check_results.append((check_name, check_result))
-    
-    return check_results
+        forms.alert("No checks found in the XML template.", title="No Checks", warn_icon=True)
+        return None
 
-# Step 7: Run the selected model checks
-check_results = []
-if structure_type and template_type:
-    check_results = run_model_checks_from_xml(structure_type, template_type)
+    checks, mode = select_recheck_checks(checks)
+
+    # Collect the parameters the checks need once, then evaluate every distinct filter once
+    parameter_names, api_names = required_fields(checks)
+    collector = SnapshotCollector(revit.doc, parameter_names, api_names,
+                                  check_categories(checks))
+    if mode == "Export Snapshot":
+        snapshot_file = export_snapshot(collector, save_folder)
+        forms.alert("Snapshot saved at {0}".format(snapshot_file), title="Snapshot Exported")
+        return None
+
+    profiler = CheckProfiler()
+    if mode == "Low Memory Run":
+        # Elements are read and evaluated in batches and dropped, only the results are kept;
+        # no element records are left for the report tables or the incremental store
+        batch_size = batch_size_setting()
+        with open_report(save_folder, structure, template, []) as writer:
+            run = evaluate_chunked(
+                checks, collector.iter_elements(), batch_size,
+                tables=collector.tables, profiler=profiler,
+                on_result=lambda index, result: writer.write_result(result))
+        print("{0} elements evaluated in {1} batches of {2}{3}".format(
+            run.elements, run.batches, batch_size,
+            ", stopped early" if run.stopped else ""))
+        report_profile(profiler, template)
+        return writer.html_path
 
-# Step 8: Prompt user to select a folder to save the HTML report
-save_folder = forms.pick_folder(title="Select Folder to Save HTML Report")
+    elements = list(collector.iter_elements())
+    if len(elements) >= PLAN_MIN_ELEMENTS:
+        checks = plan_checks(checks, elements, tables=collector.tables)
 
-# Step 9: Save the results to an HTML file in the selected folder
+    # Only elements changed since the last run of this model with the same checks are
+    # evaluated again
+    store = ResultStore(store_path(revit.doc.PathName or revit.doc.Title, checks))
+    with open_report(save_folder, structure, template, elements) as writer:
+        run = evaluate_incremental(
+            checks, elements, store,
+            lambda run_checks, run_elements, full=False: evaluate_elements(
+                run_checks, run_elements, profiler, full, collector.tables),
+            tables=collector.tables,
+            on_result=lambda index, result, delta: writer.write_result(
+                result, len(delta.new), len(delta.resolved)))
+    try:
+        store.save()
+    except (IOError, OSError) as e:
+        print("Results of this run could not be stored: {0}".format(e))
+    print("{0} of {1} elements evaluated, {2} removed since the last run".format(
+        run.evaluated, len(elements), run.removed))
+    report_profile(profiler, template)
+    return writer.html_path
+
+# Step 9: Prompt user to select a folder to save the HTML report before the checks run
+save_folder = None
+if structure_type and template_type:
+    save_folder = forms.pick_folder(title="Select Folder to Save HTML Report")
+    if not save_folder:
+        forms.alert("No folder selected. Exiting the script.", title="Report Not Saved", warn_icon=True)
+
+# Step 10: Run the selected model checks, streaming the results to an HTML report and a
+# JSONL file in the selected folder
 if save_folder:
-    report_file = os.path.join(save_folder, "Model_Check_Report_{0}_{1}.html".format(structure_type, template_type))
-    
-    # Generate HTML content with dynamic check results
-    html_content = (
-        "<!DOCTYPE html>\n"
-        "<html>\n"
-        "<head>\n"
-        "    <meta charset=\"UTF-8\">\n"
-        "    <title>Model Checker Report - {0} - {1}</title>\n"
-        "    <style>\n"
-        "        body {{ font-family: Arial, sans-serif; background-color: #f4f4f9; color: #333; }}\n"
-        "        h1 {{ color: #00539C; }}\n"
-        "        table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}\n"
-        "        table, th, td {{ border: 1px solid #ccc; padding: 8px; }}\n"
-        "        th {{ background-color: #f4f4f4; color: #00539C; }}\n"
-        "        td {{ text-align: left; }}\n"
-        "    </style>\n"
-        "</head>\n"
-        "<body>\n"
-        "    <h1>Model Checker Report</h1>\n"
-        "    <p>Structure Type: {0}</p>\n"
-        "    <p>Template Type: {1}</p>\n"
-        "    <p>XML Path: {2}</p>\n"
-        "    <h2>Check Results</h2>\n"
-        "    <table>\n"
-        "        <tr><th>Check Name</th><th>Result</th></tr>\n"
-    ).format(structure_type, template_type, get_xml_path(structure_type, template_type))
-    
-    # Add check results to HTML table
-    for check_name, check_result in check_results:
-        html_content += "<tr><td>{0}</td><td>{1}</td></tr>\n".format(check_name, check_result)
-    
-    html_content += (
-        "    </table>\n"
-        "    <p>Generated by Model Checker Automation Script</p>\n"
-        "</body>\n"
-        "</html>\n"
-    )
-    
-    # Write the HTML content to the file
-    with open(report_file, 'w') as f:
-        f.write(html_content)
-    
-    forms.alert("HTML Report saved at {0}".format(report_file), title="Report Generated")
-else:
-    forms.alert("No folder selected. Exiting the script.", title="Report Not Saved", warn_icon=True)
+    try:
+        report_file = run_model_checks_from_xml(structure_type, template_type, save_folder)
+        if report_file:
+            forms.alert("HTML Report saved at {0}".format(report_file), title="Report Generated")
+    except (IOError, OSError) as e:
+        forms.alert("Report could not be written: {0}".format(e), title="Report Not Saved", warn_icon=True)
@@ -0,0 +1,85 @@
+""" Benchmark parallel check evaluation on a synthetic snapshot
+
+Usage:
+    python bench_parallel.py [--elements N] [--workers 1,2,4,...] [template]
+
+Writes a synthetic snapshot shaped by the template checks (iLOD SC by
+default), evaluates all checks in this process and then with worker pools
+of the given sizes, and verifies every run finds the same elements. Runs
+headless, no Revit needed.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+from __future__ import print_function
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUNDLE = os.path.dirname(HERE)
+sys.path.insert(0, os.path.join(BUNDLE, "lib"))
+
+from template_utils import load_template  # noqa: E402
+from rule_utils import compile_template  # noqa: E402
+from bitset_utils import evaluate_shared  # noqa: E402
+from snapshot_utils import read_snapshot, write_snapshot  # noqa: E402
+from synthetic_utils import synthetic_elements  # noqa: E402
+from parallel_utils import evaluate_parallel  # noqa: E402
+
+DEFAULT_TEMPLATE = os.path.join(BUNDLE, "Templates", "SC",
+                                "SC-iLOD and Standard Checks.xml")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("template", nargs="?", default=DEFAULT_TEMPLATE)
+    parser.add_argument("--elements", type=int, default=50000)
+    parser.add_argument("--workers", default=None,
+                        help="comma separated pool sizes (1,2,4,... cores)")
+    args = parser.parse_args()
+    if args.workers:
+        pools = [int(size) for size in args.workers.split(",")]
+    else:
+        pools = [1]
+        while pools[-1] * 2 <= multiprocessing.cpu_count():
+            pools.append(pools[-1] * 2)
+
+    checks = compile_template(load_template(args.template))
+    folder = tempfile.mkdtemp(prefix="mc_bench_")
+    try:
+        snapshot_path = os.path.join(folder, "snapshot.jsonl")
+        start = time.time()
+        write_snapshot(snapshot_path,
+                       synthetic_elements(args.elements, checks))
+        print("{} checks, {} elements, snapshot written in {:.1f}s".format(
+            len(checks), args.elements, time.time() - start))
+
+        start = time.time()
+        expected = evaluate_shared(checks, read_snapshot(snapshot_path))
+        serial = time.time() - start
+        expected = [(result.status, result.element_ids)
+                    for result in expected]
+        row = "{:>8} {:>10} {:>8} {:>6}"
+        print(row.format("Workers", "Seconds", "Speedup", "Same"))
+        print(row.format("serial", "{:.2f}".format(serial), "1.0x", "yes"))
+        for workers in pools:
+            start = time.time()
+            results = evaluate_parallel(checks, snapshot_path, workers)
+            elapsed = time.time() - start
+            same = [(result.status, result.element_ids)
+                    for result in results] == expected
+            print(row.format(workers, "{:.2f}".format(elapsed),
+                             "{:.1f}x".format(serial / elapsed),
+                             "yes" if same else "NO"))
+            if not same:
+                return 1
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+""" Benchmark cold vs warm template loads through the template cache
+
+Usage:
+    python bench_template_cache.py [--repeat N]
+
+Loads every template shipped with the Model Checker panel once with an
+empty cache (cold: read, hash, parse, write entry) and then N times from
+the cache (warm: read, hash, unmarshal). Runs headless, no Revit needed.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+from __future__ import print_function
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUNDLE = os.path.dirname(HERE)
+PANEL = os.path.dirname(os.path.dirname(BUNDLE))
+sys.path.insert(0, os.path.join(BUNDLE, "lib"))
+
+from template_cache import TemplateCache  # noqa: E402
+from rule_utils import compile_template  # noqa: E402
+
+
+def shipped_templates():
+    """ Absolute paths of all .xml templates below the panel folder. """
+    paths = []
+    for folder, _, files in os.walk(PANEL):
+        for name in files:
+            if name.lower().endswith(".xml"):
+                paths.append(os.path.join(folder, name))
+    return sorted(paths)
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="warm loads per template (best is reported)")
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="mc_cache_")
+    try:
+        cache = TemplateCache(cache_dir)
+        row = "{:<48} {:>7} {:>10} {:>10} {:>8} {:>10}"
+        print(row.format("Template", "Checks", "Cold ms", "Warm ms",
+                         "Speedup", "Compile ms"))
+        for path in shipped_templates():
+            cold, template = timed(cache.load, path)
+            warm = min(timed(cache.load, path)[0]
+                       for _ in range(args.repeat))
+            compile_time, checks = timed(compile_template, template)
+            name = os.path.relpath(path, PANEL)
+            if len(name) > 48:
+                name = "..." + name[-45:]
+            print(row.format(name, len(checks), "{:.1f}".format(cold * 1e3),
+                             "{:.1f}".format(warm * 1e3),
+                             "{:.1f}x".format(cold / warm if warm else 0),
+                             "{:.1f}".format(compile_time * 1e3)))
+        print("cache hits: {}, misses: {}".format(cache.hits, cache.misses))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+""" Benchmark every shipped template against synthetic models
+
+Usage:
+    python bench_templates.py [--sizes 10000,100000,1000000] [--top N]
+                              [--json results.json]
+
+For every size a child process generates a synthetic snapshot shaped by
+the filters of all shipped templates, then parses (without the template
+cache), compiles and evaluates each template on it. Reported per template:
+parse, compile and evaluation time, peak RSS of the process so far and the
+most expensive checks. The cost of a check includes the filters it is the
+first to need, later checks reuse them. Runs headless, no Revit needed.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+from __future__ import print_function
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUNDLE = os.path.dirname(HERE)
+TEMPLATES = os.path.join(BUNDLE, "Templates")
+sys.path.insert(0, os.path.join(BUNDLE, "lib"))
+
+from template_utils import load_template  # noqa: E402
+from rule_utils import compile_template  # noqa: E402
+from bitset_utils import SharedPredicates, bit_count  # noqa: E402
+from synthetic_utils import synthetic_elements  # noqa: E402
+
+DEFAULT_SIZES = "10000,100000,1000000"
+
+
+def shipped_templates():
+    """ Absolute paths of the templates shipped with the Model Checker. """
+    paths = []
+    for folder, _, files in os.walk(TEMPLATES):
+        for name in files:
+            if name.lower().endswith(".xml"):
+                paths.append(os.path.join(folder, name))
+    return sorted(paths)
+
+
+def peak_rss_mb():
+    """ Peak resident set size of this process in MB, None if unknown. """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0)
+
+
+def run_size(size, seed):
+    """
+    Benchmarks all templates on one synthetic snapshot.
+
+    Parameters
+    ----------
+    size : int
+        Number of elements
+    seed : int
+        Seed of the synthetic model
+
+    Returns
+    -------
+    dict
+        Measurements of the snapshot and of every template
+    """
+    paths = shipped_templates()
+    shapes = []
+    for path in paths:
+        shapes.extend(compile_template(load_template(path)))
+    start = time.time()
+    elements = list(synthetic_elements(size, shapes, seed))
+    report = {"size": size, "generate": time.time() - start,
+              "rss": peak_rss_mb(), "templates": []}
+    del shapes
+
+    for path in paths:
+        start = time.time()
+        template = load_template(path)
+        parsed = time.time()
+        checks = compile_template(template)
+        compiled = time.time()
+        predicates = SharedPredicates(elements)
+        costs = []
+        matched = 0
+        for check in checks:
+            if not check.supported:
+                continue
+            check_start = time.time()
+            matched += bit_count(predicates.check_bits(check))
+            costs.append((time.time() - check_start, check.spec.name))
+        evaluated = time.time()
+        costs.sort(reverse=True)
+        report["templates"].append({
+            "template": os.path.relpath(path, TEMPLATES),
+            "checks": len(checks),
+            "parse": parsed - start,
+            "compile": compiled - parsed,
+            "evaluate": evaluated - compiled,
+            "matched": matched,
+            "filters": predicates.evaluated,
+            "rss": peak_rss_mb(),
+            "costs": costs})
+        del predicates
+    return report
+
+
+def print_report(report, top):
+    print("\n{} elements (generated in {:.1f}s, peak RSS {} MB)".format(
+        report["size"], report["generate"], _mb(report["rss"])))
+    row = "{:<40} {:>6} {:>9} {:>10} {:>10} {:>8} {:>9}"
+    print(row.format("Template", "Checks", "Parse ms", "Compile ms",
+                     "Eval s", "Filters", "Peak MB"))
+    for item in report["templates"]:
+        print(row.format(item["template"][-40:], item["checks"],
+                         "{:.1f}".format(item["parse"] * 1e3),
+                         "{:.1f}".format(item["compile"] * 1e3),
+                         "{:.2f}".format(item["evaluate"]),
+                         item["filters"], _mb(item["rss"])))
+    if not top:
+        return
+    for item in report["templates"]:
+        print("  slowest checks of {}:".format(item["template"]))
+        for cost, name in item["costs"][:top]:
+            print("    {:>9.1f} ms  {}".format(cost * 1e3, name))
+
+
+def _mb(value):
+    return "?" if value is None else "{:.0f}".format(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="comma separated snapshot sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top", type=int, default=5,
+                        help="slowest checks listed per template")
+    parser.add_argument("--json", help="write all measurements to a file")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        json.dump(run_size(args.child, args.seed), sys.stdout)
+        return 0
+
+    reports = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        # One process per size keeps the peak RSS of the sizes apart
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), "--child", str(size),
+             "--seed", str(args.seed)])
+        report = json.loads(output.decode("utf-8"))
+        print_report(report, args.top)
+        reports.append(report)
+    if args.json:
+        with open(args.json, "w") as results:
+            json.dump(reports, results, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+""" Module to run the Model Checker headless over a folder of snapshots
+
+The template is parsed once and handed to a pool of worker processes as
+check data; every worker compiles it once and checks whole models, one
+snapshot file per task. Every model gets an HTML and a JSON lines report
+(see report_utils) and one summary table lists all models. Needs no Revit,
+snapshots are written in Revit by the Export Snapshot mode of the Model
+Checker command (SnapshotCollector and write_snapshot).
+Reports are named *.report.html / *.report.jsonl and must go to a folder
+other than the snapshot folder, so they are never read as snapshots.
+
+Usage:
+    python batch_utils.py <template.xml> <snapshot folder> <report folder>
+                          [--workers N] [--pattern *.jsonl]
+                          [--batch-size N]
+"""
+#pylint: disable=invalid-name,broad-except,superfluous-parens,global-statement
+from __future__ import print_function
+import csv
+import fnmatch
+import os
+import re
+import sys
+import time
+
+from template_utils import load_template
+from template_cache import check_from_data, check_to_data
+from rule_utils import (
+    PASS, FAIL, INFO, SKIPPED, compile_check, compile_template, skip_checks)
+from bitset_utils import evaluate_shared
+from snapshot_utils import (
+    iter_snapshot, missing_data, read_snapshot, read_snapshot_header,
+    tables_from_data)
+from planner_utils import plan_checks
+from chunk_utils import evaluate_chunked
+from report_utils import ReportWriter
+from template_lint import TemplateError, validate_template
+
+# Snapshots of this size have their filters reordered by sampled selectivity
+PLAN_MIN_ELEMENTS = 20000
+
+# Columns of the summary table
+SUMMARY_FIELDS = ("snapshot", "model", "elements", PASS, FAIL, INFO,
+                  SKIPPED, "failing_elements", "seconds", "report", "error")
+
+# Columns of the failing element tables of the model reports
+REPORT_COLUMNS = ("Element Id", "Category", "Family", "Type", "Level")
+
+# Suffix of the report files of a model, before the extension
+REPORT_SUFFIX = ".report"
+
+# Compiled checks of the template in a worker process
+_checks = None
+
+
+def find_snapshots(folder, pattern="*.jsonl"):
+    """
+    Returns
+    -------
+    list
+        Snapshot files in a folder matching the pattern, sorted by name,
+        without report files
+    """
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if fnmatch.fnmatch(name, pattern) and not
+                  os.path.splitext(name)[0].endswith(REPORT_SUFFIX))
+
+
+def model_name(snapshot_path, header):
+    """ Model name stored in a snapshot header, else the file name. """
+    name = header.get("model")
+    if not name:
+        name = os.path.splitext(os.path.basename(snapshot_path))[0]
+    return name
+
+
+def _file_name(path):
+    """ Base name of a snapshot file usable for its report files. """
+    return re.sub(r"[^\w.-]+", "_", os.path.splitext(
+        os.path.basename(path))[0]).strip("_") or "model"
+
+
+def _describe(elements):
+    records = dict((element["id"], element) for element in elements)
+
+    def describe(element_id):
+        element = records.get(element_id)
+        if element is None:
+            return [element_id, "", "", "", ""]
+        return [element_id, element["category_name"], element["family"],
+                element["type_name"], element["level"]]
+    return describe
+
+
+def covered_checks(checks, header):
+    """
+    Checks to evaluate on a snapshot.
+
+    Parameters
+    ----------
+    checks : list
+        CompiledCheck items of the template
+    header : dict
+        Header line of the snapshot
+
+    Returns
+    -------
+    list
+        The checks, those reading data the snapshot was not collected with
+        replaced by unsupported copies, so they are SKIPPED
+    """
+    reasons = {}
+    for check in checks:
+        missing = missing_data(header, check) if check.supported else []
+        if missing:
+            reasons[check.spec.id] = "; ".join(missing)
+    return skip_checks(checks, reasons)
+
+
+def _init_worker(checks_data, skipped):
+    global _checks
+    _checks = skip_checks([compile_check(check_from_data(data))
+                           for data in checks_data], skipped)
+
+
+def check_model(task):
+    """
+    Checks one snapshot and writes its reports, runs in a worker.
+
+    Parameters
+    ----------
+    task : tuple
+        (snapshot path, report folder, template name, batch size). With a
+        batch size the snapshot is evaluated in batches of that many
+        elements and the report tables only list element ids.
+
+    Returns
+    -------
+    dict
+        Summary row with the SUMMARY_FIELDS of the model
+    """
+    snapshot_path, report_folder, template_name, batch_size = task
+    start = time.time()
+    summary = dict((field, "") for field in SUMMARY_FIELDS)
+    summary["snapshot"] = os.path.basename(snapshot_path)
+    try:
+        header = read_snapshot_header(snapshot_path)
+        summary["model"] = name = model_name(snapshot_path, header)
+        tables = tables_from_data(header.get("tables"))
+        checks = covered_checks(_checks, header)
+        if batch_size:
+            run = evaluate_chunked(checks, iter_snapshot(snapshot_path),
+                                   batch_size, tables=tables)
+            results = run.results
+            count = run.elements
+            elements = []
+        else:
+            elements = read_snapshot(snapshot_path)
+            if len(elements) >= PLAN_MIN_ELEMENTS:
+                checks = plan_checks(checks, elements, tables=tables)
+            results = evaluate_shared(checks, elements, tables=tables)
+            count = len(elements)
+        base = os.path.join(report_folder, _file_name(snapshot_path))
+        details = [("Model", name), ("Template", template_name),
+                   ("Snapshot", snapshot_path), ("Elements", count)]
+        with ReportWriter(base + REPORT_SUFFIX + ".html",
+                          "Model Checker Report - {}".format(name), details,
+                          jsonl_path=base + REPORT_SUFFIX + ".jsonl",
+                          describe=_describe(elements),
+                          columns=REPORT_COLUMNS) as writer:
+            for result in results:
+                writer.write_result(result)
+        summary["elements"] = count
+        for status in (PASS, FAIL, INFO, SKIPPED):
+            summary[status] = sum(1 for result in results
+                                  if result.status == status)
+        summary["failing_elements"] = sum(
+            result.count for result in results if result.status == FAIL)
+        summary["report"] = base + REPORT_SUFFIX + ".html"
+    except Exception as err:
+        summary["error"] = "{}: {}".format(err.__class__.__name__, err)
+    summary["seconds"] = round(time.time() - start, 2)
+    return summary
+
+
+def run_batch(template_path, snapshot_paths, report_folder, workers=None,
+              batch_size=None):
+    """
+    Checks every snapshot against one template.
+
+    Parameters
+    ----------
+    template_path : str
+        Template XML file, parsed once
+    snapshot_paths : list
+        Snapshot files, one per model
+    report_folder : str
+        Folder for the model reports and the summary, created if missing.
+        Must not hold any of the snapshots.
+    workers : int
+        Number of worker processes, all cores when omitted. With one worker
+        the models are checked in this process.
+    batch_size : int
+        Evaluate every snapshot in batches of this many elements instead of
+        reading it whole, see chunk_utils
+
+    Returns
+    -------
+    list
+        Summary rows (dicts of SUMMARY_FIELDS) sorted by snapshot file
+
+    Raises
+    ------
+    TemplateError
+        The template is malformed, no model is checked
+    ValueError
+        The report folder is the folder of a snapshot
+    """
+    import multiprocessing
+    report_key = os.path.normcase(os.path.realpath(report_folder))
+    for path in snapshot_paths:
+        if os.path.normcase(os.path.realpath(os.path.dirname(
+                os.path.abspath(path)))) == report_key:
+            raise ValueError("Reports would be written next to the snapshot "
+                             "{}, choose another report folder".format(path))
+    # Checks with bad filters are skipped, the others still run
+    skipped = validate_template(template_path).skipped_checks()
+    if not os.path.isdir(report_folder):
+        os.makedirs(report_folder)
+    checks_data = [check_to_data(check.spec) for check
+                   in compile_template(load_template(template_path))]
+    template_name = os.path.basename(template_path)
+    tasks = [(path, report_folder, template_name, batch_size)
+             for path in snapshot_paths]
+    workers = min(workers or multiprocessing.cpu_count(), len(tasks) or 1)
+    if workers <= 1:
+        _init_worker(checks_data, skipped)
+        summaries = [check_model(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(workers, _init_worker,
+                                    (checks_data, skipped))
+        try:
+            summaries = list(pool.imap_unordered(check_model, tasks))
+        finally:
+            pool.close()
+            pool.join()
+    return sorted(summaries, key=lambda summary: summary["snapshot"])
+
+
+def write_summary(path, summaries):
+    """ Writes the summary rows to a CSV file. """
+    mode = "wb" if sys.version_info[0] < 3 else "w"
+    kwargs = {} if sys.version_info[0] < 3 else {"newline": ""}
+    with open(path, mode, **kwargs) as summary_file:
+        writer = csv.DictWriter(summary_file, SUMMARY_FIELDS)
+        writer.writeheader()
+        for summary in summaries:
+            writer.writerow(summary)
+
+
+def print_summary(summaries):
+    row = "{:<30} {:<30} {:>9} {:>6} {:>6} {:>6} {:>8} {:>9} {:>8}"
+    print(row.format("Snapshot", "Model", "Elements", PASS, FAIL, INFO,
+                     SKIPPED, "Failing", "Seconds"))
+    for summary in summaries:
+        if summary["error"]:
+            print("{:<30} {}".format(summary["snapshot"][-30:],
+                                     summary["error"]))
+            continue
+        print(row.format(summary["snapshot"][-30:], summary["model"][-30:],
+                         summary["elements"], summary[PASS], summary[FAIL],
+                         summary[INFO], summary[SKIPPED],
+                         summary["failing_elements"], summary["seconds"]))
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("template")
+    parser.add_argument("snapshots", help="folder of snapshot files")
+    parser.add_argument("reports", help="folder to write the reports to")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--pattern", default="*.jsonl",
+                        help="file name pattern of the snapshots")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="evaluate snapshots in batches of N elements")
+    args = parser.parse_args(argv)
+    snapshot_paths = find_snapshots(args.snapshots, args.pattern)
+    if not snapshot_paths:
+        print("No snapshots matching {} in {}".format(args.pattern,
+                                                      args.snapshots))
+        return 2
+    start = time.time()
+    try:
+        summaries = run_batch(args.template, snapshot_paths, args.reports,
+                              args.workers, args.batch_size)
+    except (TemplateError, ValueError) as err:
+        print(err)
+        return 2
+    summary_path = os.path.join(args.reports, "summary.csv")
+    write_summary(summary_path, summaries)
+    print_summary(summaries)
+    print("{} models checked in {:.1f}s, summary: {}".format(
+        len(summaries), time.time() - start, summary_path))
+    return 1 if any(summary["error"] for summary in summaries) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
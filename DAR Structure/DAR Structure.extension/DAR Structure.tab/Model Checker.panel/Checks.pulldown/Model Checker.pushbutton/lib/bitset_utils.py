@@ -0,0 +1,459 @@
+""" Module to evaluate Model Checker checks with shared predicate bitsets
+
+Identical filters occur thousands of times across a template, e.g.
+"Category ... Included" or "Is Element Type = False". Every distinct filter
+is evaluated once per run into a bitset over the element snapshot (bit i
+is set when element i matches) and checks combine these bitsets with
+AND / OR / AND NOT according to the Operator of their filters.
+
+Value filters (Equal, Contains, WildCard, ...) read one field. That field is
+pulled into an interned column once, and each filter is tested once per
+distinct value of the column instead of once per element. With NumPy,
+numeric filters compare all distinct values of a column in one array
+operation (see vector_utils).
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import time
+
+import vector_utils
+from rule_utils import (
+    CheckResult, MISSING, COUNT_ONLY, FIRST_MATCH, LIST_LIMIT, CAPPED_LIST,
+    collection_strategy, compile_filter, column_filter, numeric_filter)
+
+
+def bitset_from_flags(flags):
+    """
+    Packs booleans into a bitset.
+
+    Parameters
+    ----------
+    flags : list
+        One bool per element
+
+    Returns
+    -------
+    int
+        Bit i is set when flags[i] is true
+    """
+    if not flags:
+        return 0
+    return int("".join(["1" if flag else "0" for flag in reversed(flags)]), 2)
+
+
+def bitset_from_indices(indices, size):
+    """
+    Parameters
+    ----------
+    indices : iterable
+        Bits to set, each below size
+    size : int
+        Number of elements
+
+    Returns
+    -------
+    int
+        Bitset with the given bits set
+    """
+    if not size:
+        return 0
+    chars = ["0"] * size
+    for index in indices:
+        chars[size - 1 - index] = "1"
+    return int("".join(chars), 2)
+
+
+def bit_count(bits):
+    """ Number of set bits. """
+    return bin(bits).count("1")
+
+
+def bit_indices(bits, limit=None):
+    """
+    Parameters
+    ----------
+    bits : int
+        Bitset
+    limit : int
+        Return at most this many indices, all when omitted
+
+    Returns
+    -------
+    list
+        Indices of the set bits in ascending order
+    """
+    text = bin(bits)[:1:-1]
+    if limit is None:
+        return [index for index, bit in enumerate(text) if bit == "1"]
+    indices = []
+    index = text.find("1")
+    while index >= 0 and len(indices) < limit:
+        indices.append(index)
+        index = text.find("1", index + 1)
+    return indices
+
+
+class SharedPredicates:
+    """
+    Distinct filter predicates of a run and their bitsets.
+
+    Predicates are keyed by FilterSpec.key(), so a filter that appears in
+    many checks is compiled once and evaluated once over the elements.
+    Bitsets are only computed when a check needs them.
+
+    Attributes
+    ----------
+    elements : list
+        Element records of the snapshot
+    tables : dict or None
+        Name tables of the snapshot, see rule_utils.bind_tables
+    all_bits : int
+        Bitset with one bit per element
+    evaluated : int
+        Number of predicates evaluated over the elements
+    reused : int
+        Number of bitset requests served without evaluating
+    value_tests : int
+        Number of value tests run on distinct column values
+    vectorized : int
+        Number of filters evaluated on NumPy arrays
+    filter_seconds : dict
+        Predicate key -> wall time spent building its bitset
+    built : list
+        Predicate keys in the order their bitsets were built
+    requested : set or None
+        Predicate keys requested since it was last set to a set, used to
+        find the checks that share a predicate
+
+    Methods
+    -------
+    category_bits(names)
+        Bitset of elements in any of the categories
+    filter_bits(spec)
+        Bitset of elements matching a filter
+    """
+    def __init__(self, elements, tables=None):
+        self.elements = elements
+        self.tables = tables
+        self.all_bits = (1 << len(elements)) - 1
+        self.evaluated = 0
+        self.reused = 0
+        self.value_tests = 0
+        self.vectorized = 0
+        self.filter_seconds = {}
+        self.built = []
+        self.requested = None
+        self._columns = {}
+        self._numeric_columns = {}
+        self._predicates = {}
+        self._bits = {}
+        self._category_index = None
+        self._category_bits = {}
+
+    def _build_category_index(self):
+        groups = {}
+        for index, element in enumerate(self.elements):
+            groups.setdefault(element["category"], []).append(index)
+            if element["category_name"] != element["category"]:
+                groups.setdefault(element["category_name"], []).append(index)
+        self._category_index = dict(
+            (name, bitset_from_indices(indices, len(self.elements)))
+            for name, indices in groups.items())
+
+    def category_bits(self, names):
+        """
+        Bitset of elements whose category is one of the names.
+
+        Parameters
+        ----------
+        names : frozenset
+            OST_* names and display names
+
+        Returns
+        -------
+        int
+        """
+        bits = self._category_bits.get(names)
+        if bits is not None:
+            self.reused += 1
+            return bits
+        if self._category_index is None:
+            self._build_category_index()
+        bits = 0
+        for name in names:
+            bits |= self._category_index.get(name, 0)
+        self._category_bits[names] = bits
+        return bits
+
+    def column(self, key, get):
+        """
+        Interned column of one element field.
+
+        Parameters
+        ----------
+        key : tuple
+            Field key returned by column_filter
+        get : function
+            Reads the field from an element record
+
+        Returns
+        -------
+        tuple
+            (codes, values): codes[i] indexes the value of element i in the
+            list of distinct values
+        """
+        column = self._columns.get(key)
+        if column is not None:
+            return column
+        codes = []
+        values = []
+        lookup = {}
+        for element in self.elements:
+            value = get(element)
+            try:
+                # The type keeps True, 1 and 1.0 apart
+                code = lookup.setdefault((value.__class__, value),
+                                         len(values))
+            except TypeError:
+                code = len(values)
+            if code == len(values):
+                values.append(value)
+            codes.append(code)
+        column = (codes, values)
+        self._columns[key] = column
+        return column
+
+    def numeric_column(self, key, get):
+        """
+        Column of one element field as NumPy arrays, see column.
+
+        Returns
+        -------
+        vector_utils.NumericColumn
+        """
+        column = self._numeric_columns.get(key)
+        if column is None:
+            column = vector_utils.NumericColumn(*self.column(key, get))
+            self._numeric_columns[key] = column
+        return column
+
+    def _column_bits(self, spec, key, get, test):
+        numeric = numeric_filter(spec) if vector_utils.available() else None
+        if numeric is None:
+            codes, values = self.column(key, get)
+            outcomes = [value is not MISSING and test(value)
+                        for value in values]
+            self.value_tests += len(values)
+            if vector_utils.available():
+                return vector_utils.spread_bits(
+                    self.numeric_column(key, get).codes, outcomes)
+            return bitset_from_flags([outcomes[code] for code in codes])
+        column = self.numeric_column(key, get)
+        outcomes = vector_utils.compare(column, *numeric)
+        if numeric[0] in ("Equal", "NotEqual"):
+            # Text and bool values compare as text / flags, see value_test
+            _, values = self.column(key, get)
+            for index in (~column.plain).nonzero()[0]:
+                value = values[index]
+                outcomes[index] = value is not MISSING and test(value)
+                self.value_tests += 1
+        self.vectorized += 1
+        return vector_utils.spread_bits(column.codes, outcomes)
+
+    def predicate(self, spec):
+        """ Compiled predicate shared by all filters with the same key. """
+        key = spec.key()
+        predicate = self._predicates.get(key)
+        if predicate is None:
+            predicate = compile_filter(spec, self.tables)
+            self._predicates[key] = predicate
+        return predicate
+
+    def filter_bits(self, spec):
+        """
+        Bitset of elements matching a filter.
+
+        Parameters
+        ----------
+        spec : FilterSpec
+            Filter of a compiled check
+
+        Returns
+        -------
+        int
+        """
+        key = spec.key()
+        if self.requested is not None:
+            self.requested.add(key)
+        bits = self._bits.get(key)
+        if bits is not None:
+            self.reused += 1
+            return bits
+        start = time.time()
+        split = column_filter(spec, self.tables)
+        if split is not None:
+            bits = self._column_bits(spec, *split)
+        else:
+            predicate = self.predicate(spec)
+            bits = bitset_from_flags([predicate(element)
+                                      for element in self.elements])
+        self.evaluated += 1
+        self._bits[key] = bits
+        self.filter_seconds[key] = time.time() - start
+        self.built.append(key)
+        return bits
+
+    def candidate_bits(self, check):
+        """
+        Bitset of elements in the category gates of a check.
+
+        Parameters
+        ----------
+        check : CompiledCheck
+            Supported compiled check
+
+        Returns
+        -------
+        int
+        """
+        bits = 0
+        for branch in check.branches:
+            if branch.categories is None:
+                return self.all_bits
+            bits |= self.category_bits(branch.categories)
+        return bits
+
+    @property
+    def distinct(self):
+        """ Number of distinct filter predicates seen. """
+        return len(self._predicates)
+
+    def check_bits(self, check, first=False):
+        """
+        Bitset of elements matching a compiled check.
+
+        Branches are OR-ed. Within a branch the category bitset and the
+        include bitsets are AND-ed and exclude bitsets are removed, in the
+        order of the branch steps but with bitsets already computed first.
+        A branch stops as soon as no element is left and is skipped when
+        the branches before it already matched all elements of its gate.
+
+        Parameters
+        ----------
+        check : CompiledCheck
+            Supported compiled check
+        first : bool
+            Stop after the first branch that matches any element, the
+            bitset then holds some of the matches
+
+        Returns
+        -------
+        int
+        """
+        result = 0
+        for branch in check.branches:
+            if branch.categories is not None:
+                bits = self.category_bits(branch.categories)
+            else:
+                bits = self.all_bits
+            if not bits & ~result:
+                continue
+            steps = sorted(branch.steps,
+                           key=lambda step: step[0].key() not in self._bits)
+            for spec, _, negated in steps:
+                if not bits:
+                    break
+                if negated:
+                    bits &= ~self.filter_bits(spec)
+                else:
+                    bits &= self.filter_bits(spec)
+            result |= bits
+            if first and result:
+                break
+        return result
+
+
+def _bits_result(check, predicates, elements, strategy):
+    if strategy == FIRST_MATCH:
+        bits = predicates.check_bits(check, first=True)
+        ids = [elements[index]["id"] for index in bit_indices(bits, 1)]
+        return CheckResult(check, ids, complete=not ids)
+    bits = predicates.check_bits(check)
+    if strategy == COUNT_ONLY:
+        return CheckResult(check, [], bit_count(bits))
+    limit = LIST_LIMIT if strategy == CAPPED_LIST else None
+    ids = [elements[index]["id"] for index in bit_indices(bits, limit)]
+    return CheckResult(check, ids, bit_count(bits) if limit else None)
+
+
+def evaluate_shared(compiled_checks, elements, predicates=None,
+                    profiler=None, full=False, tables=None):
+    """
+    Evaluates all checks with shared predicate bitsets.
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+    elements : list
+        Element records of the snapshot
+    predicates : SharedPredicates
+        Bitset table to reuse, a new one is built when omitted
+    profiler : CheckProfiler
+        Receives the measurements of every supported check
+    full : bool
+        Collect every match regardless of the result condition, otherwise
+        matches are collected as collection_strategy says
+    tables : dict
+        Name tables of the snapshot, used when predicates is omitted
+
+    Returns
+    -------
+    list
+        CheckResult items in the order of compiled_checks
+    """
+    if predicates is None:
+        predicates = SharedPredicates(elements, tables)
+    results = []
+    measured = []
+    for check in compiled_checks:
+        if not check.supported:
+            results.append(CheckResult(check, []))
+            continue
+        if profiler is not None:
+            start = time.time()
+            evaluated = predicates.evaluated
+            reused = predicates.reused
+            built = len(predicates.built)
+            predicates.requested = set()
+        result = _bits_result(check, predicates, elements,
+                              collection_strategy(check, full))
+        results.append(result)
+        if profiler is not None:
+            seconds = time.time() - start - sum(
+                predicates.filter_seconds[key]
+                for key in predicates.built[built:])
+            measured.append((check, result, seconds,
+                             predicates.evaluated - evaluated,
+                             predicates.reused - reused,
+                             predicates.requested, built))
+            predicates.requested = None
+    if profiler is not None:
+        _record_shared(profiler, predicates, measured)
+    return results
+
+
+def _record_shared(profiler, predicates, measured):
+    # The time of a bitset built in this run is split evenly over the
+    # checks of the run that used it, bitsets built before cost nothing
+    first = measured[0][-1] if measured else len(predicates.built)
+    users = {}
+    for item in measured:
+        for key in item[5]:
+            users[key] = users.get(key, 0) + 1
+    shares = dict((key, predicates.filter_seconds[key] / users[key])
+                  for key in predicates.built[first:] if key in users)
+    for check, result, seconds, evaluated, reused, requested, _ in measured:
+        filter_seconds = sum(shares.get(key, 0.0) for key in requested)
+        profiler.record(check, seconds + filter_seconds,
+                        bit_count(predicates.candidate_bits(check)),
+                        result.count, evaluated, reused, filter_seconds)
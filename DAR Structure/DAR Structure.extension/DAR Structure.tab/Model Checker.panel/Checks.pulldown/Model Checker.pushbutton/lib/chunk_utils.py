@@ -0,0 +1,168 @@
+""" Module to evaluate Model Checker checks on element batches
+
+For models too large to hold every element record in memory, elements are
+read from the collector (or a snapshot file) in batches of a fixed size.
+All checks are evaluated on one batch with shared predicate bitsets, the
+matches are merged into one ResultCollector per check and the batch is
+dropped. Peak memory depends on the batch size, not on the model size.
+Checks that are decided (FailNoElements after the first match) are not
+evaluated on later batches, and reading stops once all checks are decided.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import os
+
+from rule_utils import ResultCollector, collection_strategy
+from bitset_utils import evaluate_shared
+from planner_utils import FilterPlanner, sample_elements
+
+# Environment variable overriding the default batch size
+BATCH_SIZE_VARIABLE = "MODELCHECKER_BATCH_SIZE"
+
+# Element records held in memory at a time
+DEFAULT_BATCH_SIZE = 20000
+
+# Marks the end of the element records
+_END = object()
+
+
+def batch_size_setting(default=DEFAULT_BATCH_SIZE):
+    """
+    Returns
+    -------
+    int
+        Batch size from the MODELCHECKER_BATCH_SIZE variable, else default
+    """
+    try:
+        size = int(os.environ.get(BATCH_SIZE_VARIABLE, ""))
+    except ValueError:
+        return default
+    return size if size > 0 else default
+
+
+def iter_batches(elements, size):
+    """
+    Splits an iterable of element records into lists.
+
+    Parameters
+    ----------
+    elements : iterable
+        Element records, read lazily
+    size : int
+        Records per batch
+
+    Returns
+    -------
+    generator
+        Lists of at most size records
+    """
+    batch = []
+    for element in elements:
+        batch.append(element)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ChunkedRun:
+    """
+    Outcome of a chunked evaluation.
+
+    Attributes
+    ----------
+    results : list
+        CheckResult items in the order of the checks
+    batches : int
+        Batches evaluated
+    elements : int
+        Element records read
+    stopped : bool
+        Reading stopped before the last batch because every check was
+        decided
+    """
+    def __init__(self, results, batches, elements, stopped):
+        self.results = results
+        self.batches = batches
+        self.elements = elements
+        self.stopped = stopped
+
+
+def evaluate_chunked(compiled_checks, elements, batch_size=None, tables=None,
+                     profiler=None, full=False, plan=True, on_result=None):
+    """
+    Evaluates checks on batches of elements, keeping only their results.
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+    elements : iterable
+        Element records, e.g. SnapshotCollector.iter_elements() or
+        snapshot_utils.iter_snapshot(); read once, batch by batch
+    batch_size : int
+        Records per batch, batch_size_setting() when omitted
+    tables : dict
+        Name tables of the coded fields of the elements
+    profiler : CheckProfiler
+        Receives the measurements of every batch of every check
+    full : bool
+        Collect every match regardless of the result condition
+    plan : bool
+        Reorder the filters with statistics of the first batch
+    on_result : function
+        Called with (index, CheckResult) in the order of compiled_checks,
+        as soon as the results up to index are known: decided checks after
+        their batch, the others after the last batch
+
+    Returns
+    -------
+    ChunkedRun
+    """
+    batch_size = batch_size or batch_size_setting()
+    collectors = [ResultCollector(check, collection_strategy(check, full))
+                  for check in compiled_checks]
+    pending = [index for index, check in enumerate(compiled_checks)
+               if check.supported]
+    # Results known so far, passed to on_result in the order of the checks
+    finished = [None] * len(compiled_checks)
+    emitted = [0]
+
+    def finish(index):
+        finished[index] = collectors[index].result()
+        if on_result is None:
+            return
+        while emitted[0] < len(finished) and \
+                finished[emitted[0]] is not None:
+            on_result(emitted[0], finished[emitted[0]])
+            emitted[0] += 1
+
+    for index, check in enumerate(compiled_checks):
+        if not check.supported:
+            finish(index)
+    checks = compiled_checks
+    batches = 0
+    count = 0
+    stopped = False
+    source = iter(elements if pending else ())
+    for batch in iter_batches(source, batch_size):
+        if not batches and plan:
+            checks = FilterPlanner(sample_elements(batch),
+                                   tables).plan_checks(compiled_checks)
+        batches += 1
+        count += len(batch)
+        results = evaluate_shared([checks[index] for index in pending],
+                                  batch, profiler=profiler, full=full,
+                                  tables=tables)
+        for index, result in zip(pending, results):
+            collectors[index].merge(result)
+            if collectors[index].done:
+                finish(index)
+        pending = [index for index in pending if not collectors[index].done]
+        if not pending:
+            # Reads one more record to tell if any batch was left unread
+            stopped = next(source, _END) is not _END
+            break
+    for index in pending:
+        finish(index)
+    return ChunkedRun(finished, batches, count, stopped)
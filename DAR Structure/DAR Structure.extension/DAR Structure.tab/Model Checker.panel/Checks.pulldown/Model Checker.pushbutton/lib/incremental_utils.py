@@ -0,0 +1,347 @@
+""" Module to evaluate Model Checker checks incrementally between runs
+
+A result store keeps, per model and set of checks, the fingerprint of every
+element record (keyed by UniqueId) and the UniqueIds each check matched. On
+the next run only elements whose fingerprint changed are evaluated again;
+the stored matches of all other elements are reused. Each check then
+reports its failures as new, resolved or unchanged since the previous run.
+
+The element records only hold what the checks of a run read, so
+fingerprints are only comparable between runs of the same checks. Runs of
+another template, another choice of sections or a recheck of some
+categories use a store of their own.
+"""
+#pylint: disable=invalid-name,broad-except,superfluous-parens
+import hashlib
+import json
+import os
+import tempfile
+
+from rule_utils import (
+    CheckResult, FIRST_MATCH, collect_result, collection_strategy)
+from bitset_utils import evaluate_shared
+from template_cache import check_to_data
+
+
+# Bump when the layout of a store file changes
+STORE_FORMAT = 1
+
+DEFAULT_STORE_DIR = os.path.join(
+    os.environ.get("LOCALAPPDATA") or tempfile.gettempdir(),
+    "DAR Structure", "ModelCheckerResults")
+
+
+def _digest(data):
+    text = json.dumps(data, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def element_fingerprint(element, tables=None):
+    """
+    Fingerprint of the values the checks read from an element.
+
+    The record only holds the parameters the checks need, so a change of
+    any other parameter keeps the fingerprint. Coded fields are resolved
+    to their names, so renaming a workset changes the fingerprint of its
+    elements.
+
+    Parameters
+    ----------
+    element : dict
+        Element record
+    tables : dict
+        Name tables of the coded fields of the record
+
+    Returns
+    -------
+    str
+    """
+    data = dict(element)
+    del data["id"]
+    if tables:
+        for field, names in tables.items():
+            data[field] = names.get(data[field], "")
+    return _digest(data)[:16]
+
+
+def check_key(check):
+    """
+    Returns
+    -------
+    str
+        Key of a compiled check that changes whenever its definition does
+    """
+    return _digest(check_to_data(check.spec))
+
+
+def check_set_key(compiled_checks):
+    """
+    Returns
+    -------
+    str
+        Key of a set of compiled checks, independent of their order
+    """
+    return _digest(sorted(check_key(check) for check in compiled_checks))
+
+
+def store_path(model_path, compiled_checks, directory=None):
+    """
+    Parameters
+    ----------
+    model_path : str
+        Path (or title) of the model
+    compiled_checks : list
+        CompiledCheck items of the run
+
+    Returns
+    -------
+    str
+        Store file of a model and a set of checks, named after the hash of
+        the model path and check_set_key
+    """
+    key = u"{}\n{}".format(model_path, check_set_key(compiled_checks))
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(directory or DEFAULT_STORE_DIR,
+                        "{}.json".format(digest))
+
+
+class ResultStore:
+    """
+    Element fingerprints and check matches of the previous run of a model
+    with the same checks.
+
+    Attributes
+    ----------
+    path : str
+        Store file
+    fingerprints : dict
+        UniqueId -> element fingerprint
+    matches : dict
+        check_key -> list of UniqueIds the check matched
+
+    Methods
+    -------
+    save()
+        Writes the store file
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fingerprints = {}
+        self.matches = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as store:
+                    data = json.load(store)
+                if data.get("format") == STORE_FORMAT:
+                    self.fingerprints = data["fingerprints"]
+                    self.matches = data["matches"]
+            except Exception:
+                # A damaged store only costs a full run
+                pass
+
+    def save(self):
+        """ Writes the store file, replacing it atomically. """
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        temporary = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(temporary, "w") as store:
+            json.dump({"format": STORE_FORMAT,
+                       "fingerprints": self.fingerprints,
+                       "matches": self.matches}, store)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temporary, self.path)
+
+
+class CheckDelta:
+    """
+    Failures of a check compared with the previous run.
+
+    Attributes
+    ----------
+    new : set
+        UniqueIds matched now but not in the previous run
+    resolved : set
+        UniqueIds matched in the previous run but not now
+    unchanged : set
+        UniqueIds matched in both runs
+    known : bool
+        The check was evaluated in the previous run
+    """
+    def __init__(self, previous, current, known=True):
+        self.new = current - previous
+        self.resolved = previous - current
+        self.unchanged = current & previous
+        self.known = known
+
+    def __repr__(self):
+        return "<CheckDelta +{} -{} ={}>".format(
+            len(self.new), len(self.resolved), len(self.unchanged))
+
+
+class IncrementalRun:
+    """
+    Outcome of an incremental evaluation.
+
+    Attributes
+    ----------
+    results : list
+        CheckResult items in the order of the checks
+    deltas : list
+        CheckDelta items in the order of the checks
+    evaluated : int
+        Elements evaluated again (changed or added)
+    removed : int
+        Elements of the previous run that are gone
+    """
+    def __init__(self, results, deltas, evaluated, removed):
+        self.results = results
+        self.deltas = deltas
+        self.evaluated = evaluated
+        self.removed = removed
+
+
+def _evaluate_into(evaluate, compiled_checks, indices, elements, found,
+                   full):
+    if not indices or not elements:
+        return
+    results = evaluate([compiled_checks[index] for index in indices],
+                       elements, full=full)
+    for index, result in zip(indices, results):
+        found[index] = result.element_ids
+
+
+def evaluate_incremental(compiled_checks, elements, store, evaluate=None,
+                         tables=None, on_result=None):
+    """
+    Evaluates checks, reusing the stored matches of unchanged elements.
+
+    Checks the store knows are evaluated on changed and added elements only.
+    Checks it does not know (new or edited) are evaluated on all elements.
+    FailNoElements checks only keep the element that made them pass: while
+    it is unchanged they are not evaluated at all. The store is updated but
+    not saved.
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+    elements : list
+        Element records of the snapshot
+    store : ResultStore
+        Results of the previous run, updated in place
+    evaluate : function
+        Takes (compiled checks, elements, full=bool), returns CheckResult
+        items. evaluate_shared with the tables when omitted.
+    tables : dict
+        Name tables of the coded fields of the elements
+    on_result : function
+        Called with (index, CheckResult, CheckDelta) in the order of
+        compiled_checks, e.g. to stream the results to a report. A result
+        is passed on as soon as it and the results of all checks before it
+        are known.
+
+    Returns
+    -------
+    IncrementalRun
+    """
+    if evaluate is None:
+        evaluate = lambda checks, subset, full=False: evaluate_shared(
+            checks, subset, full=full, tables=tables)
+    fingerprints = {}
+    positions = {}
+    changed = []
+    for position, element in enumerate(elements):
+        unique_id = element["unique_id"]
+        fingerprint = element_fingerprint(element, tables)
+        fingerprints[unique_id] = fingerprint
+        positions[unique_id] = position
+        if store.fingerprints.get(unique_id) != fingerprint:
+            changed.append(element)
+    changed_ids = set(element["unique_id"] for element in changed)
+    removed = set(store.fingerprints) - set(fingerprints)
+
+    keys = [check_key(check) for check in compiled_checks]
+    strategies = [collection_strategy(check) for check in compiled_checks]
+    known = []
+    unknown = []
+    first_changed = []
+    first_all = []
+    kept = []
+    for index, key in enumerate(keys):
+        previous = store.matches.get(key)
+        if strategies[index] != FIRST_MATCH:
+            (known if previous is not None else unknown).append(index)
+        elif previous is None:
+            first_all.append(index)
+        elif not previous:
+            # Only changed elements can make a failing check pass
+            first_changed.append(index)
+        elif previous[0] in changed_ids or previous[0] not in fingerprints:
+            first_all.append(index)
+        else:
+            kept.append(index)
+
+    unique_ids = dict((element["id"], element["unique_id"])
+                      for element in elements)
+    results = [None] * len(compiled_checks)
+    deltas = [None] * len(compiled_checks)
+    current_matches = {}
+    found = {}
+    # Results before this index have been passed to on_result
+    emitted = [0]
+
+    def emit():
+        while emitted[0] < len(results) and results[emitted[0]] is not None:
+            on_result(emitted[0], results[emitted[0]], deltas[emitted[0]])
+            emitted[0] += 1
+
+    def finish(index):
+        check = compiled_checks[index]
+        key = keys[index]
+        is_known = key in store.matches
+        previous = set(store.matches.get(key, ()))
+        current = set(unique_ids[element_id]
+                      for element_id in found.get(index, ()))
+        if strategies[index] == FIRST_MATCH:
+            if index not in found:
+                current = previous
+            current_matches[key] = sorted(current)[:1]
+            deltas[index] = CheckDelta(set(), set(), is_known)
+            results[index] = CheckResult(
+                check, [elements[positions[unique_id]]["id"]
+                        for unique_id in current_matches[key]],
+                complete=not current)
+        else:
+            if is_known:
+                current |= previous - changed_ids - removed
+            current_matches[key] = sorted(current)
+            deltas[index] = CheckDelta(previous, current, is_known)
+            current_ids = [elements[position]["id"] for position in
+                           sorted(positions[unique_id]
+                                  for unique_id in current)]
+            results[index] = (
+                collect_result(check, current_ids, strategies[index])
+                if check.supported else CheckResult(check, []))
+        if on_result is not None:
+            emit()
+
+    for index in kept:
+        finish(index)
+    for indices, subset, full in ((known, changed, True),
+                                  (unknown, elements, True),
+                                  (first_changed, changed, False),
+                                  (first_all, elements, False)):
+        _evaluate_into(evaluate, compiled_checks, indices, subset, found,
+                       full)
+        for index in indices:
+            finish(index)
+
+    # Matches of checks not run now were taken against the old fingerprints
+    if not changed and not removed:
+        store.matches.update(current_matches)
+    else:
+        store.matches = current_matches
+    store.fingerprints = fingerprints
+    return IncrementalRun(results, deltas, len(changed), len(removed))
@@ -0,0 +1,137 @@
+""" Module to compile and cache text matchers of Model Checker filters
+
+WildCard / WildCardNoMatch values are regular expressions and Contains /
+DoesNotContain values are substrings. Each (condition, value, case) combination
+is compiled once and kept in an LRU cache shared by all checks and runs.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import re
+from collections import OrderedDict
+
+
+TEXT_CONDITIONS = ("Contains", "DoesNotContain", "WildCard", "WildCardNoMatch")
+
+
+class InvalidPattern(ValueError):
+    """ Raised when a WildCard value is not a valid regular expression. """
+
+
+class LRUCache:
+    """
+    Mapping that keeps the most recently used entries.
+
+    Attributes
+    ----------
+    size : int
+        Maximum number of entries
+    hits : int
+        Lookups served from the cache
+    misses : int
+        Lookups that had to build the value
+
+    Methods
+    -------
+    get_or_build(key, build)
+        Returns the cached value or stores build()
+    """
+    def __init__(self, size=1024):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_build(self, key, build):
+        """
+        Returns the cached value for key, building and storing it if needed.
+
+        Parameters
+        ----------
+        key : hashable
+            Cache key
+        build : function
+            Called without arguments to build a missing value
+
+        Returns
+        -------
+        object
+        """
+        entries = self._entries
+        if key in entries:
+            value = entries.pop(key)
+            entries[key] = value
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = build()
+        entries[key] = value
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """ Removes all entries. """
+        self._entries.clear()
+
+
+_matchers = LRUCache()
+
+
+def _build_matcher(condition, value, case_insensitive):
+    if condition in ("WildCard", "WildCardNoMatch"):
+        try:
+            pattern = re.compile(value, re.IGNORECASE if case_insensitive
+                                 else 0)
+        except re.error as err:
+            raise InvalidPattern('Invalid pattern "{}": {}'.format(value, err))
+        search = pattern.search
+        if condition == "WildCard":
+            return lambda text: search(text) is not None
+        return lambda text: search(text) is None
+
+    if condition in ("Contains", "DoesNotContain"):
+        if case_insensitive:
+            needle = value.lower()
+            if condition == "Contains":
+                return lambda text: needle in text.lower()
+            return lambda text: needle not in text.lower()
+        if condition == "Contains":
+            return lambda text: value in text
+        return lambda text: value not in text
+
+    raise ValueError('"{}" is not a text condition'.format(condition))
+
+
+def text_matcher(condition, value, case_insensitive=False):
+    """
+    Compiled, cached matcher for a text condition.
+
+    Parameters
+    ----------
+    condition : str
+        One of TEXT_CONDITIONS
+    value : str
+        Pattern or substring of the filter
+    case_insensitive : bool
+        Match ignoring case
+
+    Returns
+    -------
+    function
+        Takes a str and returns a bool
+
+    Raises
+    ------
+    InvalidPattern
+        The WildCard value does not compile
+    """
+    return _matchers.get_or_build(
+        (condition, value, bool(case_insensitive)),
+        lambda: _build_matcher(condition, value, case_insensitive))
+
+
+def matcher_cache():
+    """ The LRU cache shared by all text matchers. """
+    return _matchers
@@ -0,0 +1,476 @@
+""" Module to evaluate Model Checker checks in a pool of worker processes
+
+The Revit API is single-threaded, so the elements are collected in Revit
+once and written to a snapshot file. The checks are written to a job file
+and a CPython helper process shards them across a multiprocessing pool.
+Every worker reads the snapshot once, plans the filter order of its checks
+on a sample of it and keeps its shared predicate bitsets across the shards
+it evaluates. The results found per check and their profile measurements
+are merged back in the order of the checks. A helper that runs longer
+than its timeout is stopped with its workers, so Revit can evaluate the
+checks itself instead.
+
+Usage:
+    python parallel_utils.py <job.json> <results.json> [--workers N]
+"""
+#pylint: disable=invalid-name,broad-except,superfluous-parens,global-statement
+from __future__ import print_function
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from rule_utils import CheckResult, compile_check
+from bitset_utils import SharedPredicates, evaluate_shared
+from snapshot_utils import read_snapshot, read_snapshot_tables, write_snapshot
+from template_cache import check_from_data, check_to_data
+from profile_utils import PROFILE_FIELDS
+from planner_utils import FilterPlanner, sample_elements
+
+
+# Environment variable naming the CPython interpreter of the helper process
+PYTHON_VARIABLE = "MODELCHECKER_PYTHON"
+
+# Shards per worker, more shards even out checks of different cost
+SHARDS_PER_WORKER = 4
+
+# Seconds an interpreter gets to answer the probe of usable_python
+PROBE_TIMEOUT = 15
+
+# Environment variable overriding the seconds the helper process may run
+TIMEOUT_VARIABLE = "MODELCHECKER_HELPER_TIMEOUT"
+
+# Seconds the helper process may run before it is stopped and the checks
+# are evaluated in Revit instead
+HELPER_TIMEOUT = 900
+
+# Process creation flag that keeps a console window from opening (Windows)
+CREATE_NO_WINDOW = 0x08000000
+
+# Probe run by usable_python: the helper needs Python 2.7 or 3 with
+# multiprocessing and json
+PROBE_CODE = ("import sys, json, multiprocessing; "
+              "sys.exit(0 if sys.version_info[:2] >= (2, 7) else 3)")
+
+# Interpreter path -> result of usable_python, probed once per session
+_probed = {}
+
+# Element snapshot, predicate bitsets and filter planner of a worker process
+_elements = None
+_predicates = None
+_planner = None
+
+
+def shard_checks(checks, count):
+    """
+    Splits checks into shards of about equal cost.
+
+    Neighbouring checks of a template tend to share filters, so shards are
+    contiguous runs of checks. The cost of a check is its number of filters.
+
+    Parameters
+    ----------
+    checks : list
+        (index, check data) pairs as written by check_to_data
+    count : int
+        Number of shards wanted
+
+    Returns
+    -------
+    list
+        Lists of (index, check data) pairs, none of them empty
+    """
+    if not checks:
+        return []
+    costs = [1 + len(data[-1]) for _, data in checks]
+    target = float(sum(costs)) / max(1, count)
+    shards = [[]]
+    total = 0
+    for item, cost in zip(checks, costs):
+        if shards[-1] and total + cost / 2.0 > target * len(shards):
+            shards.append([])
+        shards[-1].append(item)
+        total += cost
+    return shards
+
+
+class _ShardProfiler:
+    """ Collects the measurements of a shard in the order of its checks. """
+    def __init__(self):
+        self.measurements = []
+
+    def record(self, check, *values):
+        self.measurements.append(dict(zip(PROFILE_FIELDS, values)))
+
+
+def _init_worker(snapshot_path):
+    global _elements, _predicates, _planner
+    tables = read_snapshot_tables(snapshot_path)
+    _elements = read_snapshot(snapshot_path)
+    _predicates = SharedPredicates(_elements, tables)
+    _planner = FilterPlanner(sample_elements(_elements), tables)
+
+
+def _evaluate_shard(task):
+    shard, full = task
+    compiled = _planner.plan_checks(
+        [compile_check(check_from_data(data)) for _, data in shard])
+    profiler = _ShardProfiler()
+    results = evaluate_shared(compiled, _elements, _predicates, profiler,
+                              full)
+    return [(index, (result.element_ids, result.count, result.complete),
+             measurements)
+            for (index, _), result, measurements
+            in zip(shard, results, profiler.measurements)]
+
+
+def _collect(shard_results, found, profiles):
+    for index, result, measurements in shard_results:
+        found[index] = result
+        profiles[index] = measurements
+
+
+def evaluate_checks_data(checks, snapshot_path, workers=None,
+                         profiles=None, full=False):
+    """
+    Evaluates checks on a snapshot file in a pool of worker processes.
+
+    Parameters
+    ----------
+    checks : list
+        (index, check data) pairs as written by check_to_data
+    snapshot_path : str
+        Snapshot file written by write_snapshot
+    workers : int
+        Number of worker processes, all cores when omitted. With one worker
+        the checks are evaluated in this process.
+    profiles : dict
+        Filled with index -> profile measurements (PROFILE_FIELDS)
+    full : bool
+        Collect every match regardless of the result condition
+
+    Returns
+    -------
+    dict
+        index -> (element ids, count, complete) of the check result
+    """
+    import multiprocessing
+    workers = workers or multiprocessing.cpu_count()
+    if profiles is None:
+        profiles = {}
+    found = {}
+    if workers <= 1:
+        _init_worker(snapshot_path)
+        _collect(_evaluate_shard((checks, full)), found, profiles)
+        return found
+    pool = multiprocessing.Pool(workers, _init_worker, (snapshot_path,))
+    try:
+        tasks = [(shard, full) for shard
+                 in shard_checks(checks, workers * SHARDS_PER_WORKER)]
+        for shard_results in pool.imap_unordered(_evaluate_shard, tasks):
+            _collect(shard_results, found, profiles)
+    finally:
+        pool.close()
+        pool.join()
+    return found
+
+
+def merge_results(compiled_checks, found):
+    """
+    Builds the results of all checks from the results found per check.
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+    found : dict
+        Position in compiled_checks -> (element ids, count, complete)
+
+    Returns
+    -------
+    list
+        CheckResult items in the order of compiled_checks
+    """
+    results = []
+    for index, check in enumerate(compiled_checks):
+        if not check.supported or index not in found:
+            results.append(CheckResult(check, []))
+            continue
+        element_ids, count, complete = found[index]
+        results.append(CheckResult(check, element_ids, count,
+                                   complete=complete))
+    return results
+
+
+def _supported_data(compiled_checks):
+    return [(index, check_to_data(check.spec))
+            for index, check in enumerate(compiled_checks)
+            if check.supported]
+
+
+def _add_profiles(profiler, compiled_checks, profiles):
+    if profiler is None:
+        return
+    for index in sorted(profiles):
+        profiler.add(compiled_checks[index], profiles[index])
+
+
+def evaluate_parallel(compiled_checks, snapshot_path, workers=None,
+                      profiler=None, full=False):
+    """
+    Evaluates compiled checks on a snapshot file in a pool of workers.
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+    snapshot_path : str
+        Snapshot file written by write_snapshot
+    workers : int
+        Number of worker processes, all cores when omitted
+    profiler : CheckProfiler
+        Receives the measurements of every supported check
+    full : bool
+        Collect every match regardless of the result condition
+
+    Returns
+    -------
+    list
+        CheckResult items in the order of compiled_checks
+    """
+    profiles = {}
+    found = evaluate_checks_data(_supported_data(compiled_checks),
+                                 snapshot_path, workers, profiles, full)
+    _add_profiles(profiler, compiled_checks, profiles)
+    return merge_results(compiled_checks, found)
+
+
+def write_job(path, compiled_checks, snapshot_path, full=False):
+    """ Writes the supported checks and the snapshot path to a job file. """
+    with open(path, "w") as job:
+        json.dump({"snapshot": snapshot_path, "full": full,
+                   "checks": _supported_data(compiled_checks)}, job)
+
+
+def run_job(job_path, results_path, workers=None):
+    """
+    Evaluates a job file and writes the ids found per check.
+
+    Parameters
+    ----------
+    job_path : str
+        File written by write_job
+    results_path : str
+        File to write the element ids and profiles found per check to
+    workers : int
+        Number of worker processes, all cores when omitted
+    """
+    with open(job_path, "r") as job:
+        data = json.load(job)
+    profiles = {}
+    found = evaluate_checks_data(data["checks"], data["snapshot"], workers,
+                                 profiles, data.get("full", False))
+    with open(results_path, "w") as results:
+        json.dump({"found": sorted(found.items()),
+                   "profiles": sorted(profiles.items())}, results)
+
+
+def _kill(process):
+    """ Stops a process together with the worker processes it started. """
+    try:
+        if os.name == "nt":
+            with open(os.devnull, "w") as devnull:
+                subprocess.call(["taskkill", "/F", "/T", "/PID",
+                                 str(process.pid)], stdout=devnull,
+                                stderr=devnull, creationflags=CREATE_NO_WINDOW)
+        elif hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+
+
+def _call(command, timeout):
+    """
+    Runs a command without a console window.
+
+    On POSIX the command runs in a session of its own, so that the worker
+    processes it starts are stopped with it.
+
+    Returns
+    -------
+    int or None
+        Exit code of the command, None when it ran longer than timeout
+        seconds and was stopped
+    """
+    options = {}
+    if os.name == "nt":
+        options["creationflags"] = CREATE_NO_WINDOW
+    elif hasattr(os, "setsid"):
+        options["preexec_fn"] = os.setsid
+    with open(os.devnull, "w") as devnull:
+        process = subprocess.Popen(command, stdout=devnull, stderr=devnull,
+                                   **options)
+        deadline = time.time() + timeout
+        while process.poll() is None:
+            if time.time() > deadline:
+                _kill(process)
+                return None
+            time.sleep(0.05)
+    return process.returncode
+
+
+def helper_timeout(default=HELPER_TIMEOUT):
+    """
+    Returns
+    -------
+    float
+        Seconds from the MODELCHECKER_HELPER_TIMEOUT variable, else default
+    """
+    try:
+        timeout = float(os.environ.get(TIMEOUT_VARIABLE, ""))
+    except ValueError:
+        return default
+    return timeout if timeout > 0 else default
+
+
+def usable_python(python):
+    """
+    Runs a short probe in an interpreter.
+
+    A python.exe found on the PATH can be the WindowsApps stub that opens
+    the Microsoft Store instead of running anything, or an interpreter too
+    old for the helper.
+
+    Returns
+    -------
+    bool
+        The interpreter starts, is Python 2.7 or later and has the modules
+        the helper needs
+    """
+    if python not in _probed:
+        try:
+            _probed[python] = _call([python, "-c", PROBE_CODE],
+                                    PROBE_TIMEOUT) == 0
+        except (OSError, ValueError):
+            _probed[python] = False
+    return _probed[python]
+
+
+def find_python():
+    """
+    Returns
+    -------
+    str or None
+        CPython interpreter for the helper process, taken from the
+        MODELCHECKER_PYTHON variable or the PATH. Interpreters that fail
+        usable_python are passed over.
+    """
+    python = os.environ.get(PYTHON_VARIABLE)
+    if python:
+        return python if os.path.isfile(python) and usable_python(python) \
+            else None
+    if not sys.platform.startswith("cli") and sys.executable:
+        return sys.executable
+    names = ("python.exe", "python3.exe") if os.name == "nt" \
+        else ("python3", "python")
+    for folder in os.environ.get("PATH", "").split(os.pathsep):
+        for name in names:
+            candidate = os.path.join(folder.strip('"'), name)
+            if os.path.isfile(candidate) and usable_python(candidate):
+                return candidate
+    return None
+
+
+def evaluate_in_helper(compiled_checks, elements, python=None, workers=None,
+                       profiler=None, full=False, tables=None, timeout=None):
+    """
+    Evaluates checks in a CPython helper process with a worker pool.
+
+    Used from IronPython inside Revit: the elements are written to a
+    snapshot file, evaluated by the helper and the results merged back.
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+    elements : iterable
+        Element records
+    python : str
+        CPython interpreter, found with find_python when omitted
+    workers : int
+        Number of worker processes, all cores when omitted
+    profiler : CheckProfiler
+        Receives the measurements of every supported check
+    full : bool
+        Collect every match regardless of the result condition
+    tables : dict
+        Name tables of the coded fields of the elements
+    timeout : float
+        Seconds the helper may run, helper_timeout() when omitted
+
+    Returns
+    -------
+    list
+        CheckResult items in the order of compiled_checks
+
+    Raises
+    ------
+    RuntimeError
+        No interpreter was found, or the helper process could not be
+        started, failed or ran longer than the timeout
+    """
+    python = python or find_python()
+    if not python:
+        raise RuntimeError("No CPython interpreter found, set {}"
+                           .format(PYTHON_VARIABLE))
+    folder = tempfile.mkdtemp(prefix="mc_parallel_")
+    try:
+        snapshot_path = os.path.join(folder, "snapshot.jsonl")
+        job_path = os.path.join(folder, "job.json")
+        results_path = os.path.join(folder, "results.json")
+        write_snapshot(snapshot_path, elements, tables)
+        write_job(job_path, compiled_checks, snapshot_path, full)
+        command = [python, os.path.abspath(__file__).replace(".pyc", ".py"),
+                   job_path, results_path]
+        if workers:
+            command += ["--workers", str(workers)]
+        timeout = timeout or helper_timeout()
+        try:
+            code = _call(command, timeout)
+        except OSError as err:
+            raise RuntimeError("Helper process could not be started: {}"
+                               .format(err))
+        if code is None:
+            raise RuntimeError("Helper process stopped after {:.0f} s"
+                               .format(timeout))
+        if code or not os.path.exists(results_path):
+            raise RuntimeError("Helper process failed with exit code {}"
+                               .format(code))
+        with open(results_path, "r") as results:
+            data = json.load(results)
+        _add_profiles(profiler, compiled_checks, dict(data["profiles"]))
+        return merge_results(compiled_checks, dict(data["found"]))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("job")
+    parser.add_argument("results")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    run_job(args.job, args.results, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,173 @@
+""" Module to reorder the filters of Model Checker checks by selectivity
+
+Filters of a branch are AND-ed (includes) or AND NOT-ed (excludes), so
+their order does not change the result, only how early an element is
+rejected. The planner measures the cost of every distinct filter and the
+share of elements it lets through on a sample of the snapshot, then orders
+the steps of each branch by cost / rejection rate, cheapest and most
+selective first. Or branches stay separate; they are only tried in order
+of how likely they are to match, since any match decides the check.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import random
+import time
+
+from rule_utils import Branch, CompiledCheck
+from bitset_utils import SharedPredicates, bit_count
+
+# Elements sampled from the snapshot to estimate filters
+SAMPLE_SIZE = 2000
+
+# Rejection rate used for filters that rejected no sampled element
+MIN_REJECTION = 1e-3
+
+
+def sample_elements(elements, size=SAMPLE_SIZE, seed=0):
+    """
+    Returns
+    -------
+    list
+        Up to size elements drawn from the snapshot, in snapshot order
+    """
+    if len(elements) <= size:
+        return list(elements)
+    positions = sorted(random.Random(seed).sample(range(len(elements)), size))
+    return [elements[position] for position in positions]
+
+
+class FilterPlanner:
+    """
+    Orders the filters of compiled checks from statistics on a sample.
+
+    Attributes
+    ----------
+    sample : list
+        Sampled element records, with the name tables of their snapshot
+        when it has coded fields (see rule_utils.bind_tables)
+    costs : dict
+        FilterSpec.key() -> seconds to evaluate the filter on the sample
+    reordered : int
+        Branches whose steps changed order
+
+    Methods
+    -------
+    plan(check)
+        Returns the check with its branches and steps reordered
+    plan_checks(checks)
+        Plans a list of checks
+    """
+    def __init__(self, sample, tables=None):
+        self.sample = sample
+        self.costs = {}
+        self.reordered = 0
+        self._predicates = SharedPredicates(sample, tables)
+
+    def _filter_bits(self, spec):
+        key = spec.key()
+        if key not in self.costs:
+            # Per element cost, shared columns would hide it in bitsets
+            predicate = self._predicates.predicate(spec)
+            start = time.time()
+            for element in self.sample:
+                predicate(element)
+            self.costs[key] = time.time() - start
+        return self._predicates.filter_bits(spec)
+
+    def _gate_bits(self, branch):
+        if branch.categories is None:
+            return self._predicates.all_bits
+        return self._predicates.category_bits(branch.categories)
+
+    def _pass_rate(self, spec, negated, gate, gate_count):
+        bits = self._filter_bits(spec)
+        if negated:
+            bits = ~bits
+        return float(bit_count(bits & gate)) / gate_count
+
+    def plan_branch(self, branch):
+        """
+        Orders the steps of a branch.
+
+        Parameters
+        ----------
+        branch : Branch
+            Compiled branch
+
+        Returns
+        -------
+        tuple
+            (Branch with ordered steps, estimated share of elements that
+            match the branch)
+        """
+        gate = self._gate_bits(branch)
+        gate_count = bit_count(gate)
+        if not gate_count or len(branch.steps) < 2:
+            share = float(gate_count) / max(1, len(self.sample))
+            return branch, share
+        ranked = []
+        share = float(gate_count) / len(self.sample)
+        for position, step in enumerate(branch.steps):
+            spec, _, negated = step
+            passed = self._pass_rate(spec, negated, gate, gate_count)
+            share *= passed
+            rank = self.costs[spec.key()] / max(1.0 - passed, MIN_REJECTION)
+            ranked.append((rank, position, step))
+        ranked.sort(key=lambda item: (item[0], item[1]))
+        steps = [step for _, _, step in ranked]
+        if [position for _, position, _ in ranked] != \
+                list(range(len(ranked))):
+            self.reordered += 1
+        return Branch(branch.categories, branch.includes, branch.excludes,
+                      steps), share
+
+    def plan(self, check):
+        """
+        Plans a compiled check.
+
+        Parameters
+        ----------
+        check : CompiledCheck
+            Compiled check
+
+        Returns
+        -------
+        CompiledCheck
+            Equivalent check, unsupported checks are returned unchanged
+        """
+        if not check.supported or not self.sample:
+            return check
+        planned = [self.plan_branch(branch) for branch in check.branches]
+        # The most likely branch first, any match decides the check
+        order = sorted(range(len(planned)), key=lambda i: -planned[i][1])
+        return CompiledCheck(check.spec,
+                             [planned[index][0] for index in order],
+                             check.problems)
+
+    def plan_checks(self, checks):
+        """ Plans every check, see plan. """
+        return [self.plan(check) for check in checks]
+
+
+def plan_checks(compiled_checks, elements, sample_size=SAMPLE_SIZE,
+                tables=None):
+    """
+    Reorders the filters of checks using a sample of the elements.
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+    elements : list
+        Element records of the snapshot
+    sample_size : int
+        Number of elements to sample
+    tables : dict
+        Name tables of the snapshot, see rule_utils.bind_tables
+
+    Returns
+    -------
+    list
+        Equivalent CompiledCheck items in the same order
+    """
+    planner = FilterPlanner(sample_elements(elements, sample_size), tables)
+    return planner.plan_checks(compiled_checks)
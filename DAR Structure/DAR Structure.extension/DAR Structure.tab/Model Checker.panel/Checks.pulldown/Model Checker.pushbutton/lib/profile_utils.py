@@ -0,0 +1,167 @@
+""" Module to profile Model Checker check evaluation
+
+The evaluators report every check they evaluate to a CheckProfiler: wall
+time, elements scanned (in the category gate of the check), elements
+matched and how many filter bitsets were evaluated or served from the
+shared predicate cache. The time to build a shared filter bitset is split
+over the checks that use it and also reported on its own. Profiles of the
+same check are summed, e.g. over the passes of an incremental run or the
+shards of a parallel run.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_PROFILE_DIR = os.path.join(
+    os.environ.get("LOCALAPPDATA") or tempfile.gettempdir(),
+    "DAR Structure", "ModelCheckerProfiles")
+
+# Fields of a profile record in the order of the report table
+PROFILE_FIELDS = ("seconds", "scanned", "matched", "filters_evaluated",
+                  "cache_hits", "filter_seconds")
+
+
+class CheckProfiler:
+    """
+    Per-check measurements of a run.
+
+    Attributes
+    ----------
+    records : list
+        Profile records (dicts) in the order checks were first seen
+
+    Methods
+    -------
+    record(check, seconds, scanned, matched, filters_evaluated, cache_hits,
+           filter_seconds)
+        Adds the measurements of one check evaluation
+    slowest(count)
+        Records with the highest wall time
+    write_jsonl(path)
+        Writes one record per line
+    """
+    def __init__(self):
+        self.records = []
+        self._by_check = {}
+
+    def _entry(self, check):
+        spec = check.spec
+        key = (spec.id, spec.name, spec.section)
+        entry = self._by_check.get(key)
+        if entry is None:
+            entry = {"id": spec.id, "check": spec.name,
+                     "section": spec.section,
+                     "result_condition": spec.result_condition}
+            for field in PROFILE_FIELDS:
+                entry[field] = 0
+            self._by_check[key] = entry
+            self.records.append(entry)
+        return entry
+
+    def record(self, check, seconds, scanned, matched, filters_evaluated=0,
+               cache_hits=0, filter_seconds=0.0):
+        """
+        Adds the measurements of one check evaluation.
+
+        Parameters
+        ----------
+        check : CompiledCheck
+            Evaluated check
+        seconds : float
+            Wall time, including filter_seconds
+        scanned : int
+            Elements the check had to look at
+        matched : int
+            Elements the check matched
+        filters_evaluated : int
+            Filter bitsets evaluated for the check
+        cache_hits : int
+            Filter bitsets served from the shared predicate cache
+        filter_seconds : float
+            Share of the check in the time to build shared filter bitsets
+        """
+        self.add(check, {"seconds": seconds, "scanned": scanned,
+                         "matched": matched,
+                         "filters_evaluated": filters_evaluated,
+                         "cache_hits": cache_hits,
+                         "filter_seconds": filter_seconds})
+
+    def add(self, check, measurements):
+        """ Adds a dict of PROFILE_FIELDS values to the record of check. """
+        entry = self._entry(check)
+        for field in PROFILE_FIELDS:
+            entry[field] += measurements.get(field, 0)
+
+    @property
+    def total_seconds(self):
+        """ Wall time of all profiled checks. """
+        return sum(record["seconds"] for record in self.records)
+
+    def slowest(self, count=20):
+        """
+        Returns
+        -------
+        list
+            Up to count records with the highest wall time
+        """
+        return sorted(self.records, key=lambda record: -record["seconds"])[
+            :count]
+
+    def write_jsonl(self, path):
+        """
+        Writes the records to a JSON lines file.
+
+        Parameters
+        ----------
+        path : str
+            File to write, folders are created
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(path, "w") as profile:
+            for record in self.records:
+                profile.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def profile_path(name, directory=None):
+    """
+    Returns
+    -------
+    str
+        Time-stamped profile file for a run
+    """
+    return os.path.join(directory or DEFAULT_PROFILE_DIR, "{}_{}.jsonl".format(
+        name, time.strftime("%Y%m%d_%H%M%S")))
+
+
+def slowest_table(profiler, count=20):
+    """
+    Rows of the slowest checks for output.print_table.
+
+    Parameters
+    ----------
+    profiler : CheckProfiler
+        Profile of a run
+    count : int
+        Number of rows
+
+    Returns
+    -------
+    tuple
+        (rows, column names)
+    """
+    total = profiler.total_seconds or 1.0
+    rows = []
+    for record in profiler.slowest(count):
+        rows.append([record["check"],
+                     "{:.1f}".format(record["seconds"] * 1e3),
+                     "{:.0%}".format(record["seconds"] / total),
+                     "{:.1f}".format(record["filter_seconds"] * 1e3),
+                     record["scanned"], record["matched"],
+                     record["filters_evaluated"], record["cache_hits"]])
+    columns = ["Check", "Time (ms)", "Share", "Filters (ms)", "Scanned",
+               "Matched", "Filters Evaluated", "Cache Hits"]
+    return rows, columns
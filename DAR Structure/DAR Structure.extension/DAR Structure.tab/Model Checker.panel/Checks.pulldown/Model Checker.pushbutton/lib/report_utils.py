@@ -0,0 +1,248 @@
+""" Module to write Model Checker reports to disk as results come in
+
+ReportWriter streams an HTML report and a JSON lines file row by row, so
+the report is never held in memory. The summary table goes to the HTML
+file; the elements of failed and listing checks go to temporary details
+files that are appended when the report is closed. Passed checks have no
+details, the element a FailNoElements check found is not a failure. The
+elements are embedded as JSON pages and rendered one page at a time by a
+small script, so a report listing 50k elements keeps a small DOM and opens
+quickly.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import codecs
+import json
+import os
+import shutil
+import tempfile
+import time
+from xml.sax.saxutils import escape
+
+from rule_utils import FAIL, INFO
+
+try:
+    string_types = (str, unicode)
+except NameError:
+    string_types = (str,)
+
+REPORT_FORMAT = 1
+
+# Kind stored in the header line of the JSON lines report
+REPORT_KIND = "report"
+
+# Elements per page of a details table
+PAGE_SIZE = 500
+
+# Status of a result -> heading its elements are listed under
+DETAIL_HEADINGS = ((FAIL, "Failing Elements"), (INFO, "Listed Elements"))
+
+# Columns of a details table when no describe function is given
+ELEMENT_COLUMNS = ("Element Id",)
+
+STYLE = """
+body { font-family: Arial, sans-serif; background-color: #f4f4f9; color: #333; }
+h1 { color: #00539C; }
+table { width: 100%; border-collapse: collapse; margin: 20px 0; }
+table, th, td { border: 1px solid #ccc; padding: 8px; }
+th { background-color: #f4f4f4; color: #00539C; }
+td { text-align: left; }
+details { margin: 10px 0; }
+summary { cursor: pointer; font-weight: bold; }
+.mc-pager button { margin-right: 6px; }
+"""
+
+# Renders the JSON pages of a details block when it is opened or paged
+SCRIPT = """
+function mcPages(block) {
+    return block.querySelectorAll("script.mc-page");
+}
+function mcShow(block, page) {
+    var pages = mcPages(block);
+    page = Math.max(0, Math.min(page, pages.length - 1));
+    block.setAttribute("data-page", page);
+    var rows = JSON.parse(pages[page].textContent);
+    var body = block.querySelector("tbody");
+    var html = [];
+    for (var i = 0; i < rows.length; i++) {
+        var cells = [];
+        for (var j = 0; j < rows[i].length; j++) {
+            var text = String(rows[i][j]).replace(/&/g, "&amp;")
+                .replace(/</g, "&lt;").replace(/>/g, "&gt;");
+            cells.push("<td>" + text + "</td>");
+        }
+        html.push("<tr>" + cells.join("") + "</tr>");
+    }
+    body.innerHTML = html.join("");
+    block.querySelector(".mc-position").textContent =
+        "Page " + (page + 1) + " of " + pages.length;
+}
+function mcPage(button, step) {
+    var block = button.closest("details");
+    mcShow(block, Number(block.getAttribute("data-page")) + step);
+}
+document.addEventListener("toggle", function (event) {
+    var block = event.target;
+    if (block.open && block.classList.contains("mc-details") &&
+            !block.hasAttribute("data-page")) {
+        mcShow(block, 0);
+    }
+}, true);
+"""
+
+
+def _text(value):
+    """ HTML-escaped text of a cell value. """
+    if value is None:
+        return ""
+    if not isinstance(value, string_types):
+        value = str(value)
+    return escape(value)
+
+
+def _json_script(data):
+    """ JSON that cannot end the <script> element it is embedded in. """
+    return json.dumps(data).replace("</", "<\\/")
+
+
+class ReportWriter:
+    """
+    Streams a Model Checker report to an HTML and a JSON lines file.
+
+    Attributes
+    ----------
+    html_path : str
+        HTML report
+    jsonl_path : str or None
+        JSON lines report, one header line then one line per check
+    describe : function
+        Takes an element id and returns a row of cells for the details
+        tables, see columns
+    columns : tuple
+        Column names of the details tables
+    rows : int
+        Checks written so far
+
+    Methods
+    -------
+    write_result(result, new, resolved)
+        Adds a check result to the report
+    close()
+        Finishes the report files
+    """
+    def __init__(self, html_path, title, details=(), jsonl_path=None,
+                 describe=None, columns=ELEMENT_COLUMNS,
+                 page_size=PAGE_SIZE):
+        self.html_path = html_path
+        self.jsonl_path = jsonl_path
+        self.describe = describe or (lambda element_id: [element_id])
+        self.columns = tuple(columns)
+        self.page_size = page_size
+        self.rows = 0
+        self._html = codecs.open(html_path, "w", "utf-8")
+        self._details = {}
+        for status, _ in DETAIL_HEADINGS:
+            handle, path = tempfile.mkstemp(suffix=".html")
+            os.close(handle)
+            self._details[status] = [path, codecs.open(path, "w", "utf-8"),
+                                     0]
+        self._jsonl = None
+        if jsonl_path:
+            self._jsonl = codecs.open(jsonl_path, "w", "utf-8")
+            header = {"format": REPORT_FORMAT, "kind": REPORT_KIND,
+                      "title": title,
+                      "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            header.update(dict(details))
+            self._jsonl.write(json.dumps(header, sort_keys=True) + "\n")
+        self._write_head(title, details)
+
+    def _write_head(self, title, details):
+        write = self._html.write
+        write(u"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"UTF-8\">\n")
+        write(u"<title>{}</title>\n".format(_text(title)))
+        write(u"<style>{}</style>\n".format(STYLE))
+        write(u"<script>{}</script>\n</head>\n<body>\n".format(SCRIPT))
+        write(u"<h1>{}</h1>\n".format(_text(title)))
+        for label, value in details:
+            write(u"<p>{}: {}</p>\n".format(_text(label), _text(value)))
+        write(u"<h2>Check Results</h2>\n<table>\n<tr><th>Check Name</th>"
+              u"<th>Result</th><th>Elements</th><th>New</th>"
+              u"<th>Resolved</th></tr>\n")
+
+    def write_result(self, result, new=0, resolved=0):
+        """
+        Adds a check result to the report.
+
+        Parameters
+        ----------
+        result : CheckResult
+            Result of a check
+        new : int
+            Elements matched since the last run
+        resolved : int
+            Elements no longer matched since the last run
+        """
+        self.rows += 1
+        anchor = "check-{}".format(self.rows)
+        name = _text(result.name)
+        details = self._details.get(result.status) \
+            if result.element_ids else None
+        if details is not None:
+            name = u"<a href=\"#{}\">{}</a>".format(anchor, name)
+        self._html.write(
+            u"<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td>"
+            u"</tr>\n".format(name, _text(result.status),
+                              _text(result.count_text), new, resolved))
+        if details is not None:
+            details[2] += 1
+            self._write_details(details[1].write, anchor, result)
+        if self._jsonl is not None:
+            spec = result.check.spec
+            self._jsonl.write(json.dumps({
+                "id": spec.id, "check": spec.name, "section": spec.section,
+                "status": result.status, "count": result.count,
+                "complete": result.complete, "new": new,
+                "resolved": resolved, "reason": result.check.skip_reason,
+                "element_ids": list(result.element_ids)},
+                sort_keys=True) + "\n")
+
+    def _write_details(self, write, anchor, result):
+        ids = result.element_ids
+        write(u"<details class=\"mc-details\" id=\"{}\">\n<summary>{} "
+              u"({} elements)</summary>\n".format(
+                  anchor, _text(result.name), _text(result.count_text)))
+        for start in range(0, len(ids), self.page_size):
+            rows = [self.describe(element_id)
+                    for element_id in ids[start:start + self.page_size]]
+            write(u"<script type=\"application/json\" class=\"mc-page\">"
+                  u"{}</script>\n".format(_json_script(rows)))
+        write(u"<div class=\"mc-pager\"><button type=\"button\" "
+              u"onclick=\"mcPage(this, -1)\">Previous</button><button "
+              u"type=\"button\" onclick=\"mcPage(this, 1)\">Next</button>"
+              u"<span class=\"mc-position\"></span></div>\n")
+        write(u"<table>\n<thead><tr>{}</tr></thead>\n<tbody></tbody>\n"
+              u"</table>\n</details>\n".format(
+                  u"".join(u"<th>{}</th>".format(_text(column))
+                           for column in self.columns)))
+
+    def close(self):
+        """ Appends the details and closes the report files. """
+        self._html.write(u"</table>\n")
+        for status, heading in DETAIL_HEADINGS:
+            path, details, blocks = self._details[status]
+            details.close()
+            if blocks:
+                self._html.write(u"<h2>{}</h2>\n".format(heading))
+                with codecs.open(path, "r", "utf-8") as details:
+                    shutil.copyfileobj(details, self._html)
+            os.remove(path)
+        self._html.write(u"<p>Generated by Model Checker Automation Script"
+                         u"</p>\n</body>\n</html>\n")
+        self._html.close()
+        if self._jsonl is not None:
+            self._jsonl.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,1132 @@
+""" Module to compile Model Checker checks into element predicates
+
+Checks are evaluated against an element snapshot instead of the live model.
+An element is a plain dict (see make_element) so the same rules run on data
+collected inside Revit and on in-memory stand-ins.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import numbers
+
+from matcher_utils import TEXT_CONDITIONS, InvalidPattern, text_matcher
+from unit_utils import UnknownUnit, unit_factor
+
+try:
+    string_types = (str, unicode)
+except NameError:
+    string_types = (str,)
+
+
+# Returned by field getters when an element does not define the parameter
+MISSING = object()
+
+# Tolerance for comparing numeric parameter values with template values
+TOLERANCE = 1e-9
+
+PASS = "Pass"
+FAIL = "Fail"
+INFO = "Info"
+SKIPPED = "Skipped"
+
+# Display names used in shipped templates in place of OST_* names
+CATEGORY_NAMES = {
+    "Connection Symbols": "OST_StructConnectionSymbols",
+    "Floors": "OST_Floors",
+    "Generic Models": "OST_GenericModel",
+    "Railings": "OST_StairsRailing",
+    "Ramps": "OST_Ramps",
+    "Stairs": "OST_Stairs",
+    "Structural Columns": "OST_StructuralColumns",
+    "Structural Foundations": "OST_StructuralFoundation",
+    "Structural Framing": "OST_StructuralFraming",
+    "Walls": "OST_Walls",
+}
+
+# Filter category -> element field holding the value
+ELEMENT_FIELDS = {
+    "TypeOrInstance": "is_type",
+    "Workset": "workset",
+    "PhaseCreated": "phase_created",
+    "Level": "level",
+    "Family": "family",
+    "Type": "type_name",
+    "APIType": "class_name",
+}
+
+# Filter category -> element field that snapshots with name tables store as
+# an integer code (workset id, phase element id) instead of a name
+CODED_FIELDS = {
+    "Workset": "workset",
+    "PhaseCreated": "phase_created",
+}
+
+VALUE_CONDITIONS = (
+    "Equal", "NotEqual", "Contains", "DoesNotContain", "WildCard",
+    "WildCardNoMatch", "GreaterThan", "GreaterOrEqual", "LessThan",
+    "LessOrEqual")
+ORDER_CONDITIONS = ("GreaterThan", "GreaterOrEqual", "LessThan",
+                    "LessOrEqual")
+PRESENCE_CONDITIONS = ("Defined", "Undefined", "HasValue", "HasNoValue")
+PARAMETER_CONDITIONS = ("MatchesParameter", "DoesNotMatchParameter")
+
+
+class UnsupportedFilter(ValueError):
+    """ Raised when a filter cannot be compiled into a predicate. """
+
+
+def make_element(id, category="", category_name="", is_type=False,
+                 class_name="", family="", type_name="", workset="",
+                 phase_created="", level="", unique_id=None, params=None,
+                 api=None):
+    """
+    Builds an element record as used by the rule engine.
+
+    Parameters
+    ----------
+    id : int
+        Element id
+    category : str
+        BuiltInCategory name (OST_*)
+    category_name : str
+        Category display name
+    is_type : bool
+        Element is an ElementType
+    class_name : str
+        Full .NET class name (Autodesk.Revit.DB.FamilyInstance)
+    family, type_name, workset, phase_created, level : str
+        Names of the related elements. workset and phase_created are int
+        codes instead when the snapshot has name tables, see bind_tables.
+    unique_id : str
+        Element UniqueId
+    params : dict
+        Parameter name (or BuiltInParameter name) -> value. Parameters an
+        element does not have are left out.
+    api : dict
+        API property name (Pinned, IsTemplate, ...) -> value
+
+    Returns
+    -------
+    dict
+    """
+    return {
+        "id": id,
+        "unique_id": unique_id if unique_id is not None else str(id),
+        "category": category,
+        "category_name": category_name,
+        "is_type": is_type,
+        "class_name": class_name,
+        "family": family,
+        "type_name": type_name,
+        "workset": workset,
+        "phase_created": phase_created,
+        "level": level,
+        "params": params or {},
+        "api": api or {},
+    }
+
+
+def to_text(value):
+    """
+    Text form of a parameter value as the templates spell it.
+
+    Parameters
+    ----------
+    value : object
+        Parameter value
+
+    Returns
+    -------
+    str
+    """
+    if value is None or value is MISSING:
+        return ""
+    if isinstance(value, string_types):
+        return value
+    if isinstance(value, bool):
+        return "True" if value else "False"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (list, tuple)):
+        return ", ".join(to_text(item) for item in value)
+    return str(value)
+
+
+def to_number(value):
+    """
+    Returns
+    -------
+    float or None
+        Numeric form of a value, None if it is not a number
+    """
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, numbers.Number):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_bool(text):
+    """
+    Returns
+    -------
+    bool or None
+        Boolean form of a template value, None if it is not a boolean
+    """
+    text = to_text(text).strip().lower()
+    if text in ("true", "1", "yes"):
+        return True
+    if text in ("false", "0", "no"):
+        return False
+    return None
+
+
+def category_key(name):
+    """
+    Returns
+    -------
+    str
+        OST_* name for a category named in a template
+    """
+    return CATEGORY_NAMES.get(name, name)
+
+
+def in_categories(element, names):
+    """ Checks if the element belongs to one of the categories. """
+    return element["category"] in names or element["category_name"] in names
+
+
+def _field_getter(spec, tables=None):
+    """ Returns a function reading the value a filter looks at. """
+    category = spec.category
+    name = spec.property
+    if tables and category in CODED_FIELDS:
+        field = CODED_FIELDS[category]
+        names = tables[field]
+        return lambda element: names.get(element[field], "")
+    if category == "Parameter":
+        return lambda element: element["params"].get(name, MISSING)
+    if category == "APIParameter":
+        return lambda element: element["api"].get(name, MISSING)
+    if category == "Category":
+        if name != "Name":
+            raise UnsupportedFilter(
+                "Category filters only support the Name property")
+        return lambda element: element["category_name"]
+    if category in ELEMENT_FIELDS:
+        field = ELEMENT_FIELDS[category]
+        return lambda element: element[field]
+    raise UnsupportedFilter('Unsupported filter category "{}"'.format(category))
+
+
+def _equals_test(expected, case_insensitive, factor):
+    number = to_number(expected)
+    flag = to_bool(expected)
+    text = expected.lower() if case_insensitive else expected
+
+    def test(actual):
+        if isinstance(actual, bool):
+            return flag is not None and actual == flag
+        if number is not None and isinstance(actual, numbers.Number):
+            return abs(actual * factor - number) <= TOLERANCE
+        actual = to_text(actual)
+        if case_insensitive:
+            actual = actual.lower()
+        return actual == text
+    return test
+
+
+def value_test(condition, expected, case_insensitive=False, factor=1.0):
+    """
+    Compiles a comparison against a template value.
+
+    Parameters
+    ----------
+    condition : str
+        One of VALUE_CONDITIONS
+    expected : str
+        Value attribute of the filter
+    case_insensitive : bool
+        Compare text ignoring case
+    factor : float
+        Multiplies numeric values before they are compared, see unit_factor
+
+    Returns
+    -------
+    function
+        Takes a defined value and returns a bool
+    """
+    if condition in ("Equal", "NotEqual"):
+        equals = _equals_test(expected, case_insensitive, factor)
+        if condition == "Equal":
+            return equals
+        return lambda actual: not equals(actual)
+
+    if condition in TEXT_CONDITIONS:
+        try:
+            matcher = text_matcher(condition, expected, case_insensitive)
+        except InvalidPattern as err:
+            raise UnsupportedFilter(str(err))
+        return lambda actual: matcher(to_text(actual))
+
+    if condition in ORDER_CONDITIONS:
+        limit = to_number(expected)
+        if limit is None:
+            raise UnsupportedFilter(
+                '{} needs a numeric value, got "{}"'.format(condition,
+                                                           expected))
+        compare = {
+            "GreaterThan": lambda number: number > limit,
+            "GreaterOrEqual": lambda number: number >= limit,
+            "LessThan": lambda number: number < limit,
+            "LessOrEqual": lambda number: number <= limit,
+        }[condition]
+
+        def test(actual):
+            number = to_number(actual)
+            return number is not None and compare(number * factor)
+        return test
+
+    raise UnsupportedFilter('Unsupported condition "{}"'.format(condition))
+
+
+def _code_matches(spec, tables):
+    """
+    Resolves a value filter on a coded field against its name table.
+
+    Returns
+    -------
+    tuple
+        (element field, frozenset of the codes whose name matches)
+    """
+    field = CODED_FIELDS[spec.category]
+    test = value_test(spec.condition, spec.value, spec.case_insensitive,
+                      filter_factor(spec))
+    return field, frozenset(code for code, name in tables[field].items()
+                            if test(name))
+
+
+def column_filter(spec, tables=None):
+    """
+    Splits a value filter into a field getter and a value test.
+
+    Value filters only depend on one field of the element, so they can be
+    evaluated once per distinct value of that field.
+
+    Parameters
+    ----------
+    spec : FilterSpec
+        Filter to split
+    tables : dict
+        Name tables of a snapshot with coded fields, see bind_tables
+
+    Returns
+    -------
+    tuple or None
+        (field key, getter, test) for value conditions, None otherwise.
+        The getter returns MISSING for undefined parameters, the test
+        takes a defined value.
+    """
+    if spec.condition not in VALUE_CONDITIONS:
+        return None
+    if spec.category == "TypeOrInstance" and spec.property != "Is Element Type":
+        raise UnsupportedFilter(
+            'Unsupported TypeOrInstance property "{}"'.format(spec.property))
+    if tables and spec.category in CODED_FIELDS:
+        field, codes = _code_matches(spec, tables)
+        return (spec.category,), lambda element: element[field], \
+            codes.__contains__
+    get = _field_getter(spec)
+    test = value_test(spec.condition, spec.value, spec.case_insensitive,
+                      filter_factor(spec))
+    if spec.category in ("Parameter", "APIParameter"):
+        key = (spec.category, spec.property)
+    else:
+        key = (spec.category,)
+    return key, get, test
+
+
+def filter_factor(spec):
+    """
+    Returns
+    -------
+    float
+        Factor from internal units to the Unit / UnitClass of a filter
+
+    Raises
+    ------
+    UnsupportedFilter
+        The unit is not known
+    """
+    try:
+        return unit_factor(spec.unit, spec.unit_class)
+    except UnknownUnit as err:
+        raise UnsupportedFilter(str(err))
+
+
+def numeric_filter(spec):
+    """
+    Numeric form of a value filter, for evaluating it on number arrays.
+
+    Parameters
+    ----------
+    spec : FilterSpec
+        Filter with one of VALUE_CONDITIONS
+
+    Returns
+    -------
+    tuple or None
+        (condition, limit, factor) for order conditions and for Equal /
+        NotEqual with a numeric value, None otherwise
+    """
+    if spec.category not in ("Parameter", "APIParameter"):
+        return None
+    if spec.condition not in ORDER_CONDITIONS and \
+            spec.condition not in ("Equal", "NotEqual"):
+        return None
+    limit = to_number(spec.value)
+    if limit is None:
+        return None
+    return spec.condition, limit, filter_factor(spec)
+
+
+def _is_empty(value):
+    if value is None:
+        return True
+    if isinstance(value, (list, tuple)):
+        return len(value) == 0
+    return to_text(value) == ""
+
+
+def compile_filter(spec, tables=None):
+    """
+    Compiles a filter into a predicate.
+
+    Parameters
+    ----------
+    spec : FilterSpec
+        Filter to compile
+    tables : dict
+        Name tables of a snapshot with coded fields, see bind_tables
+
+    Returns
+    -------
+    function
+        Takes an element record and returns a bool
+
+    Raises
+    ------
+    UnsupportedFilter
+        The filter category, property or condition is not supported
+    """
+    condition = spec.condition
+
+    if spec.category == "Category" and condition == "Included":
+        names = frozenset([spec.property, category_key(spec.property)])
+        if to_bool(spec.value) is False:
+            return lambda element: not in_categories(element, names)
+        return lambda element: in_categories(element, names)
+
+    if spec.category == "TypeOrInstance" and spec.property != "Is Element Type":
+        raise UnsupportedFilter(
+            'Unsupported TypeOrInstance property "{}"'.format(spec.property))
+
+    if tables and spec.category in CODED_FIELDS and \
+            condition in VALUE_CONDITIONS:
+        # The name is tested once per table entry, elements compare codes
+        field, codes = _code_matches(spec, tables)
+        return lambda element: element[field] in codes
+
+    get = _field_getter(spec, tables)
+
+    if condition in PRESENCE_CONDITIONS:
+        if condition == "Defined":
+            return lambda element: get(element) is not MISSING
+        if condition == "Undefined":
+            return lambda element: get(element) is MISSING
+        if condition == "HasValue":
+            def has_value(element):
+                value = get(element)
+                return value is not MISSING and not _is_empty(value)
+            return has_value
+
+        def has_no_value(element):
+            value = get(element)
+            return value is not MISSING and _is_empty(value)
+        return has_no_value
+
+    if condition in PARAMETER_CONDITIONS:
+        if spec.category != "Parameter":
+            raise UnsupportedFilter(
+                "{} is only supported on parameters".format(condition))
+        other = spec.value
+        matches = condition == "MatchesParameter"
+
+        def compare_parameters(element):
+            value = get(element)
+            other_value = element["params"].get(other, MISSING)
+            if value is MISSING or other_value is MISSING:
+                return False
+            return (to_text(value) == to_text(other_value)) == matches
+        return compare_parameters
+
+    test = value_test(condition, spec.value, spec.case_insensitive,
+                      filter_factor(spec))
+
+    def predicate(element):
+        value = get(element)
+        return value is not MISSING and test(value)
+    return predicate
+
+
+def split_branches(filters):
+    """
+    Splits the filters of a check into its Or branches.
+
+    An "Or" filter starts a new branch. Within a branch, "And" filters must
+    all match and "Exclude" filters remove elements.
+
+    Parameters
+    ----------
+    filters : list
+        FilterSpec items in document order
+
+    Returns
+    -------
+    list
+        One list of FilterSpec per branch
+    """
+    branches = []
+    for spec in filters:
+        if not branches or spec.operator == "Or":
+            branches.append([])
+        branches[-1].append(spec)
+    return branches
+
+
+def is_category_selector(spec):
+    """
+    Checks if a filter selects the categories of a branch.
+
+    Consecutive "Category ... Included" filters of a branch select any of
+    the listed categories rather than all of them.
+    """
+    return (spec.category == "Category" and spec.condition == "Included"
+            and spec.operator != "Exclude"
+            and to_bool(spec.value) is not False)
+
+
+class Branch:
+    """
+    One Or branch of a compiled check.
+
+    Attributes
+    ----------
+    categories : frozenset or None
+        Category names the element must be in, None for all categories
+    includes : list
+        (FilterSpec, predicate) pairs that must all match
+    excludes : list
+        (FilterSpec, predicate) pairs of which none may match
+    steps : list
+        (FilterSpec, predicate, negated) items in evaluation order, the
+        includes and then the excludes unless a planner reordered them
+    """
+    def __init__(self, categories, includes, excludes, steps=None):
+        self.categories = categories
+        self.includes = includes
+        self.excludes = excludes
+        if steps is None:
+            steps = [(spec, predicate, False) for spec, predicate in includes]
+            steps += [(spec, predicate, True) for spec, predicate in excludes]
+        self.steps = steps
+
+    def matches(self, element):
+        """ Checks if the element matches the branch. """
+        if self.categories is not None and \
+                not in_categories(element, self.categories):
+            return False
+        for _, predicate, negated in self.steps:
+            # An include must match, an exclude must not
+            if (not predicate(element)) != negated:
+                return False
+        return True
+
+
+class CompiledCheck:
+    """
+    A check compiled into Or branches of predicates.
+
+    Attributes
+    ----------
+    spec : CheckSpec
+        Source check
+    branches : list
+        Branch items
+    problems : list
+        (FilterSpec, reason) for filters that could not be compiled
+    """
+    def __init__(self, spec, branches, problems):
+        self.spec = spec
+        self.branches = branches
+        self.problems = problems
+
+    @property
+    def supported(self):
+        """ Check can be evaluated on an element snapshot. """
+        return (self.spec.check_type == "Custom" and bool(self.branches)
+                and not self.problems)
+
+    @property
+    def skip_reason(self):
+        """ Why an unsupported check is skipped. """
+        if self.spec.check_type != "Custom":
+            return "Built-in {} check".format(self.spec.check_type)
+        if not self.branches:
+            return "No filters"
+        if self.problems:
+            return "; ".join(reason for _, reason in self.problems)
+        return ""
+
+    def matches(self, element):
+        """ Checks if the element matches any branch. """
+        for branch in self.branches:
+            if branch.matches(element):
+                return True
+        return False
+
+
+def compile_check(spec):
+    """
+    Compiles a check once so it can be evaluated on many elements.
+
+    Parameters
+    ----------
+    spec : CheckSpec
+        Check to compile
+
+    Returns
+    -------
+    CompiledCheck
+    """
+    branches = []
+    problems = []
+    for branch_filters in split_branches(spec.filters):
+        categories = set()
+        includes = []
+        excludes = []
+        for filter_spec in branch_filters:
+            if is_category_selector(filter_spec):
+                categories.add(filter_spec.property)
+                categories.add(category_key(filter_spec.property))
+                continue
+            try:
+                predicate = compile_filter(filter_spec)
+            except UnsupportedFilter as err:
+                problems.append((filter_spec, str(err)))
+                continue
+            if filter_spec.operator == "Exclude":
+                excludes.append((filter_spec, predicate))
+            else:
+                includes.append((filter_spec, predicate))
+        branches.append(Branch(frozenset(categories) if categories else None,
+                               includes, excludes))
+    return CompiledCheck(spec, branches, problems)
+
+
+def bind_tables(compiled_checks, tables):
+    """
+    Binds compiled checks to the name tables of a snapshot.
+
+    Snapshots with name tables store the workset and phase of an element as
+    an integer code (CODED_FIELDS). Workset and PhaseCreated filters are
+    compiled again against the tables: their value is resolved to the set
+    of matching codes once, and elements are matched by integer lookup.
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+    tables : dict or None
+        Element field -> {code: name}, see snapshot_utils
+
+    Returns
+    -------
+    list
+        Equivalent CompiledCheck items, the same list without tables
+    """
+    if not tables:
+        return compiled_checks
+
+    def bind(items):
+        # (spec, predicate) pairs or (spec, predicate, negated) steps
+        bound_items = []
+        for item in items:
+            if item[0].category in CODED_FIELDS:
+                item = (item[0], compile_filter(item[0], tables)) + \
+                    tuple(item[2:])
+            bound_items.append(item)
+        return bound_items
+
+    bound = []
+    for check in compiled_checks:
+        if not any(spec.category in CODED_FIELDS
+                   for spec in check.spec.filters):
+            bound.append(check)
+            continue
+        branches = [Branch(branch.categories, bind(branch.includes),
+                           bind(branch.excludes), bind(branch.steps))
+                    for branch in check.branches]
+        bound.append(CompiledCheck(check.spec, branches, check.problems))
+    return bound
+
+
+def compile_template(template, enabled_only=True):
+    """
+    Compiles all checks of a template.
+
+    Parameters
+    ----------
+    template : Template
+        Parsed template
+    enabled_only : bool
+        Skip unchecked checks, sections and headings
+
+    Returns
+    -------
+    list
+        CompiledCheck items in document order
+    """
+    return [compile_check(spec)
+            for spec in template.iter_checks(enabled_only)]
+
+
+def skip_checks(compiled_checks, reasons):
+    """
+    Marks checks as unsupported, so their result is SKIPPED.
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+    reasons : dict
+        Check ID -> why the check is skipped, e.g. from
+        template_lint.TemplateLint.skipped_checks
+
+    Returns
+    -------
+    list
+        The checks, those with a reason replaced by unsupported copies
+    """
+    if not reasons:
+        return compiled_checks
+    checks = []
+    for check in compiled_checks:
+        reason = reasons.get(check.spec.id)
+        if reason and check.supported:
+            check = CompiledCheck(check.spec, check.branches,
+                                  check.problems + [(None, reason)])
+        checks.append(check)
+    return checks
+
+
+def required_fields(compiled_checks):
+    """
+    Lists the parameters and API properties the checks read.
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+
+    Returns
+    -------
+    tuple
+        (set of parameter names, set of API property names)
+    """
+    parameters = set()
+    api = set()
+    for check in compiled_checks:
+        for spec in check.spec.filters:
+            if spec.category == "Parameter":
+                parameters.add(spec.property)
+                if spec.condition in PARAMETER_CONDITIONS:
+                    parameters.add(spec.value)
+            elif spec.category == "APIParameter":
+                api.add(spec.property)
+    return parameters, api
+
+
+# How the matches of a check are collected, see collection_strategy
+FULL_LIST = "FullList"
+CAPPED_LIST = "CappedList"
+COUNT_ONLY = "CountOnly"
+FIRST_MATCH = "FirstMatch"
+
+# Element ids kept for checks collected as CAPPED_LIST
+LIST_LIMIT = 1000
+
+
+class CheckResult:
+    """
+    Outcome of one check.
+
+    Attributes
+    ----------
+    check : CompiledCheck
+        Evaluated check
+    element_ids : list
+        Ids of matching elements, possibly only the first ones
+    count : int
+        Number of matching elements
+    status : str
+        PASS, FAIL, INFO or SKIPPED
+    complete : bool
+        count is exact, False when evaluation stopped at the first match
+    """
+    def __init__(self, check, element_ids, count=None, status=None,
+                 complete=True):
+        self.check = check
+        self.element_ids = element_ids
+        self.count = len(element_ids) if count is None else count
+        self.status = status or result_status(check, self.count)
+        self.complete = complete
+
+    @property
+    def name(self):
+        return self.check.spec.name
+
+    @property
+    def count_text(self):
+        """ Count for reports, "1+" when evaluation stopped early. """
+        return "{}{}".format(self.count, "" if self.complete else "+")
+
+    def __repr__(self):
+        return '<CheckResult "{}" {} ({})>'.format(
+            self.name, self.status, self.count)
+
+
+def result_status(check, count):
+    """
+    Turns the number of matching elements into a check status.
+
+    Parameters
+    ----------
+    check : CompiledCheck
+        Evaluated check
+    count : int
+        Number of matching elements
+
+    Returns
+    -------
+    str
+        PASS, FAIL, INFO or SKIPPED
+    """
+    if not check.supported:
+        return SKIPPED
+    condition = check.spec.result_condition
+    if condition == "FailMatchingElements":
+        return FAIL if count else PASS
+    if condition == "FailNoElements":
+        return PASS if count else FAIL
+    return INFO
+
+
+def collection_strategy(check, full=False):
+    """
+    How the matches of a check are collected.
+
+    FailNoElements checks only need to know if anything matches
+    (FIRST_MATCH), CountOnly checks only need the count (COUNT_ONLY) and
+    FailMatchingElements checks list up to LIST_LIMIT elements
+    (CAPPED_LIST). All other checks list every element (FULL_LIST).
+
+    Parameters
+    ----------
+    check : CompiledCheck
+        Check to evaluate
+    full : bool
+        Collect every match regardless of the result condition
+
+    Returns
+    -------
+    str
+    """
+    if full:
+        return FULL_LIST
+    condition = check.spec.result_condition
+    if condition == "FailNoElements":
+        return FIRST_MATCH
+    if condition == "CountOnly":
+        return COUNT_ONLY
+    if condition == "FailMatchingElements":
+        return CAPPED_LIST
+    return FULL_LIST
+
+
+class ResultCollector:
+    """
+    Collects the matches of one check according to its strategy.
+
+    Attributes
+    ----------
+    check : CompiledCheck
+        Evaluated check
+    strategy : str
+        FULL_LIST, CAPPED_LIST, COUNT_ONLY or FIRST_MATCH
+    done : bool
+        No further match can change the result
+    """
+    def __init__(self, check, strategy, limit=LIST_LIMIT):
+        self.check = check
+        self.strategy = strategy
+        self.limit = limit
+        self.element_ids = []
+        self.count = 0
+        self.done = False
+
+    def add(self, element_id):
+        """ Records a matching element. """
+        self.count += 1
+        if self.strategy == COUNT_ONLY:
+            return
+        if self.strategy == CAPPED_LIST and \
+                len(self.element_ids) >= self.limit:
+            return
+        self.element_ids.append(element_id)
+        if self.strategy == FIRST_MATCH:
+            self.done = True
+
+    def merge(self, result):
+        """
+        Records the matches of a check evaluated on a part of the elements.
+
+        Parameters
+        ----------
+        result : CheckResult
+            Result of the check, collected with the same strategy
+        """
+        self.count += result.count
+        if self.strategy == COUNT_ONLY:
+            return
+        element_ids = result.element_ids
+        if self.strategy == CAPPED_LIST:
+            element_ids = element_ids[:max(0, self.limit -
+                                           len(self.element_ids))]
+        self.element_ids.extend(element_ids)
+        if self.strategy == FIRST_MATCH and self.element_ids:
+            self.done = True
+
+    def result(self):
+        """ CheckResult of the matches recorded so far. """
+        return CheckResult(self.check, self.element_ids, self.count,
+                           complete=self.strategy != FIRST_MATCH or
+                           not self.count)
+
+
+def collect_result(check, element_ids, strategy):
+    """
+    Result of a check from the ids of all its matching elements.
+
+    Parameters
+    ----------
+    check : CompiledCheck
+        Evaluated check
+    element_ids : list
+        Ids of every matching element
+    strategy : str
+        Collection strategy of the check
+
+    Returns
+    -------
+    CheckResult
+    """
+    if strategy == COUNT_ONLY:
+        return CheckResult(check, [], len(element_ids))
+    if strategy == CAPPED_LIST:
+        return CheckResult(check, element_ids[:LIST_LIMIT], len(element_ids))
+    return CheckResult(check, element_ids)
+
+
+class CheckDispatcher:
+    """
+    Looks up the checks an element can match by its category.
+
+    Checks whose branches all select categories are only offered elements
+    of those categories. All other checks are offered every element.
+
+    Attributes
+    ----------
+    checks : list
+        (index, CompiledCheck) pairs
+    """
+    def __init__(self, checks):
+        self.checks = checks
+        self._by_category = {}
+        self._any_category = []
+        self._cache = {}
+        for index, check in checks:
+            categories = self.check_categories(check)
+            if categories is None:
+                self._any_category.append((index, check))
+                continue
+            for name in categories:
+                self._by_category.setdefault(name, []).append((index, check))
+
+    @staticmethod
+    def check_categories(check):
+        """
+        Returns
+        -------
+        frozenset or None
+            Category names a check can match, None if any category
+        """
+        categories = set()
+        for branch in check.branches:
+            if branch.categories is None:
+                return None
+            categories.update(branch.categories)
+        return frozenset(categories)
+
+    def checks_for(self, element):
+        """
+        Returns
+        -------
+        list
+            (index, CompiledCheck) pairs to evaluate on the element
+        """
+        key = (element["category"], element["category_name"])
+        checks = self._cache.get(key)
+        if checks is None:
+            found = dict(self._any_category)
+            for name in key:
+                found.update(self._by_category.get(name, ()))
+            checks = sorted(found.items(), key=lambda item: item[0])
+            self._cache[key] = checks
+        return checks
+
+
+class CategoryIndex:
+    """
+    Inverted index from OST_* category to the checks it can affect.
+
+    A check is listed under every category its "Category ... Included"
+    filters select. Checks with a branch that selects no category can match
+    elements of any category and are kept apart.
+
+    Attributes
+    ----------
+    by_category : dict
+        OST_* name -> CompiledCheck items in document order
+    any_category : list
+        CompiledCheck items that are not limited to categories
+
+    Methods
+    -------
+    affected_checks(categories, include_any)
+        Checks to rerun after elements of the categories changed
+    """
+    def __init__(self, compiled_checks):
+        self.by_category = {}
+        self.any_category = []
+        self._order = {}
+        for position, check in enumerate(compiled_checks):
+            self._order[id(check)] = position
+            categories = CheckDispatcher.check_categories(check)
+            if categories is None:
+                self.any_category.append(check)
+                continue
+            for name in set(category_key(name) for name in categories):
+                self.by_category.setdefault(name, []).append(check)
+
+    @property
+    def categories(self):
+        """ Sorted OST_* names that have checks. """
+        return sorted(self.by_category.keys())
+
+    def affected_checks(self, categories, include_any=True):
+        """
+        Checks that can change when elements of the categories change.
+
+        Parameters
+        ----------
+        categories : iterable
+            OST_* names (display names are mapped with CATEGORY_NAMES)
+        include_any : bool
+            Also return checks that are not limited to categories
+
+        Returns
+        -------
+        list
+            CompiledCheck items in document order
+        """
+        found = {}
+        for name in categories:
+            for check in self.by_category.get(category_key(name), ()):
+                found[id(check)] = check
+        if include_any:
+            for check in self.any_category:
+                found[id(check)] = check
+        return sorted(found.values(), key=lambda check: self._order[id(check)])
+
+
+def check_categories(compiled_checks):
+    """
+    Categories the elements of a run must come from.
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+
+    Returns
+    -------
+    set or None
+        OST_* names, None if a check can match elements of any category
+    """
+    names = set()
+    for check in compiled_checks:
+        if not check.supported:
+            continue
+        categories = CheckDispatcher.check_categories(check)
+        if categories is None:
+            return None
+        names.update(category_key(name) for name in categories)
+    return names
+
+
+def evaluate_checks(compiled_checks, elements, full=False, tables=None):
+    """
+    Evaluates all checks in a single pass over the elements.
+
+    Checks stop being evaluated once their collector is done (FIRST_MATCH).
+
+    Parameters
+    ----------
+    compiled_checks : list
+        CompiledCheck items
+    elements : iterable
+        Element records, read once
+    full : bool
+        Collect every match regardless of the result condition
+    tables : dict
+        Name tables of the snapshot, see bind_tables
+
+    Returns
+    -------
+    list
+        CheckResult items in the order of compiled_checks
+    """
+    compiled_checks = bind_tables(compiled_checks, tables)
+    dispatcher = CheckDispatcher(
+        [(index, check) for index, check in enumerate(compiled_checks)
+         if check.supported])
+    collectors = [ResultCollector(check, collection_strategy(check, full))
+                  for check in compiled_checks]
+    for element in elements:
+        for index, check in dispatcher.checks_for(element):
+            collector = collectors[index]
+            if not collector.done and check.matches(element):
+                collector.add(element["id"])
+    return [collector.result() for collector in collectors]
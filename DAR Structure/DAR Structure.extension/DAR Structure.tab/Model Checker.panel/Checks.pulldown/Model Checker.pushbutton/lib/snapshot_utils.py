@@ -0,0 +1,484 @@
+""" Module to collect element snapshots for the Model Checker
+
+A snapshot can be written to a JSON lines file (one header line, then one
+element record per line) so it can be evaluated outside of Revit.
+
+Worksets and phases are read once per document into name tables; element
+records hold the workset id and the phase id as integer codes into them
+(see rule_utils.bind_tables). The tables travel in the snapshot header,
+as do the parameters, API properties and categories the records were
+collected with, so checks reading anything else can be skipped.
+"""
+#pylint: disable=import-error,invalid-name,broad-except,superfluous-parens
+import json
+
+from rule_utils import (
+    CODED_FIELDS, check_categories, make_element, required_fields)
+
+
+# Bump when the layout of a snapshot file changes
+SNAPSHOT_FORMAT = 2
+
+# Formats that can still be read, format 1 snapshots hold names only
+READ_FORMATS = (1, 2)
+
+# Kind stored in the header line, tells snapshots from other JSON lines
+# files such as the reports of report_utils
+SNAPSHOT_KIND = "snapshot"
+
+# Code of elements without a workset (not workshared) or a phase
+NO_CODE = -1
+
+
+def _id_value(element_id):
+    """ Integer value of an ElementId for all Revit versions. """
+    value = getattr(element_id, "Value", None)
+    if value is None:
+        value = element_id.IntegerValue
+    return int(value)
+
+
+def parameter_value(parameter):
+    """
+    Reads a parameter in its storage type.
+
+    Parameters
+    ----------
+    parameter : DB.Parameter
+        Parameter to read
+
+    Returns
+    -------
+    object
+        str, int, float (internal units) or None if the parameter is empty.
+        ElementId parameters return the name of the referenced element.
+    """
+    from pyrevit import DB
+    if not parameter.HasValue:
+        return None
+    storage = parameter.StorageType
+    if storage == DB.StorageType.String:
+        return parameter.AsString()
+    if storage == DB.StorageType.Integer:
+        return parameter.AsInteger()
+    if storage == DB.StorageType.Double:
+        return parameter.AsDouble()
+    if storage == DB.StorageType.ElementId:
+        return parameter.AsValueString()
+    return None
+
+
+class SnapshotCollector:
+    """
+    Turns Revit elements into element records for the rule engine.
+
+    Only the parameters and API properties the compiled checks read are
+    collected. Names of worksets, phases, levels and categories are looked
+    up once per id.
+
+    Attributes
+    ----------
+    doc : DB.Document
+        Document to collect from
+    tables : dict
+        Element field -> {code: name} for the CODED_FIELDS
+    parameter_names : set
+        Parameter and BuiltInParameter names to read
+    api_names : set
+        Element properties to read
+    categories : set
+        OST_* names to collect from, None for all elements
+
+    Methods
+    -------
+    contents()
+        What the records hold, for the snapshot header
+    iter_elements()
+        Yields an element record for every element and element type
+    """
+    def __init__(self, doc, parameter_names=(), api_names=(),
+                 categories=None):
+        from pyrevit import DB
+        self.doc = doc
+        self.parameter_names = set(parameter_names)
+        self.api_names = set(api_names)
+        self.categories = set(categories) if categories is not None \
+            else None
+        self._builtin = {}
+        for name in self.parameter_names:
+            self._builtin[name] = getattr(DB.BuiltInParameter, name, None)
+        # OST_* names resolved to BuiltInCategory values once, names this
+        # Revit version does not know are reported by template_lint
+        self._builtin_categories = None
+        if self.categories is not None:
+            self._builtin_categories = [
+                getattr(DB.BuiltInCategory, name)
+                for name in sorted(self.categories)
+                if hasattr(DB.BuiltInCategory, name)]
+        self._names = {}
+        self._categories = {}
+        self.tables = dict((field, {NO_CODE: ""})
+                           for field in CODED_FIELDS.values())
+        self._read_tables()
+
+    def contents(self):
+        """
+        What the element records of the collector hold.
+
+        Returns
+        -------
+        dict
+            Header values: "parameters" and "api" list the names read,
+            "categories" the OST_* names collected, None for all elements
+        """
+        return {"parameters": sorted(self.parameter_names),
+                "api": sorted(self.api_names),
+                "categories": sorted(self.categories)
+                if self.categories is not None else None}
+
+    def _read_tables(self):
+        from pyrevit import DB
+        if self.doc.IsWorkshared:
+            for workset in DB.FilteredWorksetCollector(self.doc):
+                self.tables["workset"][workset.Id.IntegerValue] = \
+                    workset.Name
+        for phase in self.doc.Phases:
+            self.tables["phase_created"][_id_value(phase.Id)] = phase.Name
+
+    def _element_name(self, element_id):
+        key = _id_value(element_id)
+        if key not in self._names:
+            element = self.doc.GetElement(element_id)
+            self._names[key] = element.Name if element else ""
+        return self._names[key]
+
+    def _workset_code(self, element):
+        if not self.doc.IsWorkshared:
+            return NO_CODE
+        code = element.WorksetId.IntegerValue
+        names = self.tables["workset"]
+        if code not in names:
+            workset = self.doc.GetWorksetTable().GetWorkset(element.WorksetId)
+            names[code] = workset.Name if workset else ""
+        return code
+
+    def _phase_code(self, phase_id):
+        from pyrevit import DB
+        if not phase_id or phase_id == DB.ElementId.InvalidElementId:
+            return NO_CODE
+        code = _id_value(phase_id)
+        names = self.tables["phase_created"]
+        if code not in names:
+            names[code] = self._element_name(phase_id)
+        return code
+
+    def _category(self, element):
+        import System
+        from pyrevit import DB
+        category = element.Category
+        if category is None:
+            return "", ""
+        key = _id_value(category.Id)
+        if key not in self._categories:
+            try:
+                ost = str(System.Enum.ToObject(DB.BuiltInCategory, key))
+            except Exception:
+                ost = ""
+            self._categories[key] = (ost, category.Name)
+        return self._categories[key]
+
+    def _parameter(self, element, type_element, name):
+        builtin = self._builtin.get(name)
+        for owner in (element, type_element):
+            if owner is None:
+                continue
+            if builtin is not None:
+                parameter = owner.get_Parameter(builtin)
+            else:
+                parameter = owner.LookupParameter(name)
+            if parameter is not None:
+                return True, parameter_value(parameter)
+        return False, None
+
+    def _api_value(self, element, name):
+        value = getattr(element, name, None)
+        if callable(value):
+            value = value()
+        if hasattr(value, "IntegerValue"):
+            return _id_value(value)
+        if value is not None and not isinstance(value, (str, bool, int,
+                                                        float)):
+            try:
+                return [_id_value(item) if hasattr(item, "IntegerValue")
+                        else item for item in value]
+            except TypeError:
+                return str(value)
+        return value
+
+    def element_record(self, element, is_type):
+        """
+        Builds the element record of one element.
+
+        Parameters
+        ----------
+        element : DB.Element
+            Element or element type
+        is_type : bool
+            Element is an ElementType
+
+        Returns
+        -------
+        dict
+        """
+        from pyrevit import DB
+        category, category_name = self._category(element)
+        if is_type:
+            type_element = None
+            family = getattr(element, "FamilyName", "") or ""
+            type_name = DB.Element.Name.GetValue(element)
+        else:
+            type_id = element.GetTypeId()
+            type_element = self.doc.GetElement(type_id) \
+                if type_id != DB.ElementId.InvalidElementId else None
+            family = getattr(type_element, "FamilyName", "") or ""
+            type_name = DB.Element.Name.GetValue(type_element) \
+                if type_element is not None else ""
+
+        params = {}
+        for name in self.parameter_names:
+            found, value = self._parameter(element, type_element, name)
+            if found:
+                params[name] = value
+        api = {}
+        for name in self.api_names:
+            try:
+                api[name] = self._api_value(element, name)
+            except Exception:
+                continue
+
+        phase_id = getattr(element, "CreatedPhaseId", None)
+        level_id = getattr(element, "LevelId", None)
+        return make_element(
+            _id_value(element.Id),
+            category=category,
+            category_name=category_name,
+            is_type=is_type,
+            class_name=element.GetType().FullName,
+            family=family,
+            type_name=type_name,
+            workset=self._workset_code(element),
+            phase_created=self._phase_code(phase_id),
+            level=self._element_name(level_id)
+            if level_id and level_id != DB.ElementId.InvalidElementId else "",
+            unique_id=element.UniqueId,
+            params=params,
+            api=api)
+
+    def _collector(self):
+        from pyrevit import DB
+        from System.Collections.Generic import List
+        collector = DB.FilteredElementCollector(self.doc)
+        if self.categories is None:
+            return collector
+        builtins = List[DB.BuiltInCategory]()
+        for builtin in self._builtin_categories:
+            builtins.Add(builtin)
+        return collector.WherePasses(DB.ElementMulticategoryFilter(builtins))
+
+    def iter_elements(self):
+        """
+        Yields an element record for every element and element type,
+        limited to the collector categories when they are set.
+
+        Returns
+        -------
+        generator
+            Element records
+        """
+        if self.categories is not None and not self._builtin_categories:
+            return
+        for element in self._collector().WhereElementIsNotElementType():
+            yield self.element_record(element, False)
+        for element in self._collector().WhereElementIsElementType():
+            yield self.element_record(element, True)
+
+
+def tables_to_data(tables):
+    """ Name tables as JSON data, keys of JSON objects are text. """
+    return dict((field, sorted(names.items()))
+                for field, names in tables.items())
+
+
+def tables_from_data(data):
+    """ Name tables from tables_to_data, None without data. """
+    if not data:
+        return None
+    return dict((field, dict((code, name) for code, name in items))
+                for field, items in data.items())
+
+
+def encode_elements(elements):
+    """
+    Replaces the workset and phase names of element records with codes.
+
+    Used for records built without a SnapshotCollector, e.g. synthetic
+    snapshots or snapshots of format 1.
+
+    Parameters
+    ----------
+    elements : iterable
+        Element records holding names
+
+    Returns
+    -------
+    tuple
+        (list of element records with codes, name tables)
+    """
+    tables = dict((field, {}) for field in CODED_FIELDS.values())
+    codes = dict((field, {}) for field in CODED_FIELDS.values())
+    records = []
+    for element in elements:
+        record = dict(element)
+        for field, names in tables.items():
+            code = codes[field].setdefault(element[field], len(names))
+            names[code] = element[field]
+            record[field] = code
+        records.append(record)
+    return records, tables
+
+
+def write_snapshot(path, elements, tables=None, **header):
+    """
+    Writes element records to a snapshot file.
+
+    Parameters
+    ----------
+    path : str
+        File to write
+    elements : iterable
+        Element records
+    tables : dict
+        Name tables of the coded fields of the records, complete before
+        the records are written since they go to the header line
+    header : dict
+        Extra values stored in the header line (model name, ...)
+
+    Returns
+    -------
+    int
+        Number of elements written
+    """
+    count = 0
+    header["format"] = SNAPSHOT_FORMAT
+    header["kind"] = SNAPSHOT_KIND
+    if tables:
+        header["tables"] = tables_to_data(tables)
+    with open(path, "w") as snapshot:
+        snapshot.write(json.dumps(header) + "\n")
+        for element in elements:
+            snapshot.write(json.dumps(element) + "\n")
+            count += 1
+    return count
+
+
+def read_snapshot_header(path):
+    """
+    Returns
+    -------
+    dict
+        Header line of a snapshot file
+
+    Raises
+    ------
+    ValueError
+        The file is not a snapshot or not of a supported format
+    """
+    with open(path, "r") as snapshot:
+        header = json.loads(snapshot.readline() or "{}")
+    # Snapshots written before the kind was stored have none
+    if header.get("kind", SNAPSHOT_KIND) != SNAPSHOT_KIND or \
+            "format" not in header:
+        raise ValueError("{} is not a Model Checker snapshot".format(path))
+    if header.get("format") not in READ_FORMATS:
+        raise ValueError("{} is a snapshot of format {}, not one of {}"
+                         .format(path, header.get("format"), READ_FORMATS))
+    return header
+
+
+def missing_data(header, check):
+    """
+    Lists what a check reads that a snapshot was not collected with.
+
+    Snapshots only hold the parameters, API properties and categories of
+    the checks picked when they were exported, see
+    SnapshotCollector.contents. Snapshots without these header values are
+    taken to hold everything.
+
+    Parameters
+    ----------
+    header : dict
+        Header line of the snapshot
+    check : CompiledCheck
+        Check to evaluate on the snapshot
+
+    Returns
+    -------
+    list
+        Reasons the check cannot be evaluated, empty if it can
+    """
+    reasons = []
+    parameters, api = required_fields([check])
+    for key, label, names in (("parameters", "Parameters", parameters),
+                              ("api", "API properties", api)):
+        if header.get(key) is None:
+            continue
+        missing = sorted(names - set(header[key]))
+        if missing:
+            reasons.append("{} not in the snapshot: {}".format(
+                label, ", ".join(missing)))
+    collected = header.get("categories")
+    if collected is not None:
+        needed = check_categories([check])
+        if needed is None:
+            reasons.append("Snapshot only holds some categories")
+        elif needed - set(collected):
+            reasons.append("Categories not in the snapshot: {}".format(
+                ", ".join(sorted(needed - set(collected)))))
+    return reasons
+
+
+def read_snapshot_tables(path):
+    """
+    Returns
+    -------
+    dict or None
+        Name tables of a snapshot file, None if its records hold names
+    """
+    return tables_from_data(read_snapshot_header(path).get("tables"))
+
+
+def iter_snapshot(path):
+    """
+    Yields the element records of a snapshot file one at a time.
+
+    Parameters
+    ----------
+    path : str
+        File written by write_snapshot
+
+    Returns
+    -------
+    generator
+        Element records
+    """
+    read_snapshot_header(path)
+    with open(path, "r") as snapshot:
+        snapshot.readline()
+        for line in snapshot:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_snapshot(path):
+    """ Element records of a snapshot file as a list. """
+    return list(iter_snapshot(path))
@@ -0,0 +1,288 @@
+""" Module to generate synthetic element snapshots for the Model Checker
+
+Synthetic snapshots stand in for a Revit model when checks are evaluated,
+tested or benchmarked outside of Revit. Categories, worksets, phases and
+levels follow the make-up of a typical structural model. When compiled
+checks are given, the categories, parameters and values their filters read
+are mixed in so that the checks match a realistic share of elements.
+
+Usage:
+    python synthetic_utils.py <snapshot.jsonl> <count> [template.xml ...]
+"""
+#pylint: disable=invalid-name,superfluous-parens
+from __future__ import print_function
+import random
+import re
+import sys
+
+from rule_utils import (
+    CATEGORY_NAMES, CheckDispatcher, category_key, compile_template,
+    make_element, to_number)
+
+
+# OST_* name, display name, share of the elements
+STRUCTURAL_CATEGORIES = (
+    ("OST_StructuralFraming", "Structural Framing", 30),
+    ("OST_StructuralColumns", "Structural Columns", 12),
+    ("OST_Floors", "Floors", 8),
+    ("OST_Walls", "Walls", 10),
+    ("OST_StructuralFoundation", "Structural Foundations", 6),
+    ("OST_Rebar", "Structural Rebar", 10),
+    ("OST_StructConnections", "Structural Connections", 5),
+    ("OST_GenericModel", "Generic Models", 3),
+    ("OST_Levels", "Levels", 1),
+    ("OST_Grids", "Grids", 1),
+    ("OST_Views", "Views", 4),
+    ("OST_Sheets", "Sheets", 1),
+    ("OST_Dimensions", "Dimensions", 5),
+    ("OST_TextNotes", "Text Notes", 3),
+    ("OST_RvtLinks", "RVT Links", 1),
+)
+
+WORKSETS = (
+    ("ST_Concrete", 35), ("ST_Steel", 30), ("ST_Foundations", 10),
+    ("Shared Levels and Grids", 5), ("Z_Link_AR", 5), ("Workset1", 15),
+)
+
+PHASES = (("New Construction", 85), ("Existing", 15))
+
+LEVELS = tuple(("Level {:02d}".format(number), 1) for number in range(12))
+
+API_TYPES = (
+    ("Autodesk.Revit.DB.FamilyInstance", 55), ("Autodesk.Revit.DB.Wall", 10),
+    ("Autodesk.Revit.DB.Floor", 8), ("Autodesk.Revit.DB.Element", 27),
+)
+
+# Share of elements that get a harvested value, an empty value and any
+# other value for a parameter they have
+TEMPLATE_VALUE_SHARE = 0.35
+EMPTY_VALUE_SHARE = 0.1
+
+# Share of elements that define a parameter of their category
+PARAMETER_SHARE = 0.85
+
+# Values that match no template value, shared to keep large snapshots small
+OTHER_VALUES = tuple("Value {}".format(number) for number in range(50))
+
+
+def _display_name(ost):
+    """ "OST_StructuralFraming" -> "Structural Framing" """
+    name = ost[4:] if ost.startswith("OST_") else ost
+    return re.sub(r"(?<=[a-z])(?=[A-Z])", " ", name)
+
+
+def _weighted(pairs):
+    """ Turns (value, weight) pairs into (values, cumulative weights). """
+    values = []
+    totals = []
+    total = 0
+    for value, weight in pairs:
+        total += weight
+        values.append(value)
+        totals.append(total)
+    return values, totals
+
+
+class SyntheticModel:
+    """
+    Generator of synthetic element records.
+
+    Attributes
+    ----------
+    seed : int
+        Seed of the random generator, equal seeds give equal snapshots
+    type_share : float
+        Share of element types among the elements
+    categories : list
+        (OST_* name, display name, weight) items
+    parameters : dict
+        OST_* name (None for all categories) -> {parameter name: values}
+    api : dict
+        OST_* name (None for all categories) -> {API property name: values}
+
+    Methods
+    -------
+    add_checks(compiled_checks)
+        Mixes in the categories, parameters and values the checks read
+    elements(count)
+        Yields count element records
+    """
+    def __init__(self, compiled_checks=None, seed=0, type_share=0.1):
+        self.seed = seed
+        self.type_share = type_share
+        self.categories = [tuple(item) for item in STRUCTURAL_CATEGORIES]
+        self.parameters = {None: {}}
+        self.api = {None: {}}
+        self.fields = {}
+        if compiled_checks:
+            self.add_checks(compiled_checks)
+
+    def _add_value(self, table, categories, name, value):
+        for category in categories:
+            values = table.setdefault(category, {}).setdefault(name, [])
+            if value is not None and value not in values:
+                values.append(value)
+
+    def add_checks(self, compiled_checks):
+        """
+        Mixes in the categories, parameters and values the checks read.
+
+        Parameters
+        ----------
+        compiled_checks : list
+            CompiledCheck items
+        """
+        known = set(category for category, _, _ in self.categories)
+        for check in compiled_checks:
+            gate = CheckDispatcher.check_categories(check)
+            if gate is None:
+                categories = [None]
+            else:
+                categories = sorted(set(category_key(name) for name in gate))
+            for category in categories:
+                if category is None or category in known:
+                    continue
+                known.add(category)
+                names = [name for name, ost in CATEGORY_NAMES.items()
+                         if ost == category]
+                self.categories.append(
+                    (category, names[0] if names else _display_name(category),
+                     1))
+            for spec in check.spec.filters:
+                value = spec.value if spec.value not in ("", "None") \
+                    else None
+                if spec.category == "Parameter":
+                    self._add_value(self.parameters, categories,
+                                    spec.property, value)
+                elif spec.category == "APIParameter":
+                    self._add_value(self.api, categories, spec.property,
+                                    value)
+                elif spec.category in ("Family", "Type", "Workset",
+                                       "PhaseCreated", "Level"):
+                    values = self.fields.setdefault(spec.category, [])
+                    if value is not None and value not in values:
+                        values.append(value)
+
+    def _value(self, rng, values):
+        draw = rng.random()
+        if draw < EMPTY_VALUE_SHARE:
+            return rng.choice((None, ""))
+        if values and draw < EMPTY_VALUE_SHARE + TEMPLATE_VALUE_SHARE:
+            value = rng.choice(values)
+            number = to_number(value)
+            if number is not None:
+                # Numbers scatter around the limit of the filter
+                return number * rng.uniform(0.5, 1.5)
+            if value.lower() in ("true", "false", "yes", "no"):
+                return rng.random() < 0.5
+            return value
+        return rng.choice(OTHER_VALUES)
+
+    def _field(self, rng, field, pairs):
+        values = self.fields.get(field)
+        if values and rng.random() < TEMPLATE_VALUE_SHARE:
+            return rng.choice(values)
+        return self._pick(rng, pairs)
+
+    @staticmethod
+    def _pick(rng, weighted):
+        values, totals = weighted
+        draw = rng.random() * totals[-1]
+        for value, total in zip(values, totals):
+            if draw < total:
+                return value
+        return values[-1]
+
+    def elements(self, count, start_id=1):
+        """
+        Yields synthetic element records.
+
+        Parameters
+        ----------
+        count : int
+            Number of elements
+        start_id : int
+            Id of the first element
+
+        Returns
+        -------
+        generator
+            Element records
+        """
+        rng = random.Random(self.seed)
+        categories = _weighted(((category, name), weight)
+                               for category, name, weight in self.categories)
+        worksets = _weighted(WORKSETS)
+        phases = _weighted(PHASES)
+        levels = _weighted(LEVELS)
+        api_types = _weighted(API_TYPES)
+        families = ["STR_{:03d}".format(number) for number in range(40)]
+        for number in range(count):
+            category, category_name = self._pick(rng, categories)
+            params = {}
+            for table in (self.parameters[None],
+                          self.parameters.get(category, {})):
+                for name, values in table.items():
+                    if rng.random() < PARAMETER_SHARE:
+                        params[name] = self._value(rng, values)
+            api = {"Pinned": rng.random() < 0.2}
+            for table in (self.api[None], self.api.get(category, {})):
+                for name, values in table.items():
+                    api[name] = self._value(rng, values)
+            family = rng.choice(families)
+            yield make_element(
+                start_id + number,
+                category=category,
+                category_name=category_name,
+                is_type=rng.random() < self.type_share,
+                class_name=self._pick(rng, api_types),
+                family=self._field(rng, "Family", ([family], [1])),
+                type_name=self._field(
+                    rng, "Type",
+                    (["{}_{}".format(family, rng.randint(1, 9))], [1])),
+                workset=self._field(rng, "Workset", worksets),
+                phase_created=self._field(rng, "PhaseCreated", phases),
+                level=self._field(rng, "Level", levels),
+                unique_id="synthetic-{:08x}".format(start_id + number),
+                params=params,
+                api=api)
+
+
+def synthetic_elements(count, compiled_checks=None, seed=0):
+    """
+    Synthetic element records.
+
+    Parameters
+    ----------
+    count : int
+        Number of elements
+    compiled_checks : list
+        CompiledCheck items whose filters shape the parameters and values
+    seed : int
+        Seed of the random generator
+
+    Returns
+    -------
+    generator
+        Element records
+    """
+    return SyntheticModel(compiled_checks, seed).elements(count)
+
+
+def main(argv):
+    from template_utils import load_template
+    from snapshot_utils import write_snapshot
+    if len(argv) < 2:
+        print(__doc__.strip())
+        return 2
+    checks = []
+    for path in argv[2:]:
+        checks.extend(compile_template(load_template(path)))
+    count = write_snapshot(argv[0], synthetic_elements(int(argv[1]), checks),
+                           model="synthetic")
+    print("{} elements written to {}".format(count, argv[0]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,304 @@
+""" Module to cache parsed Model Checker templates on disk
+
+A cache entry holds the template in a compact marshal file named after the
+SHA-1 of the template bytes. A changed template hashes to a new entry, so
+stale entries are never read and warm starts skip XML parsing entirely.
+
+A template is read as an outline first and only the sections picked for a
+run are expanded (see template_utils). The entry holds the outline, the
+checks of the sections expanded so far and the lint of the template (see
+template_lint); sections expanded later are added to it. A template is
+only linted when it has no entry yet.
+"""
+#pylint: disable=invalid-name,broad-except,superfluous-parens
+import hashlib
+import io
+import marshal
+import os
+import sys
+import tempfile
+
+from template_utils import (
+    Template, Heading, Section, CheckSpec, FilterSpec, expand_sections,
+    load_outline)
+from template_lint import TemplateLint, categories_key, lint_template
+
+
+# Bump when the layout of a cache entry changes
+CACHE_FORMAT = 4
+
+# marshal data is only readable by the interpreter version that wrote it
+CACHE_TAG = "{}{}{}".format(
+    sys.platform.startswith("cli") and "ipy" or "py", *sys.version_info[:2])
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("LOCALAPPDATA") or tempfile.gettempdir(),
+    "DAR Structure", "ModelCheckerCache")
+
+
+def check_to_data(check):
+    """
+    Returns
+    -------
+    tuple
+        Plain values of a CheckSpec and its filters
+    """
+    return (check.id, check.name, check.description, check.failure_message,
+            check.result_condition, check.check_type, check.is_checked,
+            check.heading, check.section,
+            tuple((f.id, f.operator, f.category, f.property, f.condition,
+                   f.value, f.case_insensitive, f.unit, f.unit_class)
+                  for f in check.filters))
+
+
+def check_from_data(data):
+    """
+    Returns
+    -------
+    CheckSpec
+        Check rebuilt from the values written by check_to_data
+    """
+    (check_id, name, description, failure_message, result_condition,
+     check_type, is_checked, heading, section, filters) = data
+    return CheckSpec(check_id, name, result_condition, check_type, is_checked,
+                     [FilterSpec(*filter_data) for filter_data in filters],
+                     description, failure_message, heading, section)
+
+
+def template_to_data(template):
+    """
+    Turns a template into nested tuples of plain values.
+
+    Parameters
+    ----------
+    template : Template
+        Template outline, the checks of its loaded sections are included
+
+    Returns
+    -------
+    tuple
+    """
+    headings = []
+    for heading in template.headings:
+        sections = []
+        for section in heading.sections:
+            checks = None
+            if section.loaded:
+                checks = tuple(check_to_data(check)
+                               for check in section.checks)
+            parent = section.parent.position if section.parent else -1
+            sections.append((section.id, section.name, section.title,
+                             section.is_checked, section.position, parent,
+                             section.check_count, checks))
+        headings.append((heading.id, heading.text, heading.is_checked,
+                         tuple(sections)))
+    lint = template.lint.to_data() if template.lint is not None else None
+    return (CACHE_FORMAT, template.name, template.author,
+            template.description, tuple(headings), lint)
+
+
+def template_from_data(data, path=None, check_factory=check_from_data):
+    """
+    Rebuilds a template from the tuples written by template_to_data.
+
+    Parameters
+    ----------
+    data : tuple
+        Cached template data
+    path : str
+        File the template was read from
+    check_factory : function
+        Builds a CheckSpec from check data
+
+    Returns
+    -------
+    Template
+    """
+    _, name, author, description, headings, lint = data
+    template = Template(name, author, description, path)
+    if lint is not None:
+        template.lint = TemplateLint.from_data(path, lint)
+    by_position = {}
+    for heading_id, text, is_checked, sections in headings:
+        heading = Heading(heading_id, text, is_checked)
+        for (section_id, section_name, title, section_checked, position,
+             parent, check_count, checks) in sections:
+            section = Section(section_id, section_name, title,
+                              section_checked, check_count=check_count,
+                              loaded=checks is not None, position=position,
+                              parent=by_position.get(parent))
+            if checks is not None:
+                section.checks = [check_factory(check) for check in checks]
+            by_position[position] = section
+            heading.sections.append(section)
+        template.headings.append(heading)
+    return template
+
+
+class TemplateCache:
+    """
+    Disk cache of parsed templates keyed by the SHA-1 of the XML bytes.
+
+    Attributes
+    ----------
+    directory : str
+        Folder holding the cache entries
+    hits : int
+        Templates read from the cache
+    misses : int
+        Templates parsed from XML
+    expanded : int
+        Sections read from XML because the entry did not hold them
+
+    Methods
+    -------
+    load(path)
+        Returns the template at path with all sections loaded
+    load_content(path, content)
+        Returns the outline of a template, from the cache when possible
+    expand(template, sections)
+        Loads sections of an outline and adds them to its entry
+    """
+    def __init__(self, directory=None):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.hits = 0
+        self.misses = 0
+        self.expanded = 0
+        # id of a template -> (template, digest, content, check factory)
+        self._sources = {}
+
+    def entry_path(self, digest):
+        """ Path of the cache entry for a template hash. """
+        return os.path.join(self.directory,
+                            "{}.{}.mcc".format(digest, CACHE_TAG))
+
+    def _read_entry(self, digest, path, check_factory):
+        entry = self.entry_path(digest)
+        if not os.path.exists(entry):
+            return None
+        try:
+            # loads() on the whole file is far faster than load() on a stream
+            with open(entry, "rb") as cached:
+                data = marshal.loads(cached.read())
+            if data[0] != CACHE_FORMAT:
+                return None
+            return template_from_data(data, path, check_factory)
+        except Exception:
+            # Unreadable entries are rebuilt from the XML
+            return None
+
+    def _write_entry(self, digest, template):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        entry = self.entry_path(digest)
+        temporary = "{}.{}.tmp".format(entry, os.getpid())
+        with open(temporary, "wb") as cached:
+            cached.write(marshal.dumps(template_to_data(template)))
+        if os.path.exists(entry):
+            os.remove(entry)
+        os.rename(temporary, entry)
+
+    def load(self, path):
+        """
+        Returns the template at path with all sections loaded.
+
+        Parameters
+        ----------
+        path : str
+            Absolute path to the .xml template
+
+        Returns
+        -------
+        Template
+        """
+        with open(path, "rb") as source:
+            content = source.read()
+        template = self.load_content(path, content)
+        self.expand(template, [section for _, section
+                               in template.iter_sections(enabled_only=False)])
+        return template
+
+    def load_content(self, path, content, digest=None, check_factory=None,
+                     known_categories=None):
+        """
+        Returns the outline of the template read from path.
+
+        Sections held by the cache entry are loaded, the others are loaded
+        by expand. On a cache miss only the outline is parsed and the
+        template is linted; template.lint holds the lint either way.
+
+        Parameters
+        ----------
+        path : str
+            File the template was read from
+        content : bytes
+            Template XML
+        digest : str
+            SHA-1 of content, computed when omitted
+        check_factory : function
+            Builds a CheckSpec from check data, so that callers can share
+            equal checks. Checks parsed from XML are passed through it too.
+        known_categories : set
+            OST_* names the template is linted against, see
+            template_lint.lint_filter
+
+        Returns
+        -------
+        Template
+        """
+        digest = digest or hashlib.sha1(content).hexdigest()
+        template = self._read_entry(digest, path,
+                                    check_factory or check_from_data)
+        if template is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            template = load_outline(path, io.BytesIO(content))
+        if template.lint is None or template.lint.categories_key != \
+                categories_key(known_categories):
+            template.lint = lint_template(path, known_categories, content)
+            self._save(digest, template)
+        self._sources[id(template)] = (template, digest, content,
+                                       check_factory)
+        return template
+
+    def expand(self, template, sections):
+        """
+        Loads the checks of sections of a template returned by load_content.
+
+        The sections read from XML are added to the cache entry, so the next
+        load of the template holds them.
+
+        Parameters
+        ----------
+        template : Template
+            Template returned by load_content
+        sections : list
+            Section items of the template to load
+
+        Returns
+        -------
+        list
+            Section items that were read from XML
+        """
+        source = self._sources.get(id(template))
+        if source is None or source[0] is not template:
+            return expand_sections(template, sections)
+        _, digest, content, check_factory = source
+        loaded = expand_sections(template, sections, io.BytesIO(content))
+        if not loaded:
+            return loaded
+        self.expanded += len(loaded)
+        if check_factory is not None:
+            for section in loaded:
+                section.checks = [check_factory(check_to_data(check))
+                                  for check in section.checks]
+        self._save(digest, template)
+        return loaded
+
+    def _save(self, digest, template):
+        try:
+            self._write_entry(digest, template)
+        except (IOError, OSError):
+            # A read-only cache folder only costs the warm start
+            pass
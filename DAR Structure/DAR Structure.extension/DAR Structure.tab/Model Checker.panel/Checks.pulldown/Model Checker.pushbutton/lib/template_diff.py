@@ -0,0 +1,351 @@
+""" Module to compare two Model Checker templates check by check
+
+Both templates are indexed by Check ID and by the normalised content of
+their checks (result condition and filters, without IDs and texts). Checks
+with the same ID are compared field by field and filter by filter. Checks
+left over on either side are paired by content, which finds checks that
+were copied under a new ID; the rest are added or removed.
+
+Usage:
+    python template_diff.py <old.xml> <new.xml> [--content-only] [--json F]
+"""
+#pylint: disable=invalid-name,superfluous-parens
+from __future__ import print_function
+import hashlib
+import json
+import sys
+
+from rule_utils import category_key
+
+# Fields of a check compared besides its filters
+CHECK_FIELDS = ("name", "description", "failure_message", "result_condition",
+                "check_type", "is_checked", "heading", "section")
+
+# Fields that only hold text shown to the user, ignored with content_only
+TEXT_FIELDS = ("name", "description", "failure_message", "heading",
+               "section")
+
+
+def filter_content(spec):
+    """
+    Normalised content of a filter.
+
+    Category names are resolved to OST_* names, values are stripped and
+    compared ignoring case when the filter does. The filter ID is left out.
+
+    Parameters
+    ----------
+    spec : FilterSpec
+        Filter to normalise
+
+    Returns
+    -------
+    tuple
+    """
+    prop = spec.property.strip()
+    if spec.category == "Category":
+        prop = category_key(prop)
+    value = spec.value.strip()
+    if spec.case_insensitive:
+        value = value.lower()
+    return (spec.operator, spec.category, prop, spec.condition, value,
+            spec.case_insensitive, spec.unit or "None",
+            spec.unit_class or "None")
+
+
+def check_content(spec):
+    """
+    Returns
+    -------
+    str
+        SHA-1 of the result condition and normalised filters of a check
+    """
+    data = [spec.result_condition, spec.check_type]
+    data.extend(filter_content(item) for item in spec.filters)
+    return hashlib.sha1(
+        json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class CheckChange:
+    """
+    Differences between two versions of a check.
+
+    Attributes
+    ----------
+    old : CheckSpec
+        Check in the old template
+    new : CheckSpec
+        Check in the new template
+    fields : list
+        (field, old value, new value) items of the changed CHECK_FIELDS
+    added_filters : list
+        FilterSpec items only in the new check
+    removed_filters : list
+        FilterSpec items only in the old check
+    modified_filters : list
+        (old FilterSpec, new FilterSpec) items with the same filter ID
+    reordered : bool
+        The filters are the same but in a different order
+    new_id : bool
+        The checks were paired by content, their IDs differ
+    """
+    def __init__(self, old, new, fields, added_filters, removed_filters,
+                 modified_filters, reordered, new_id=False):
+        self.old = old
+        self.new = new
+        self.fields = fields
+        self.added_filters = added_filters
+        self.removed_filters = removed_filters
+        self.modified_filters = modified_filters
+        self.reordered = reordered
+        self.new_id = new_id
+
+    @property
+    def filters_changed(self):
+        """ Checks if the filters of the check changed. """
+        return bool(self.added_filters or self.removed_filters or
+                    self.modified_filters or self.reordered)
+
+    def __bool__(self):
+        return bool(self.fields or self.filters_changed or self.new_id)
+
+    __nonzero__ = __bool__
+
+
+def compare_checks(old, new, fields=CHECK_FIELDS, new_id=False):
+    """
+    Compares two versions of a check.
+
+    Parameters
+    ----------
+    old : CheckSpec
+        Check in the old template
+    new : CheckSpec
+        Check in the new template
+    fields : tuple
+        Fields of the checks to compare besides the filters
+    new_id : bool
+        The checks were paired by content
+
+    Returns
+    -------
+    CheckChange
+        False when nothing changed
+    """
+    changed = [(field, getattr(old, field), getattr(new, field))
+               for field in fields
+               if getattr(old, field) != getattr(new, field)]
+    old_content = [filter_content(spec) for spec in old.filters]
+    new_content = [filter_content(spec) for spec in new.filters]
+    if old_content == new_content:
+        return CheckChange(old, new, changed, [], [], [], False, new_id)
+
+    # Pair filters by ID, then the rest by content
+    new_by_id = dict((spec.id, spec) for spec in new.filters)
+    paired = set()
+    modified = []
+    removed = []
+    for spec in old.filters:
+        other = new_by_id.get(spec.id)
+        if other is None or other.id in paired:
+            removed.append(spec)
+            continue
+        paired.add(other.id)
+        if filter_content(spec) != filter_content(other):
+            modified.append((spec, other))
+    added = [spec for spec in new.filters if spec.id not in paired]
+    unmatched = {}
+    for spec in added:
+        unmatched.setdefault(filter_content(spec), []).append(spec)
+    for spec in list(removed):
+        candidates = unmatched.get(filter_content(spec))
+        if candidates:
+            added.remove(candidates.pop(0))
+            removed.remove(spec)
+    reordered = not (added or removed or modified)
+    return CheckChange(old, new, changed, added, removed, modified,
+                       reordered, new_id)
+
+
+class TemplateDiff:
+    """
+    Differences between two templates.
+
+    Attributes
+    ----------
+    added : list
+        CheckSpec items only in the new template
+    removed : list
+        CheckSpec items only in the old template
+    modified : list
+        CheckChange items of checks that differ
+    unchanged : int
+        Number of checks that are the same in both templates
+
+    Methods
+    -------
+    changed_ids()
+        IDs of the checks of the new template that differ from the old one
+    to_data()
+        Plain data of the differences for JSON
+    """
+    def __init__(self, added, removed, modified, unchanged):
+        self.added = added
+        self.removed = removed
+        self.modified = modified
+        self.unchanged = unchanged
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+    __nonzero__ = __bool__
+
+    def changed_ids(self):
+        """
+        Returns
+        -------
+        set
+            IDs of added checks and of checks whose filters or result
+            condition changed, i.e. checks that need compiling again
+        """
+        ids = set(spec.id for spec in self.added)
+        for change in self.modified:
+            if change.filters_changed or any(
+                    field not in TEXT_FIELDS for field, _, _
+                    in change.fields):
+                ids.add(change.new.id)
+        return ids
+
+    def to_data(self):
+        """ Returns the differences as JSON-ready data. """
+        def check(spec):
+            return {"id": spec.id, "name": spec.name,
+                    "section": spec.section}
+
+        def filters(specs):
+            return [[spec.id] + list(filter_content(spec)) for spec in specs]
+        return {
+            "added": [check(spec) for spec in self.added],
+            "removed": [check(spec) for spec in self.removed],
+            "modified": [{
+                "old": check(change.old), "new": check(change.new),
+                "new_id": change.new_id,
+                "fields": [list(item) for item in change.fields],
+                "added_filters": filters(change.added_filters),
+                "removed_filters": filters(change.removed_filters),
+                "modified_filters": [
+                    filters(pair) for pair in change.modified_filters],
+                "reordered": change.reordered} for change in self.modified],
+            "unchanged": self.unchanged}
+
+
+def diff_templates(old, new, content_only=False, enabled_only=False):
+    """
+    Compares the checks of two templates.
+
+    Parameters
+    ----------
+    old : Template
+        Template to compare from
+    new : Template
+        Template to compare to
+    content_only : bool
+        Ignore differences in TEXT_FIELDS (names, descriptions, ...)
+    enabled_only : bool
+        Only compare enabled checks
+
+    Returns
+    -------
+    TemplateDiff
+    """
+    fields = tuple(field for field in CHECK_FIELDS
+                   if not (content_only and field in TEXT_FIELDS))
+    old_checks = list(old.iter_checks(enabled_only))
+    new_checks = list(new.iter_checks(enabled_only))
+    new_by_id = dict((spec.id, spec) for spec in new_checks)
+    old_ids = set(spec.id for spec in old_checks)
+
+    modified = []
+    unchanged = 0
+    removed = []
+    for spec in old_checks:
+        other = new_by_id.get(spec.id)
+        if other is None:
+            removed.append(spec)
+            continue
+        change = compare_checks(spec, other, fields)
+        if change:
+            modified.append(change)
+        else:
+            unchanged += 1
+    added = [spec for spec in new_checks if spec.id not in old_ids]
+
+    # Checks copied under a new ID have the same content
+    by_content = {}
+    for spec in added:
+        by_content.setdefault(check_content(spec), []).append(spec)
+    for spec in list(removed):
+        candidates = by_content.get(check_content(spec))
+        if candidates:
+            other = candidates.pop(0)
+            added.remove(other)
+            removed.remove(spec)
+            modified.append(compare_checks(spec, other, fields, True))
+    return TemplateDiff(added, removed, modified, unchanged)
+
+
+def _filter_text(spec):
+    return "{} {} {} {} \"{}\"".format(*filter_content(spec)[:5])
+
+
+def print_diff(result):
+    print("{} added, {} removed, {} modified, {} unchanged checks".format(
+        len(result.added), len(result.removed), len(result.modified),
+        result.unchanged))
+    for spec in result.added:
+        print("+ {} [{}]".format(spec.name, spec.id))
+    for spec in result.removed:
+        print("- {} [{}]".format(spec.name, spec.id))
+    for change in result.modified:
+        print("~ {} [{}]{}".format(
+            change.new.name, change.new.id,
+            " (was {})".format(change.old.id) if change.new_id else ""))
+        for field, old_value, new_value in change.fields:
+            print("    {}: {!r} -> {!r}".format(field, old_value, new_value))
+        for spec in change.added_filters:
+            print("    + filter {}".format(_filter_text(spec)))
+        for spec in change.removed_filters:
+            print("    - filter {}".format(_filter_text(spec)))
+        for old_spec, new_spec in change.modified_filters:
+            print("    ~ filter {} -> {}".format(_filter_text(old_spec),
+                                                 _filter_text(new_spec)))
+        if change.reordered:
+            print("    filters reordered")
+
+
+def main(argv):
+    import argparse
+    import time
+    from template_cache import TemplateCache
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--content-only", action="store_true",
+                        help="ignore names, descriptions and messages")
+    parser.add_argument("--json", help="write the differences to a file")
+    args = parser.parse_args(argv)
+    start = time.time()
+    cache = TemplateCache()
+    result = diff_templates(cache.load(args.old), cache.load(args.new),
+                            args.content_only)
+    seconds = time.time() - start
+    print_diff(result)
+    print("Compared in {:.0f} ms".format(seconds * 1e3))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(result.to_data(), output, indent=1)
+    return 1 if result else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,489 @@
+""" Module to check Model Checker templates before a run
+
+The template is read once with expat, which reports the line and column of
+every <Check> and <Filter>. Each filter is checked against the operators,
+conditions, units and filter categories the evaluator supports, and every
+category a filter names is resolved to its OST_* name. Errors are problems
+of the template itself (malformed XML) and stop the run before any element
+is collected. Problems of one check are warnings: a check that would give
+wrong results (unknown operator, condition or result condition, non-numeric
+limit, invalid pattern, unknown unit or category) is skipped, see
+TemplateLint.skipped_checks, and the other checks still run. The template
+cache keeps the lint of a template with its entry, so a template is only
+linted when its content changes.
+
+Usage:
+    python template_lint.py <template.xml> [<template.xml> ...] [--all]
+"""
+#pylint: disable=invalid-name,superfluous-parens
+from __future__ import print_function
+import hashlib
+import sys
+from xml.parsers import expat
+
+from template_utils import CheckSpec, FilterSpec, _is_true
+from rule_utils import (
+    PARAMETER_CONDITIONS, PRESENCE_CONDITIONS, VALUE_CONDITIONS,
+    UnsupportedFilter, category_key, compile_filter, is_category_selector)
+
+ERROR = "Error"
+WARNING = "Warning"
+
+# Operator attribute values of a filter
+OPERATORS = ("And", "Or", "Exclude")
+
+# ResultCondition attribute values of a check
+RESULT_CONDITIONS = ("FailMatchingElements", "FailNoElements", "CountOnly",
+                     "CountAndList")
+
+# Every Condition attribute value the evaluator knows
+CONDITIONS = (("Included",) + VALUE_CONDITIONS + PRESENCE_CONDITIONS +
+              PARAMETER_CONDITIONS)
+
+
+class LintProblem:
+    """
+    A problem found in a template.
+
+    Attributes
+    ----------
+    line : int
+        Line of the <Check> or <Filter> start tag, 1 based
+    column : int
+        Column of the start tag, 1 based
+    severity : str
+        ERROR or WARNING
+    message : str
+        What is wrong
+    check : str
+        Name of the check the problem is in, "" for the template itself
+    filter_id : str
+        ID of the filter, None for problems of a check
+    enabled : bool
+        The check is enabled together with its section and heading
+    section : int
+        Position of the section the check is in (see
+        template_utils.Section), None for problems of the template itself
+    check_id : str
+        ID of the check the problem is in, None for the template itself
+    skips : bool
+        The check is skipped because of the problem
+    """
+    def __init__(self, line, column, severity, message, check="",
+                 filter_id=None, enabled=True, section=None, check_id=None,
+                 skips=False):
+        self.line = line
+        self.column = column
+        self.severity = severity
+        self.message = message
+        self.check = check
+        self.filter_id = filter_id
+        self.enabled = enabled
+        self.section = section
+        self.check_id = check_id
+        self.skips = skips
+
+    def to_data(self):
+        """
+        Returns
+        -------
+        tuple
+            Plain values of the problem, see from_data
+        """
+        return (self.line, self.column, self.severity, self.message,
+                self.check, self.filter_id, self.enabled, self.section,
+                self.check_id, self.skips)
+
+    @classmethod
+    def from_data(cls, data):
+        """ Rebuilds a problem from the values written by to_data. """
+        return cls(*data)
+
+    def __str__(self):
+        where = "line {}, column {}".format(self.line, self.column)
+        if self.check:
+            where += ' (check "{}")'.format(self.check)
+        message = self.message
+        if self.skips:
+            message += ", the check is skipped"
+        return "{}: {}: {}".format(where, self.severity, message)
+
+
+class TemplateError(ValueError):
+    """
+    Raised for a malformed template, before any check is run.
+
+    Attributes
+    ----------
+    path : str
+        Template file
+    problems : list
+        LintProblem items with ERROR severity
+    """
+    def __init__(self, path, problems):
+        lines = ["{} has {} error(s):".format(path, len(problems))]
+        lines.extend(str(problem) for problem in problems)
+        ValueError.__init__(self, "\n".join(lines))
+        self.path = path
+        self.problems = problems
+
+
+def lint_filter(spec, known_categories=None):
+    """
+    Checks one filter.
+
+    Parameters
+    ----------
+    spec : FilterSpec
+        Filter to check
+    known_categories : set
+        OST_* names that exist (BuiltInCategory names in Revit). Without
+        it any name starting with OST_ is accepted.
+
+    Returns
+    -------
+    list
+        (severity, message, skips) items, empty when the filter is fine.
+        skips is True when the check of the filter cannot be evaluated.
+    """
+    problems = []
+    if spec.operator not in OPERATORS:
+        problems.append((WARNING, 'Unknown operator "{}", expected {}'
+                         .format(spec.operator, ", ".join(OPERATORS)), True))
+    if spec.condition not in CONDITIONS:
+        problems.append((WARNING, 'Unknown condition "{}"'.format(
+            spec.condition), True))
+        return problems
+    if spec.category == "Category" and spec.condition == "Included":
+        name = spec.property.strip()
+        key = category_key(name)
+        if not name:
+            problems.append((WARNING, "Category filter names no category",
+                             False))
+        elif known_categories is not None and key not in known_categories \
+                or known_categories is None and not key.startswith("OST_"):
+            problems.append((WARNING, 'Unknown category "{}", use its OST_* '
+                                      'name'.format(name), True))
+        return problems
+    # Non-numeric limits, invalid patterns and unknown units
+    try:
+        compile_filter(spec)
+    except UnsupportedFilter as err:
+        problems.append((WARNING, str(err), True))
+    return problems
+
+
+def lint_check(spec):
+    """
+    Checks the attributes of a check, its filters are checked separately.
+
+    Returns
+    -------
+    list
+        (severity, message, skips) items, empty when the check is fine
+    """
+    problems = []
+    if spec.result_condition not in RESULT_CONDITIONS:
+        problems.append((WARNING, 'Unknown result condition "{}"'.format(
+            spec.result_condition), True))
+    if spec.check_type == "Custom":
+        if not spec.filters:
+            problems.append((WARNING, "Check has no filters", True))
+        elif spec.filters[0].operator == "Exclude":
+            problems.append((WARNING, "Check starts with an Exclude filter",
+                             False))
+        elif all(is_category_selector(item) for item in spec.filters):
+            problems.append((WARNING, "Check only selects categories",
+                             False))
+    return problems
+
+
+class TemplateLint:
+    """
+    Outcome of linting a template.
+
+    Attributes
+    ----------
+    path : str
+        Template file
+    problems : list
+        LintProblem items in document order
+    checks : int
+        Checks read
+    filters : int
+        Filters read
+    categories_key : str
+        categories_key() of the category names the template was linted
+        against
+
+    Methods
+    -------
+    errors(enabled_only, sections)
+        LintProblem items with ERROR severity
+    warnings(enabled_only, sections)
+        LintProblem items with WARNING severity
+    raise_errors(enabled_only, sections)
+        Raises TemplateError when there are errors
+    skipped_checks(sections)
+        Why checks with problems are skipped, by check ID
+    to_data()
+        Plain values of the lint, see from_data
+    """
+    def __init__(self, path, key=""):
+        self.path = path
+        self.problems = []
+        self.checks = 0
+        self.filters = 0
+        self.categories_key = key
+
+    def _select(self, severity, enabled_only, sections):
+        return [problem for problem in self.problems
+                if problem.severity == severity and
+                (problem.enabled or not enabled_only) and
+                (sections is None or problem.section is None or
+                 problem.section in sections)]
+
+    def errors(self, enabled_only=True, sections=None):
+        """
+        Problems with ERROR severity, of enabled checks by default.
+
+        Parameters
+        ----------
+        enabled_only : bool
+            Leave out problems of disabled checks
+        sections : list
+            Positions of the sections to report, all sections when omitted.
+            Problems of the template itself are always reported.
+        """
+        return self._select(ERROR, enabled_only, sections)
+
+    def warnings(self, enabled_only=True, sections=None):
+        """ Problems with WARNING severity, see errors. """
+        return self._select(WARNING, enabled_only, sections)
+
+    def raise_errors(self, enabled_only=True, sections=None):
+        """
+        Raises
+        ------
+        TemplateError
+            The template has errors, in enabled checks of the given
+            sections by default
+        """
+        errors = self.errors(enabled_only, sections)
+        if errors:
+            raise TemplateError(self.path, errors)
+
+    def skipped_checks(self, sections=None):
+        """
+        Checks that cannot be evaluated because of their problems.
+
+        Parameters
+        ----------
+        sections : list
+            Positions of the sections to report, all sections when omitted
+
+        Returns
+        -------
+        dict
+            Check ID -> why the check is skipped, see rule_utils.skip_checks
+        """
+        reasons = {}
+        for problem in self._select(WARNING, False, sections):
+            if problem.skips:
+                reasons.setdefault(problem.check_id, []).append(
+                    problem.message)
+        return dict((check_id, "; ".join(messages))
+                    for check_id, messages in reasons.items())
+
+    def to_data(self):
+        """
+        Returns
+        -------
+        tuple
+            Plain values of the lint, for the template cache
+        """
+        return (self.categories_key, self.checks, self.filters,
+                tuple(problem.to_data() for problem in self.problems))
+
+    @classmethod
+    def from_data(cls, path, data):
+        """ Rebuilds a lint from the values written by to_data. """
+        key, checks, filters, problems = data
+        lint = cls(path, key)
+        lint.checks = checks
+        lint.filters = filters
+        lint.problems = [LintProblem.from_data(problem)
+                         for problem in problems]
+        return lint
+
+
+def categories_key(known_categories):
+    """
+    Returns
+    -------
+    str
+        Digest of a set of category names, "" for None. A cached lint is
+        only used with the category names it was made with.
+    """
+    if known_categories is None:
+        return ""
+    names = "\n".join(sorted(known_categories))
+    return hashlib.sha1(names.encode("utf-8")).hexdigest()
+
+
+class _Reader:
+    """ expat handlers collecting the problems of a template. """
+    def __init__(self, parser, lint, known_categories):
+        self.parser = parser
+        self.lint = lint
+        self.known_categories = known_categories
+        # IsChecked of the open Heading and Section elements
+        self.enabled = []
+        # Positions of the open Section elements, counted in document order
+        self.sections = []
+        self.section_count = 0
+        self.check = None
+        self.check_enabled = True
+        self.check_position = None
+        self.filter_positions = []
+
+    def position(self):
+        return (self.parser.CurrentLineNumber,
+                self.parser.CurrentColumnNumber + 1)
+
+    def add(self, position, problems, filter_id=None):
+        for severity, message, skips in problems:
+            self.lint.problems.append(LintProblem(
+                position[0], position[1], severity, message, self.check.name,
+                filter_id, self.check_enabled,
+                self.sections[-1] if self.sections else None, self.check.id,
+                skips))
+
+    def start(self, tag, attributes):
+        if tag in ("Heading", "Section"):
+            self.enabled.append(_is_true(attributes.get("IsChecked",
+                                                        "True")))
+        if tag == "Section":
+            self.sections.append(self.section_count)
+            self.section_count += 1
+        elif tag == "Check":
+            get = attributes.get
+            self.check = CheckSpec(
+                get("ID"), get("CheckName", ""),
+                result_condition=get("ResultCondition",
+                                     "FailMatchingElements"),
+                check_type=get("CheckType", "Custom"),
+                is_checked=_is_true(get("IsChecked", "True")))
+            self.check_enabled = self.check.is_checked and all(self.enabled)
+            self.check_position = self.position()
+            self.filter_positions = []
+            self.lint.checks += 1
+        elif tag == "Filter" and self.check is not None:
+            get = attributes.get
+            spec = FilterSpec(
+                get("ID"), get("Operator", "And"), get("Category", ""),
+                get("Property", ""), get("Condition", ""), get("Value", ""),
+                _is_true(get("CaseInsensitive")), get("Unit", "None"),
+                get("UnitClass", "None"))
+            self.check.filters.append(spec)
+            self.filter_positions.append(self.position())
+            self.lint.filters += 1
+
+    def end(self, tag):
+        if tag in ("Heading", "Section"):
+            self.enabled.pop()
+            if tag == "Section":
+                self.sections.pop()
+        elif tag == "Check" and self.check is not None:
+            self.add(self.check_position, lint_check(self.check))
+            for spec, position in zip(self.check.filters,
+                                      self.filter_positions):
+                self.add(position,
+                         lint_filter(spec, self.known_categories), spec.id)
+            self.check = None
+            self.check_enabled = True
+
+
+def lint_template(path, known_categories=None, source=None):
+    """
+    Checks every check and filter of a template.
+
+    Parameters
+    ----------
+    path : str
+        Absolute path to the .xml template
+    known_categories : set
+        OST_* names that exist, see lint_filter
+    source : bytes
+        Template content, read in place of path
+
+    Returns
+    -------
+    TemplateLint
+        A malformed file gives a TemplateLint with one ERROR at the
+        position expat stopped at
+    """
+    lint = TemplateLint(path, categories_key(known_categories))
+    parser = expat.ParserCreate()
+    reader = _Reader(parser, lint, known_categories)
+    parser.StartElementHandler = reader.start
+    parser.EndElementHandler = reader.end
+    try:
+        if source is not None:
+            parser.Parse(source, True)
+        else:
+            with open(path, "rb") as template_file:
+                parser.ParseFile(template_file)
+    except expat.ExpatError as err:
+        lint.problems.append(LintProblem(
+            err.lineno, err.offset + 1, ERROR,
+            "Malformed XML: {}".format(expat.ErrorString(err.code))))
+    return lint
+
+
+def validate_template(path, known_categories=None, source=None):
+    """
+    Lints a template and fails if it is malformed.
+
+    Returns
+    -------
+    TemplateLint
+        Holds the warnings and the checks to skip
+
+    Raises
+    ------
+    TemplateError
+        The template has errors
+    """
+    lint = lint_template(path, known_categories, source)
+    lint.raise_errors()
+    return lint
+
+
+def main(argv):
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("templates", nargs="+")
+    parser.add_argument("--all", action="store_true",
+                        help="also report problems of disabled checks")
+    args = parser.parse_args(argv)
+    failed = False
+    for path in args.templates:
+        start = time.time()
+        lint = lint_template(path)
+        seconds = time.time() - start
+        errors = lint.errors(not args.all)
+        warnings = lint.warnings(not args.all)
+        for problem in lint.problems:
+            if problem in errors or problem in warnings:
+                print("{}: {}".format(path, problem))
+        print("{}: {} checks, {} filters, {} errors, {} warnings in "
+              "{:.0f} ms".format(path, lint.checks, lint.filters,
+                                 len(errors), len(warnings), seconds * 1e3))
+        failed = failed or bool(errors)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,156 @@
+""" Module to share templates and checks within one Model Checker run
+
+The store is content addressed. Templates are keyed by the SHA-1 of their
+bytes, so copies of one file are read once. Checks are keyed by their
+definition (ids, attributes, filters and section), so a check shared
+by several templates, e.g. the SC and SS iLOD templates, is built and
+compiled once and the same CheckSpec is composed into every template.
+
+The store lives as long as the script engine. pyRevit runs each command in
+a fresh engine, so the store only spans one run; across runs templates are
+read from the TemplateCache on disk, which is keyed by the same SHA-1.
+The copies of the General Checks template shipped with each discipline are
+kept as files, the store only avoids parsing them more than once.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import hashlib
+
+from template_cache import TemplateCache, check_from_data
+from rule_utils import compile_check
+
+
+class TemplateStore:
+    """
+    Templates and checks loaded during a session.
+
+    Attributes
+    ----------
+    cache : TemplateCache
+        Disk cache templates are read through
+    checks : dict
+        Check data -> shared CheckSpec
+    templates : dict
+        SHA-1 of the template bytes -> Template
+    reused_checks : int
+        Check definitions served from the store
+    reused_templates : int
+        Template loads served from the store
+
+    Methods
+    -------
+    load(path)
+        Returns the outline of the template at path
+    expand(template, sections)
+        Loads sections of a template, composed from shared checks
+    compile(spec)
+        Returns the shared CompiledCheck of a check
+    """
+    def __init__(self, cache=None):
+        self.cache = cache or TemplateCache()
+        self.checks = {}
+        self.templates = {}
+        self.reused_checks = 0
+        self.reused_templates = 0
+        self._compiled = {}
+
+    def check(self, data):
+        """
+        Shared CheckSpec for check data written by check_to_data.
+
+        Parameters
+        ----------
+        data : tuple
+            Check data
+
+        Returns
+        -------
+        CheckSpec
+        """
+        spec = self.checks.get(data)
+        if spec is None:
+            spec = check_from_data(data)
+            self.checks[data] = spec
+        else:
+            self.reused_checks += 1
+        return spec
+
+    def load(self, path, known_categories=None):
+        """
+        Returns the outline of the template at path.
+
+        Sections held by the disk cache are loaded, load the others with
+        expand. template.lint holds the problems of the template.
+
+        Parameters
+        ----------
+        path : str
+            Absolute path to the .xml template
+        known_categories : set
+            OST_* names the template is linted against
+
+        Returns
+        -------
+        Template
+            Shared with every other path holding the same bytes
+        """
+        with open(path, "rb") as source:
+            content = source.read()
+        digest = hashlib.sha1(content).hexdigest()
+        template = self.templates.get(digest)
+        if template is not None:
+            self.reused_templates += 1
+            return template
+        template = self.cache.load_content(path, content, digest, self.check,
+                                           known_categories)
+        self.templates[digest] = template
+        return template
+
+    def expand(self, template, sections):
+        """
+        Loads the checks of sections of a template returned by load.
+
+        Parameters
+        ----------
+        template : Template
+            Template returned by load
+        sections : list
+            Section items of the template to load
+        """
+        self.cache.expand(template, sections)
+
+    def compile(self, spec):
+        """
+        Compiled check, built once per CheckSpec of the store.
+
+        Parameters
+        ----------
+        spec : CheckSpec
+            Check returned by the store
+
+        Returns
+        -------
+        CompiledCheck
+        """
+        entry = self._compiled.get(id(spec))
+        if entry is None or entry[0] is not spec:
+            entry = (spec, compile_check(spec))
+            self._compiled[id(spec)] = entry
+        return entry[1]
+
+
+_session = None
+
+
+def session_store():
+    """
+    The store shared by all template loads of this script engine.
+
+    Returns
+    -------
+    TemplateStore
+        Held in a module global, so it lasts for one pyRevit command run
+    """
+    global _session  # pylint: disable=global-statement
+    if _session is None:
+        _session = TemplateStore()
+    return _session
@@ -0,0 +1,513 @@
+""" Module to read Model Checker (MCSettings) XML templates
+
+Templates are read with iterparse. The <Heading>/<Section> outline is read
+up front and the <Check>/<Filter> nodes of a section are only turned into
+specs when that section is expanded. Parsed nodes are freed as soon as
+they have been read.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import xml.etree.ElementTree as ET
+
+# Nodes that are freed once their end tag has been read
+_FREED_TAGS = ("Check", "Section", "Heading")
+
+
+def _is_true(text):
+    return (text or "").strip().lower() in ("true", "1", "yes")
+
+
+class FilterSpec:
+    """
+    One <Filter> row of a check.
+
+    Attributes
+    ----------
+    id : str
+        Filter GUID
+    operator : str
+        And, Or or Exclude
+    category : str
+        Filter category (Category, Parameter, Workset, PhaseCreated, ...)
+    property : str
+        Category name, parameter name or property the filter looks at
+    condition : str
+        Comparison (Included, Equal, WildCard, HasNoValue, ...)
+    value : str
+        Value to compare against
+    case_insensitive : bool
+        Compare text ignoring case
+    unit : str
+        Unit of a numeric value
+    unit_class : str
+        Unit class of a numeric value (Length, Angle, ...)
+    """
+    def __init__(self, id, operator, category, property, condition, value,
+                 case_insensitive=False, unit="None", unit_class="None"):
+        self.id = id
+        self.operator = operator
+        self.category = category
+        self.property = property
+        self.condition = condition
+        self.value = value
+        self.case_insensitive = case_insensitive
+        self.unit = unit
+        self.unit_class = unit_class
+
+    @classmethod
+    def from_xml(cls, node):
+        """
+        Builds a FilterSpec from a <Filter> element.
+
+        Parameters
+        ----------
+        node : xml.etree.ElementTree.Element
+            <Filter> element
+
+        Returns
+        -------
+        FilterSpec
+        """
+        get = node.get
+        return cls(
+            get("ID"), get("Operator", "And"), get("Category", ""),
+            get("Property", ""), get("Condition", ""), get("Value", ""),
+            _is_true(get("CaseInsensitive")),
+            get("Unit", "None"), get("UnitClass", "None"))
+
+    def key(self):
+        """
+        Returns
+        -------
+        tuple
+            Everything that decides which elements the filter matches.
+            The operator and the ID are not part of the key.
+        """
+        return (self.category, self.property, self.condition, self.value,
+                self.case_insensitive, self.unit, self.unit_class)
+
+    def __repr__(self):
+        return '<Filter {} {} {} {} "{}">'.format(
+            self.operator, self.category, self.property,
+            self.condition, self.value)
+
+
+class CheckSpec:
+    """
+    One <Check> of a template.
+
+    Attributes
+    ----------
+    id : str
+        Check GUID
+    name : str
+        CheckName attribute
+    description : str
+        Description attribute
+    failure_message : str
+        FailureMessage attribute
+    result_condition : str
+        FailMatchingElements, FailNoElements, CountOnly or CountAndList
+    check_type : str
+        Custom for filter based checks, otherwise a built-in check name
+    is_checked : bool
+        Check is enabled in the template
+    heading : str
+        Text of the parent <Heading>
+    section : str
+        Name of the parent <Section>
+    filters : list
+        FilterSpec items in document order
+    """
+    def __init__(self, id, name, result_condition="FailMatchingElements",
+                 check_type="Custom", is_checked=True, filters=None,
+                 description="", failure_message="", heading="", section=""):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.failure_message = failure_message
+        self.result_condition = result_condition
+        self.check_type = check_type
+        self.is_checked = is_checked
+        self.heading = heading
+        self.section = section
+        self.filters = list(filters or [])
+
+    @classmethod
+    def from_xml(cls, node, heading="", section=""):
+        """
+        Builds a CheckSpec from a <Check> element and its <Filter> children.
+
+        Parameters
+        ----------
+        node : xml.etree.ElementTree.Element
+            <Check> element
+        heading : str
+            Text of the parent heading
+        section : str
+            Name of the parent section
+
+        Returns
+        -------
+        CheckSpec
+        """
+        get = node.get
+        return cls(
+            get("ID"), get("CheckName", ""),
+            result_condition=get("ResultCondition", "FailMatchingElements"),
+            check_type=get("CheckType", "Custom"),
+            is_checked=_is_true(get("IsChecked", "True")),
+            filters=[FilterSpec.from_xml(f) for f in node.findall("Filter")],
+            description=get("Description", ""),
+            failure_message=get("FailureMessage", ""),
+            heading=heading, section=section)
+
+    def __repr__(self):
+        return '<Check "{}" ({} filters)>'.format(
+            self.name, len(self.filters))
+
+
+class Section:
+    """
+    A <Section> of a heading.
+
+    Attributes
+    ----------
+    id : str
+        Section GUID
+    name : str
+        SectionName attribute
+    title : str
+        Title attribute
+    is_checked : bool
+        Section is enabled in the template
+    checks : list
+        CheckSpec items, empty until the section is loaded
+    check_count : int
+        Number of <Check> nodes in the template
+    loaded : bool
+        Checks have been read from the template
+    position : int
+        Index of the section in document order
+    parent : Section
+        Enclosing section of a nested section, None at heading level
+    """
+    def __init__(self, id, name, title="", is_checked=True, checks=None,
+                 check_count=None, loaded=True, position=0, parent=None):
+        self.id = id
+        self.name = name
+        self.title = title
+        self.is_checked = is_checked
+        self.checks = list(checks or [])
+        self.check_count = len(self.checks) if check_count is None \
+            else check_count
+        self.loaded = loaded
+        self.position = position
+        self.parent = parent
+
+    @property
+    def enabled(self):
+        """ Section and all enclosing sections are checked. """
+        section = self
+        while section is not None:
+            if not section.is_checked:
+                return False
+            section = section.parent
+        return True
+
+    @property
+    def full_name(self):
+        """ Names of the enclosing sections and the section. """
+        names = []
+        section = self
+        while section is not None:
+            names.insert(0, section.name)
+            section = section.parent
+        return " / ".join(names)
+
+
+class Heading:
+    """
+    A <Heading> of a template.
+
+    Attributes
+    ----------
+    id : str
+        Heading GUID
+    text : str
+        HeadingText attribute
+    is_checked : bool
+        Heading is enabled in the template
+    sections : list
+        Section items in document order, nested sections included
+    """
+    def __init__(self, id, text, is_checked=True, sections=None):
+        self.id = id
+        self.text = text
+        self.is_checked = is_checked
+        self.sections = list(sections or [])
+
+
+class Template:
+    """
+    A parsed MCSettings template.
+
+    Attributes
+    ----------
+    name : str
+        Name attribute of <MCSettings>
+    author : str
+        Author attribute of <MCSettings>
+    description : str
+        Description attribute of <MCSettings>
+    path : str
+        File the template was read from
+    headings : list
+        Heading items
+    lint : TemplateLint
+        Problems of the template, set by the template cache (see
+        template_lint)
+
+    Methods
+    -------
+    iter_sections(enabled_only)
+        Iterates the sections of all headings
+    iter_checks(enabled_only)
+        Iterates the checks of all loaded sections
+    """
+    def __init__(self, name, author="", description="", path=None,
+                 headings=None):
+        self.name = name
+        self.author = author
+        self.description = description
+        self.path = path
+        self.headings = list(headings or [])
+        self.lint = None
+
+    def iter_sections(self, enabled_only=True):
+        """
+        Iterates the sections of all headings.
+
+        Parameters
+        ----------
+        enabled_only : bool
+            Skip unchecked sections, sections nested in unchecked sections
+            and sections of unchecked headings
+
+        Returns
+        -------
+        generator
+            (Heading, Section) pairs in document order
+        """
+        for heading in self.headings:
+            if enabled_only and not heading.is_checked:
+                continue
+            for section in heading.sections:
+                if enabled_only and not section.enabled:
+                    continue
+                yield heading, section
+
+    def iter_checks(self, enabled_only=True):
+        """
+        Iterates the checks of all loaded sections.
+
+        Parameters
+        ----------
+        enabled_only : bool
+            Skip checks that are unchecked themselves or sit in an unchecked
+            heading or section
+
+        Returns
+        -------
+        generator
+            CheckSpec items in document order
+        """
+        for _, section in self.iter_sections(enabled_only):
+            for check in section.checks:
+                if enabled_only and not check.is_checked:
+                    continue
+                yield check
+
+
+def _stream(source):
+    """
+    Iterates the start and end events of a template.
+
+    Check, Section and Heading nodes are cleared and detached from their
+    parent once the consumer has seen their end event, so memory use stays
+    at about one check no matter how large the template is.
+
+    Parameters
+    ----------
+    source : str or file
+        Path or binary file object of the template
+
+    Returns
+    -------
+    generator
+        (event, node) pairs
+    """
+    stack = []
+    for event, node in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(node)
+            yield event, node
+            continue
+        stack.pop()
+        yield event, node
+        if node.tag in _FREED_TAGS:
+            node.clear()
+            if stack:
+                del stack[-1][-1]
+
+
+def _read(source, path=None, load_checks=True):
+    """
+    Reads a template in one streaming pass.
+
+    Parameters
+    ----------
+    source : str or file
+        Path or binary file object of the template
+    path : str
+        File the template was read from
+    load_checks : bool
+        Build the checks of all sections, otherwise only count them
+
+    Returns
+    -------
+    Template
+    """
+    template = None
+    heading = None
+    sections = []
+    position = 0
+    for event, node in _stream(source):
+        tag = node.tag
+        if event == "start":
+            if tag == "MCSettings":
+                template = Template(node.get("Name", ""),
+                                    node.get("Author", ""),
+                                    node.get("Description", ""), path)
+            elif tag == "Heading":
+                heading = Heading(node.get("ID"), node.get("HeadingText", ""),
+                                  _is_true(node.get("IsChecked", "True")))
+                template.headings.append(heading)
+            elif tag == "Section":
+                section = Section(node.get("ID"), node.get("SectionName", ""),
+                                  node.get("Title", ""),
+                                  _is_true(node.get("IsChecked", "True")),
+                                  check_count=0, loaded=load_checks,
+                                  position=position,
+                                  parent=sections[-1] if sections else None)
+                position += 1
+                sections.append(section)
+                heading.sections.append(section)
+            elif tag == "Check" and sections:
+                sections[-1].check_count += 1
+        elif tag == "Check" and load_checks and sections:
+            sections[-1].checks.append(
+                CheckSpec.from_xml(node, heading.text, sections[-1].name))
+        elif tag == "Section":
+            sections.pop()
+    return template
+
+
+def load_outline(path, source=None):
+    """
+    Reads the heading and section outline of a template.
+
+    The checks of a section are counted but not built, load them with
+    expand_sections once the user has picked the sections to run.
+
+    Parameters
+    ----------
+    path : str
+        Absolute path to the .xml template
+    source : file
+        Binary file object with the template content, read in place of path
+
+    Returns
+    -------
+    Template
+        Template whose sections are not loaded
+    """
+    return _read(source if source is not None else path, path,
+                 load_checks=False)
+
+
+def expand_sections(template, sections, source=None):
+    """
+    Loads the checks of the given sections.
+
+    Reads the template once more and stops after the last wanted section.
+    Sections that are already loaded are left alone.
+
+    Parameters
+    ----------
+    template : Template
+        Template returned by load_outline
+    sections : list
+        Section items of the template to load
+    source : file
+        Binary file object with the template content, read in place of
+        template.path
+
+    Returns
+    -------
+    list
+        Section items that were loaded by this call
+    """
+    wanted = dict((section.position, section) for section in sections
+                  if not section.loaded)
+    if not wanted:
+        return []
+    if source is None:
+        with open(template.path, "rb") as template_file:
+            return expand_sections(template, wanted.values(), template_file)
+    loaded = []
+    heading_text = ""
+    sections = []
+    position = 0
+    for event, node in _stream(source):
+        tag = node.tag
+        if event == "start":
+            if tag == "Heading":
+                heading_text = node.get("HeadingText", "")
+            elif tag == "Section":
+                current = wanted.get(position)
+                position += 1
+                if current is not None:
+                    current.checks = []
+                sections.append(current)
+        elif tag == "Check" and sections and sections[-1] is not None:
+            current = sections[-1]
+            current.checks.append(
+                CheckSpec.from_xml(node, heading_text, current.name))
+        elif tag == "Section":
+            current = sections.pop()
+            if current is None:
+                continue
+            current.loaded = True
+            loaded.append(current)
+            del wanted[current.position]
+            if not wanted:
+                break
+    return loaded
+
+
+def load_template(path, source=None):
+    """
+    Reads a template with the checks of all sections.
+
+    Parameters
+    ----------
+    path : str
+        Absolute path to the .xml template
+    source : file
+        Binary file object with the template content, read in place of path
+
+    Returns
+    -------
+    Template
+    """
+    return _read(source if source is not None else path, path)
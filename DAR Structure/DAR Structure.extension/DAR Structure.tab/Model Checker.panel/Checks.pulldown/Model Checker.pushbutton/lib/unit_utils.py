@@ -0,0 +1,77 @@
+""" Module to convert Revit internal units to the units of template values
+
+Revit stores lengths in decimal feet and angles in radians. Filters with a
+Unit / UnitClass give their value in display units, so element values are
+multiplied by one factor per filter before they are compared.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+
+# Unit name -> (unit class, display units per internal unit)
+UNIT_FACTORS = {
+    "Feet": ("Length", 1.0),
+    "Inches": ("Length", 12.0),
+    "Millimeters": ("Length", 304.8),
+    "Centimeters": ("Length", 30.48),
+    "Meters": ("Length", 0.3048),
+    "Radians": ("Angle", 1.0),
+    "Degrees": ("Angle", 57.29577951308232),
+    "SquareFeet": ("Area", 1.0),
+    "SquareMillimeters": ("Area", 92903.04),
+    "SquareMeters": ("Area", 0.09290304),
+    "CubicFeet": ("Volume", 1.0),
+    "CubicMillimeters": ("Volume", 28316846.592),
+    "CubicMeters": ("Volume", 0.028316846592),
+}
+
+# Unit of a unit class when a filter asks for the "Default" unit
+DEFAULT_UNITS = {
+    "Length": "Millimeters",
+    "Angle": "Degrees",
+    "Area": "SquareMeters",
+    "Volume": "CubicMeters",
+}
+
+# Unit and UnitClass values that mean "compare as stored"
+NO_UNIT = ("", "None")
+
+
+class UnknownUnit(ValueError):
+    """ Raised for a Unit or UnitClass that cannot be converted. """
+
+
+def unit_factor(unit, unit_class="None"):
+    """
+    Factor from Revit internal units to the unit of a filter value.
+
+    Parameters
+    ----------
+    unit : str
+        Unit attribute of the filter (Millimeters, Degrees, Default, None)
+    unit_class : str
+        UnitClass attribute of the filter (Length, Angle, None)
+
+    Returns
+    -------
+    float
+        Multiply internal values by this factor, 1.0 without a unit
+
+    Raises
+    ------
+    UnknownUnit
+        The unit or the unit class is not known, or they do not agree
+    """
+    unit = unit or "None"
+    unit_class = unit_class or "None"
+    if unit in NO_UNIT and unit_class in NO_UNIT:
+        return 1.0
+    if unit in NO_UNIT or unit == "Default":
+        if unit_class not in DEFAULT_UNITS:
+            raise UnknownUnit('Unknown unit class "{}"'.format(unit_class))
+        unit = DEFAULT_UNITS[unit_class]
+    if unit not in UNIT_FACTORS:
+        raise UnknownUnit('Unknown unit "{}"'.format(unit))
+    measure, factor = UNIT_FACTORS[unit]
+    if unit_class not in NO_UNIT and unit_class != measure:
+        raise UnknownUnit('Unit "{}" is not a {} unit'.format(unit,
+                                                               unit_class))
+    return factor
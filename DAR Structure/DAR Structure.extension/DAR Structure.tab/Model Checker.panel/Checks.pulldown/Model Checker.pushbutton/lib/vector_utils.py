@@ -0,0 +1,115 @@
+""" Module to evaluate numeric Model Checker filters on NumPy arrays
+
+A numeric column holds the distinct values of one element field as a float
+array, so a GreaterThan / LessOrEqual / Equal filter converts all of them
+from internal units with one multiply and compares them with one array
+operation. The outcome per distinct value is spread back to the elements
+through the code array of the column and packed into a bitset.
+
+NumPy is optional. Without it (IronPython inside Revit) available() is
+False and bitset_utils tests every distinct value in Python.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import binascii
+import numbers
+
+from rule_utils import MISSING, TOLERANCE, to_number
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def available():
+    """ Checks if NumPy can be used. """
+    return numpy is not None
+
+
+class NumericColumn:
+    """
+    Interned element field as NumPy arrays.
+
+    Attributes
+    ----------
+    codes : numpy.ndarray
+        Index of the value of every element in the distinct values
+    numbers : numpy.ndarray
+        Numeric form of every distinct value (to_number), NaN if none
+    plain : numpy.ndarray
+        True where the distinct value is a number and not a bool
+    """
+    def __init__(self, codes, values):
+        self.codes = numpy.array(codes, dtype=numpy.intp)
+        numeric = []
+        plain = []
+        for value in values:
+            number = None if value is MISSING else to_number(value)
+            numeric.append(numpy.nan if number is None else number)
+            plain.append(isinstance(value, numbers.Number) and
+                         not isinstance(value, bool))
+        self.numbers = numpy.array(numeric, dtype=float)
+        self.plain = numpy.array(plain, dtype=bool)
+
+
+def compare(column, condition, limit, factor):
+    """
+    Compares the distinct values of a column with a filter limit.
+
+    Parameters
+    ----------
+    column : NumericColumn
+        Column of the field the filter reads
+    condition : str
+        GreaterThan, GreaterOrEqual, LessThan, LessOrEqual, Equal or
+        NotEqual
+    limit : float
+        Numeric value of the filter
+    factor : float
+        Factor from internal units to the unit of the limit
+
+    Returns
+    -------
+    numpy.ndarray
+        One bool per distinct value. For Equal / NotEqual only the plain
+        numbers are decided, see rule_utils.value_test for the others.
+    """
+    converted = column.numbers * factor
+    with numpy.errstate(invalid="ignore"):
+        if condition == "GreaterThan":
+            return converted > limit
+        if condition == "GreaterOrEqual":
+            return converted >= limit
+        if condition == "LessThan":
+            return converted < limit
+        if condition == "LessOrEqual":
+            return converted <= limit
+        equal = numpy.abs(converted - limit) <= TOLERANCE
+    if condition == "NotEqual":
+        return column.plain & ~equal
+    return column.plain & equal
+
+
+def spread_bits(codes, outcomes):
+    """
+    Bitset of the elements whose distinct value has a true outcome.
+
+    Parameters
+    ----------
+    codes : numpy.ndarray
+        Code of every element
+    outcomes : numpy.ndarray or list
+        One bool per distinct value
+
+    Returns
+    -------
+    int
+        Bit i is set when the outcome of element i is true
+    """
+    if not len(codes):
+        return 0
+    flags = numpy.asarray(outcomes, dtype=bool)[codes][::-1]
+    # Leading zero bits keep element 0 in the lowest bit after packing
+    padding = numpy.zeros((-len(flags)) % 8, dtype=bool)
+    packed = numpy.packbits(numpy.concatenate((padding, flags)))
+    return int(binascii.hexlify(packed.tobytes()), 16)
@@ -0,0 +1,65 @@
+""" Fixtures of the Model Checker tests
+
+The tests run headless on CPython: the checks come from the shipped
+templates and the elements from synthetic_utils.
+
+Usage:
+    python -m pytest tests
+"""
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import os
+import sys
+
+import pytest
+
+BUNDLE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES = os.path.join(BUNDLE, "Templates")
+sys.path.insert(0, os.path.join(BUNDLE, "lib"))
+
+from template_utils import load_template  # noqa: E402
+from rule_utils import compile_template  # noqa: E402
+from snapshot_utils import encode_elements  # noqa: E402
+from synthetic_utils import synthetic_elements  # noqa: E402
+import vector_utils  # noqa: E402
+
+# Templates the evaluation paths are compared on
+TEMPLATE_FILES = (
+    os.path.join(TEMPLATES, "0-GN", "DAR_GN_Revit Model Quality Checks.xml"),
+    os.path.join(TEMPLATES, "SC", "SC-Model Element Checks.xml"),
+    os.path.join(TEMPLATES, "SS", "SS-Model Element Checks.xml"),
+)
+
+# Elements of the synthetic model, a few batches of the chunked tests
+ELEMENT_COUNT = 2500
+
+
+@pytest.fixture(scope="session")
+def template_checks():
+    """ Compiled checks of the TEMPLATE_FILES. """
+    checks = []
+    for path in TEMPLATE_FILES:
+        checks.extend(compile_template(load_template(path)))
+    return checks
+
+
+@pytest.fixture(scope="session")
+def elements(template_checks):
+    """ Synthetic element records holding names. """
+    return list(synthetic_elements(ELEMENT_COUNT, template_checks))
+
+
+@pytest.fixture(scope="session")
+def coded(elements):
+    """ (element records with workset and phase codes, name tables). """
+    return encode_elements(elements)
+
+
+@pytest.fixture(params=["numpy", "python"])
+def vector_mode(request, monkeypatch):
+    """ Runs a test with NumPy and again with the pure Python fallback. """
+    if request.param == "numpy":
+        if not vector_utils.available():
+            pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(vector_utils, "numpy", None)
+    return request.param
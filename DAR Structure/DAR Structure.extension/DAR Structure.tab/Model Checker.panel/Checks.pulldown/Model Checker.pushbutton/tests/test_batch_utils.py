@@ -0,0 +1,127 @@
+""" Tests of the headless batch Model Checker in batch_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import json
+import os
+import shutil
+
+import pytest
+
+import batch_utils
+from rule_utils import (
+    FAIL, PASS, SKIPPED, check_categories, compile_template, required_fields)
+from template_utils import load_template
+from bitset_utils import evaluate_shared
+from snapshot_utils import write_snapshot
+
+TEMPLATE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "Templates", "SC", "SC-Model Element Checks.xml")
+
+
+@pytest.fixture
+def folders(coded, tmp_path):
+    """ (snapshot folder holding a.jsonl, report folder) """
+    records, tables = coded
+    snapshots = tmp_path.joinpath("snapshots")
+    snapshots.mkdir()
+    write_snapshot(str(snapshots.joinpath("a.jsonl")), records, tables,
+                   model="A")
+    return str(snapshots), str(tmp_path.joinpath("reports"))
+
+
+def _summary(snapshots, reports, batch_size=None):
+    summaries = batch_utils.run_batch(
+        TEMPLATE, batch_utils.find_snapshots(snapshots), reports, workers=1,
+        batch_size=batch_size)
+    assert len(summaries) == 1 and not summaries[0]["error"]
+    return summaries[0]
+
+
+def test_batch_counts_match_evaluation(folders, coded):
+    records, tables = coded
+    results = evaluate_shared(compile_template(load_template(TEMPLATE)),
+                              records, tables=tables)
+    summary = _summary(*folders)
+    assert summary["model"] == "A" and summary["elements"] == len(records)
+    assert summary[FAIL] == sum(1 for result in results
+                                if result.status == FAIL)
+    assert summary[PASS] == sum(1 for result in results
+                                if result.status == PASS)
+    chunked = _summary(*folders, batch_size=1000)
+    for field in (PASS, FAIL, "failing_elements"):
+        assert chunked[field] == summary[field]
+
+
+def test_reports_are_kept_apart_from_snapshots(folders):
+    snapshots, reports = folders
+    summary = _summary(snapshots, reports)
+    assert summary["report"] == os.path.join(reports, "a.report.html")
+    assert sorted(os.listdir(reports)) == ["a.report.html",
+                                           "a.report.jsonl"]
+    # Reports copied next to the snapshots are not taken for snapshots
+    shutil.copy(os.path.join(reports, "a.report.jsonl"), snapshots)
+    assert batch_utils.find_snapshots(snapshots) == [
+        os.path.join(snapshots, "a.jsonl")]
+    # and fail as snapshots when they are named like one
+    shutil.copy(os.path.join(reports, "a.report.jsonl"),
+                os.path.join(snapshots, "b.jsonl"))
+    summaries = batch_utils.run_batch(
+        TEMPLATE, batch_utils.find_snapshots(snapshots), reports, workers=1)
+    assert "not a Model Checker snapshot" in summaries[1]["error"]
+
+
+def test_report_folder_must_not_be_the_snapshot_folder(folders):
+    snapshots, _ = folders
+    with pytest.raises(ValueError):
+        batch_utils.run_batch(TEMPLATE, batch_utils.find_snapshots(snapshots),
+                              snapshots, workers=1)
+    assert batch_utils.main([TEMPLATE, snapshots, snapshots,
+                             "--workers", "1"]) == 2
+    assert os.listdir(snapshots) == ["a.jsonl"]
+
+
+def test_checks_reading_data_not_exported_are_skipped(coded, tmp_path):
+    records, tables = coded
+    checks = compile_template(load_template(TEMPLATE))
+    # Exported for the checks of one category only
+    walls = [check for check in checks
+             if check.supported and check_categories([check]) ==
+             set(["OST_Walls"])]
+    parameters, api = required_fields(walls)
+    snapshots = tmp_path.joinpath("snapshots")
+    snapshots.mkdir()
+    write_snapshot(str(snapshots.joinpath("walls.jsonl")),
+                   [record for record in records
+                    if record["category"] == "OST_Walls"], tables,
+                   parameters=sorted(parameters), api=sorted(api),
+                   categories=["OST_Walls"])
+    reports = str(tmp_path.joinpath("reports"))
+    summary = _summary(str(snapshots), reports)
+    skipped = [check for check in batch_utils.covered_checks(
+        checks, {"parameters": sorted(parameters), "api": sorted(api),
+                 "categories": ["OST_Walls"]}) if not check.supported]
+    assert walls and summary[SKIPPED] == len(skipped) > \
+        sum(1 for check in checks if not check.supported)
+    with open(os.path.join(reports, "walls.report.jsonl")) as report:
+        rows = [json.loads(line) for line in report][1:]
+    assert [row["id"] for row in rows] == \
+        [check.spec.id for check in checks]
+    reasons = [row["reason"] for row in rows if row["status"] == SKIPPED]
+    assert any("not in the snapshot" in reason or "some categories" in
+               reason for reason in reasons)
+    assert all(row["status"] != SKIPPED for row, check in zip(rows, checks)
+               if any(check is wall for wall in walls))
+
+
+def test_ilod_templates_run_with_their_bad_check_skipped(folders):
+    snapshots, reports = folders
+    ilod = os.path.join(os.path.dirname(TEMPLATE),
+                        "SC-iLOD and Standard Checks.xml")
+    summaries = batch_utils.run_batch(
+        ilod, batch_utils.find_snapshots(snapshots), reports, workers=2)
+    assert not summaries[0]["error"] and summaries[0][SKIPPED]
+    with open(os.path.join(reports, "a.report.jsonl")) as report:
+        rows = [json.loads(line) for line in report][1:]
+    damp = [row for row in rows if row["check"] == "Damp Proofing" and
+            "LessOrEqual" in row["reason"]]
+    assert damp and all(row["status"] == SKIPPED for row in damp)
@@ -0,0 +1,45 @@
+""" Tests of evaluating checks with shared predicate bitsets """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+#pylint: disable=unused-argument
+from rule_utils import evaluate_checks
+from bitset_utils import (
+    SharedPredicates, bit_indices, bitset_from_indices, evaluate_shared)
+
+
+def _outcome(results):
+    return [(result.status, result.count, result.complete,
+             list(result.element_ids)) for result in results]
+
+
+def test_bitset_round_trip():
+    indices = [0, 3, 64, 65, 200]
+    bits = bitset_from_indices(indices, 201)
+    assert list(bit_indices(bits)) == indices
+    assert list(bit_indices(bits, 2)) == indices[:2]
+
+
+def test_shared_matches_rows(template_checks, elements, vector_mode):
+    for full in (True, False):
+        assert _outcome(evaluate_shared(template_checks, elements,
+                                        full=full)) == \
+            _outcome(evaluate_checks(template_checks, elements, full=full))
+
+
+def test_shared_matches_rows_with_tables(template_checks, coded,
+                                         vector_mode):
+    records, tables = coded
+    assert _outcome(evaluate_shared(template_checks, records, full=True,
+                                    tables=tables)) == \
+        _outcome(evaluate_checks(template_checks, records, full=True,
+                                 tables=tables))
+
+
+def test_filters_are_evaluated_once(template_checks, elements):
+    predicates = SharedPredicates(elements)
+    first = evaluate_shared(template_checks, elements, predicates, full=True)
+    evaluated = predicates.evaluated
+    # No predicate key is evaluated twice
+    assert evaluated == len(set(predicates.built)) == len(predicates.built)
+    again = evaluate_shared(template_checks, elements, predicates, full=True)
+    assert predicates.evaluated == evaluated
+    assert _outcome(again) == _outcome(first)
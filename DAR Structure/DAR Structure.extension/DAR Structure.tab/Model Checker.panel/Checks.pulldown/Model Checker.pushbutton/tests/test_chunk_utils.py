@@ -0,0 +1,86 @@
+""" Tests of evaluating checks on element batches in chunk_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+#pylint: disable=unused-argument
+from rule_utils import FIRST_MATCH, collection_strategy, evaluate_checks
+from chunk_utils import evaluate_chunked, iter_batches
+
+
+def _outcome(results):
+    return [(result.status, result.count, result.complete,
+             list(result.element_ids)) for result in results]
+
+
+def test_iter_batches():
+    assert [len(batch) for batch in iter_batches(range(7), 3)] == [3, 3, 1]
+    assert list(iter_batches([], 3)) == []
+
+
+def test_chunked_matches_rows(template_checks, elements, vector_mode):
+    for full in (True, False):
+        run = evaluate_chunked(template_checks, iter(elements), 700,
+                               full=full)
+        assert run.elements == len(elements) and run.batches == 4
+        assert _outcome(run.results) == \
+            _outcome(evaluate_checks(template_checks, elements, full=full))
+
+
+def test_chunked_matches_rows_with_tables(template_checks, coded):
+    records, tables = coded
+    run = evaluate_chunked(template_checks, iter(records), 1000,
+                           tables=tables, full=True)
+    assert _outcome(run.results) == _outcome(
+        evaluate_checks(template_checks, records, full=True, tables=tables))
+
+
+def test_results_are_streamed_once(template_checks, elements):
+    streamed = []
+    run = evaluate_chunked(template_checks, iter(elements), 700,
+                           on_result=lambda index, result:
+                           streamed.append((index, result)))
+    # In the order of the checks, however early they were decided
+    assert [index for index, _ in streamed] == \
+        list(range(len(template_checks)))
+    assert all(run.results[index] is result for index, result in streamed)
+
+
+def test_decided_results_are_streamed_early(template_checks, elements):
+    checks = [check for check in template_checks if check.supported and
+              collection_strategy(check) == FIRST_MATCH]
+    checks = [check for check, result in
+              zip(checks, evaluate_checks(checks, elements))
+              if result.element_ids]
+    read = [0]
+    streamed = []
+
+    def counted():
+        for element in elements:
+            read[0] += 1
+            yield element
+    run = evaluate_chunked(checks, counted(), 100,
+                           on_result=lambda index, result:
+                           streamed.append((index, read[0])))
+    assert run.stopped
+    assert [index for index, _ in streamed] == list(range(len(checks)))
+    # Every check was passed on before the elements ran out
+    assert max(count for _, count in streamed) < len(elements)
+
+
+def test_stopped_only_before_the_last_batch(template_checks, elements):
+    checks = [check for check in template_checks if check.supported and
+              collection_strategy(check) == FIRST_MATCH]
+    results = evaluate_checks(checks, elements)
+    checks = [check for check, result in zip(checks, results)
+              if result.element_ids]
+    assert checks
+    # Every check is decided by the element at position - 1
+    positions = dict((element["id"], position)
+                     for position, element in enumerate(elements))
+    position = 1 + max(positions[result.element_ids[0]]
+                       for result in results if result.element_ids)
+    assert position < len(elements)
+    run = evaluate_chunked(checks, iter(elements), position)
+    assert run.stopped and run.batches == 1
+    run = evaluate_chunked(checks, iter(elements[:position]), position)
+    assert not run.stopped and run.batches == 1
+    run = evaluate_chunked(checks, iter(elements), len(elements))
+    assert not run.stopped and run.batches == 1
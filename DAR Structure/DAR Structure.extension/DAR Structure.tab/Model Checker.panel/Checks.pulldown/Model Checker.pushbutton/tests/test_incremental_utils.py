@@ -0,0 +1,96 @@
+""" Tests of evaluating checks incrementally between runs """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import os
+from collections import OrderedDict
+
+from bitset_utils import evaluate_shared
+from planner_utils import plan_checks
+from incremental_utils import (
+    ResultStore, element_fingerprint, evaluate_incremental, store_path)
+
+
+def _outcome(results):
+    return [(result.status, result.count, list(result.element_ids))
+            for result in results]
+
+
+def _run(checks, elements, path, tables=None):
+    store = ResultStore(path)
+    run = evaluate_incremental(checks, elements, store, tables=tables)
+    store.save()
+    return run
+
+
+def _renamed(elements, position):
+    elements = list(elements)
+    elements[position] = dict(elements[position], family="Renamed Family")
+    return elements
+
+
+def test_store_path_is_keyed_by_model_and_checks(template_checks, tmp_path):
+    folder = str(tmp_path)
+    path = store_path("A.rvt", template_checks, folder)
+    assert path == store_path("A.rvt", list(reversed(template_checks)),
+                              folder)
+    assert path != store_path("B.rvt", template_checks, folder)
+    assert path != store_path("A.rvt", template_checks[:5], folder)
+
+
+def test_only_changed_elements_are_evaluated(template_checks, elements,
+                                             tmp_path):
+    path = store_path("A.rvt", template_checks, str(tmp_path))
+    first = _run(template_checks, elements, path)
+    assert first.evaluated == len(elements) and os.path.exists(path)
+    assert _outcome(first.results) == \
+        _outcome(evaluate_shared(template_checks, elements))
+
+    again = _run(template_checks, elements, path)
+    assert again.evaluated == 0
+    assert _outcome(again.results) == _outcome(first.results)
+    assert not any(delta.new or delta.resolved for delta in again.deltas)
+
+    changed = _renamed(elements, 10)
+    third = _run(template_checks, changed[:-1], path)
+    assert third.evaluated == 1 and third.removed == 1
+    assert _outcome(third.results) == \
+        _outcome(evaluate_shared(template_checks, changed[:-1]))
+
+
+def test_planned_checks_reuse_the_store(template_checks, elements,
+                                        tmp_path):
+    planned = plan_checks(template_checks, elements, sample_size=500)
+    path = store_path("A.rvt", template_checks, str(tmp_path))
+    assert path == store_path("A.rvt", planned, str(tmp_path))
+    _run(template_checks, elements, path)
+    run = _run(planned, elements, path)
+    assert run.evaluated == 0
+    assert _outcome(run.results) == \
+        _outcome(evaluate_shared(template_checks, elements))
+
+
+def test_deltas_and_streamed_results(template_checks, coded, tmp_path):
+    records, tables = coded
+    path = str(tmp_path.joinpath("store.json"))
+    first = _run(template_checks, records, path, tables)
+    changed = _renamed(records, 0)
+    assert element_fingerprint(changed[0], tables) != \
+        element_fingerprint(records[0], tables)
+    streamed = OrderedDict()
+    store = ResultStore(path)
+    run = evaluate_incremental(
+        template_checks, changed, store, tables=tables,
+        on_result=lambda index, result, delta:
+        streamed.setdefault(index, (result, delta)))
+    assert list(streamed) == list(range(len(template_checks)))
+    for index, (result, delta) in streamed.items():
+        assert result is run.results[index] and delta is run.deltas[index]
+    for result, delta, previous in zip(run.results, run.deltas,
+                                       first.results):
+        # Deltas are taken on all matches, the results may list fewer
+        if delta.known and len(result.element_ids) == result.count and \
+                len(previous.element_ids) == previous.count and \
+                result.check.spec.result_condition != "FailNoElements":
+            ids = set(result.element_ids)
+            old = set(previous.element_ids)
+            assert len(delta.new) == len(ids - old)
+            assert len(delta.resolved) == len(old - ids)
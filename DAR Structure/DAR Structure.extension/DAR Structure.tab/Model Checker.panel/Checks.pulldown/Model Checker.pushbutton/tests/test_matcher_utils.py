@@ -0,0 +1,63 @@
+""" Tests of the compiled and cached text matchers of matcher_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import pytest
+
+from matcher_utils import InvalidPattern, LRUCache, text_matcher
+from rule_utils import UnsupportedFilter, compile_filter, make_element
+from template_utils import FilterSpec
+
+
+@pytest.mark.parametrize("condition, value, case, matches", [
+    ("WildCard", "^W[0-9]+$", False, ["W1", "W22"]),
+    ("WildCardNoMatch", "^W[0-9]+$", False,
+     ["w1", "X1", "", "ab", "xabx", "AB"]),
+    ("WildCard", "^W[0-9]+$", True, ["W1", "W22", "w1"]),
+    ("Contains", "ab", False, ["ab", "xabx"]),
+    ("Contains", "ab", True, ["ab", "xabx", "AB"]),
+    ("DoesNotContain", "ab", False, ["AB", "", "W1", "w1", "X1", "W22"]),
+])
+def test_matchers(condition, value, case, matches):
+    texts = ["W1", "W22", "w1", "X1", "", "ab", "xabx", "AB"]
+    matcher = text_matcher(condition, value, case)
+    assert sorted(text for text in texts if matcher(text)) == sorted(matches)
+
+
+def test_matchers_are_compiled_once():
+    first = text_matcher("WildCard", "^Cached[0-9]$")
+    assert text_matcher("WildCard", "^Cached[0-9]$") is first
+    assert text_matcher("WildCard", "^Cached[0-9]$", True) is not first
+
+
+def test_invalid_patterns_skip_the_filter():
+    with pytest.raises(InvalidPattern):
+        text_matcher("WildCard", "([")
+    spec = FilterSpec(None, "And", "Parameter", "Mark", "WildCard", "([")
+    with pytest.raises(UnsupportedFilter):
+        compile_filter(spec)
+
+
+def test_filters_match_the_text_form_of_values():
+    spec = FilterSpec(None, "And", "Parameter", "Count", "WildCard",
+                      "^1[0-9]$")
+    predicate = compile_filter(spec)
+    assert predicate(make_element(1, params={"Count": 12}))
+    assert predicate(make_element(2, params={"Count": 12.0}))
+    assert not predicate(make_element(3, params={"Count": 2}))
+    assert not predicate(make_element(4))
+
+
+def test_least_recently_used_entry_is_dropped():
+    cache = LRUCache(size=2)
+    built = []
+
+    def build(key):
+        return lambda: built.append(key) or key
+    cache.get_or_build("a", build("a"))
+    cache.get_or_build("b", build("b"))
+    cache.get_or_build("a", build("a"))
+    cache.get_or_build("c", build("c"))
+    assert len(cache) == 2
+    cache.get_or_build("a", build("a"))
+    cache.get_or_build("b", build("b"))
+    assert built == ["a", "b", "c", "b"]
+    assert (cache.hits, cache.misses) == (2, 4)
@@ -0,0 +1,80 @@
+""" Tests of evaluating checks in worker processes and in a helper process """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+import parallel_utils
+from bitset_utils import evaluate_shared
+from parallel_utils import (
+    evaluate_in_helper, evaluate_parallel, find_python, shard_checks,
+    usable_python)
+from template_cache import check_to_data
+from snapshot_utils import write_snapshot
+
+
+def _outcome(results):
+    return [(result.status, result.count, list(result.element_ids))
+            for result in results]
+
+
+@pytest.fixture(scope="module")
+def expected(template_checks, elements):
+    return _outcome(evaluate_shared(template_checks, elements))
+
+
+def test_shards_keep_the_checks_in_order(template_checks):
+    checks = [(index, check_to_data(check.spec))
+              for index, check in enumerate(template_checks)]
+    shards = shard_checks(checks, 8)
+    assert 1 < len(shards) <= 8 and all(shards)
+    assert [item for shard in shards for item in shard] == checks
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_worker_pool_agrees(template_checks, coded, expected, tmp_path,
+                            workers):
+    records, tables = coded
+    path = str(tmp_path.joinpath("snapshot.jsonl"))
+    write_snapshot(path, records, tables)
+    assert _outcome(evaluate_parallel(template_checks, path, workers)) == \
+        expected
+
+
+def test_helper_process_agrees(template_checks, coded, expected):
+    records, tables = coded
+    results = evaluate_in_helper(template_checks, records, sys.executable,
+                                 workers=2, tables=tables)
+    assert _outcome(results) == expected
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Shell script helper")
+def test_hanging_helper_is_stopped(template_checks, elements, tmp_path):
+    python = tmp_path.joinpath("python")
+    python.write_text(u"#!/bin/sh\nsleep 60 &\nsleep 60\n")
+    python.chmod(python.stat().st_mode | stat.S_IEXEC)
+    start = time.time()
+    with pytest.raises(RuntimeError) as raised:
+        evaluate_in_helper(template_checks, elements[:10], str(python),
+                           timeout=1)
+    assert time.time() - start < 10
+    assert "stopped after 1 s" in str(raised.value)
+
+
+def test_unusable_interpreters_are_passed_over(monkeypatch, tmp_path):
+    missing = str(tmp_path.joinpath("python"))
+    assert usable_python(sys.executable) and not usable_python(missing)
+    monkeypatch.setenv(parallel_utils.PYTHON_VARIABLE, missing)
+    assert find_python() is None
+    with pytest.raises(RuntimeError):
+        evaluate_in_helper([], [], missing)
+
+
+def test_helper_timeout_setting(monkeypatch):
+    monkeypatch.setenv(parallel_utils.TIMEOUT_VARIABLE, "30")
+    assert parallel_utils.helper_timeout() == 30
+    monkeypatch.setenv(parallel_utils.TIMEOUT_VARIABLE, "never")
+    assert parallel_utils.helper_timeout() == parallel_utils.HELPER_TIMEOUT
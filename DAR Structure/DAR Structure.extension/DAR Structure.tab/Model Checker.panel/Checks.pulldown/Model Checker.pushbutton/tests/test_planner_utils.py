@@ -0,0 +1,59 @@
+""" Tests of reordering check filters in planner_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+#pylint: disable=unused-argument
+from rule_utils import evaluate_checks
+from bitset_utils import evaluate_shared
+from planner_utils import FilterPlanner, plan_checks, sample_elements
+
+
+def _ids(results):
+    return [list(result.element_ids) for result in results]
+
+
+def _statuses(results):
+    return [(result.status, result.count, result.complete)
+            for result in results]
+
+
+def test_sample_keeps_snapshot_order(elements):
+    sample = sample_elements(elements, 100)
+    assert len(sample) == 100
+    positions = [element["id"] for element in sample]
+    assert positions == sorted(positions)
+    assert sample_elements(elements[:50], 100) == elements[:50]
+
+
+def test_plan_keeps_the_filters(template_checks, elements):
+    planner = FilterPlanner(sample_elements(elements, 500))
+    planned = planner.plan_checks(template_checks)
+    assert [check.spec for check in planned] == \
+        [check.spec for check in template_checks]
+    for check, plan in zip(template_checks, planned):
+        assert sorted(id(spec) for branch in plan.branches
+                      for spec, _, _ in branch.steps) == \
+            sorted(id(spec) for branch in check.branches
+                   for spec, _, _ in branch.steps)
+    assert planner.reordered
+
+
+def test_planned_checks_give_the_same_results(template_checks, elements,
+                                              vector_mode):
+    planned = plan_checks(template_checks, elements, sample_size=500)
+    expected = evaluate_checks(template_checks, elements, full=True)
+    assert _ids(evaluate_checks(planned, elements, full=True)) == \
+        _ids(expected)
+    assert _ids(evaluate_shared(planned, elements, full=True)) == \
+        _ids(expected)
+    # FailNoElements checks may stop at another first match
+    assert _statuses(evaluate_shared(planned, elements)) == \
+        _statuses(evaluate_shared(template_checks, elements))
+
+
+def test_planned_checks_with_tables(template_checks, coded):
+    records, tables = coded
+    planned = plan_checks(template_checks, records, sample_size=500,
+                          tables=tables)
+    assert _ids(evaluate_shared(planned, records, full=True,
+                                tables=tables)) == \
+        _ids(evaluate_checks(template_checks, records, full=True,
+                             tables=tables))
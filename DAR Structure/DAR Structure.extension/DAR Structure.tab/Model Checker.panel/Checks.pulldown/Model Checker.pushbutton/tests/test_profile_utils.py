@@ -0,0 +1,38 @@
+""" Tests of the check profiles of profile_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+from bitset_utils import SharedPredicates, evaluate_shared
+from profile_utils import PROFILE_FIELDS, CheckProfiler, slowest_table
+
+
+def _filter_seconds(profiler):
+    return sum(record["filter_seconds"] for record in profiler.records)
+
+
+def test_shared_filter_time_is_split(template_checks, elements):
+    predicates = SharedPredicates(elements)
+    profiler = CheckProfiler()
+    evaluate_shared(template_checks, elements, predicates, profiler)
+    built = sum(predicates.filter_seconds.values())
+    assert abs(_filter_seconds(profiler) - built) < 1e-6
+    for record in profiler.records:
+        assert record["filter_seconds"] >= 0
+        assert record["seconds"] >= record["filter_seconds"] - 1e-6
+
+    # Bitsets built by an earlier run are not charged again
+    again = CheckProfiler()
+    evaluate_shared(template_checks, elements, predicates, again)
+    assert _filter_seconds(again) == 0
+
+
+def test_profiles_are_summed(template_checks, elements):
+    profiler = CheckProfiler()
+    evaluate_shared(template_checks, elements, profiler=profiler)
+    evaluate_shared(template_checks, elements, profiler=profiler)
+    supported = [check for check in template_checks if check.supported]
+    assert len(profiler.records) == len(
+        set((check.spec.id, check.spec.name, check.spec.section)
+            for check in supported))
+    assert all(set(PROFILE_FIELDS) <= set(record)
+               for record in profiler.records)
+    rows, columns = slowest_table(profiler, 5)
+    assert len(rows) == 5 and all(len(row) == len(columns) for row in rows)
@@ -0,0 +1,80 @@
+""" Tests of streaming Model Checker reports in report_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import io
+import json
+import re
+
+from report_utils import REPORT_KIND, ReportWriter
+from rule_utils import CheckResult, compile_check
+from template_utils import CheckSpec, FilterSpec
+
+# Filters of the checks the results are made up for
+WALLS = [FilterSpec(None, "And", "Category", "Walls", "Included", "True")]
+
+
+def _result(name, condition, element_ids, count=None, complete=True):
+    check = compile_check(CheckSpec(name, name, condition,
+                                    section="Section", filters=WALLS))
+    return CheckResult(check, element_ids, count, complete=complete)
+
+
+def _write(tmp_path, results, **options):
+    html = str(tmp_path.joinpath("report.html"))
+    jsonl = str(tmp_path.joinpath("report.jsonl"))
+    with ReportWriter(html, u"Report <é>", [("Model", "A & B")],
+                      jsonl_path=jsonl, **options) as writer:
+        for result in results:
+            writer.write_result(result, new=1)
+    with io.open(html, encoding="utf-8") as report:
+        text = report.read()
+    with io.open(jsonl, encoding="utf-8") as lines:
+        rows = [json.loads(line) for line in lines]
+    return text, rows
+
+
+def _pages(text, anchor):
+    block = re.search(r'<details class="mc-details" id="{}">(.*?)</details>'
+                      .format(anchor), text, re.S).group(1)
+    return [json.loads(page) for page in re.findall(
+        r'<script type="application/json" class="mc-page">(.*?)</script>',
+        block)]
+
+
+def test_failing_elements_are_paged(tmp_path):
+    text, rows = _write(tmp_path, [
+        _result("Walls </script>", "FailMatchingElements",
+                list(range(1, 8)))], page_size=3)
+    assert u"<title>Report &lt;é&gt;</title>" in text
+    assert "<p>Model: A &amp; B</p>" in text
+    assert '<a href="#check-1">Walls &lt;/script&gt;</a>' in text
+    assert _pages(text, "check-1") == [[[1], [2], [3]], [[4], [5], [6]],
+                                       [[7]]]
+    assert "<h2>Failing Elements</h2>" in text
+    assert "Walls </script>" not in text
+    assert rows[0]["kind"] == REPORT_KIND and rows[0]["Model"] == "A & B"
+    assert rows[1]["element_ids"] == list(range(1, 8))
+    assert (rows[1]["status"], rows[1]["new"]) == ("Fail", 1)
+
+
+def test_passed_checks_have_no_details(tmp_path):
+    text, rows = _write(tmp_path, [
+        _result("Found", "FailNoElements", [5], complete=False),
+        _result("Clean", "FailMatchingElements", []),
+        _result("Listed", "ListElements", [8, 9])])
+    # The element a FailNoElements check found is no failure
+    assert "check-1" not in text and "Failing Elements" not in text
+    assert "<td>1+</td>" in text
+    assert "<h2>Listed Elements</h2>" in text
+    assert _pages(text, "check-3") == [[[8], [9]]]
+    assert [row["status"] for row in rows[1:]] == ["Pass", "Pass", "Info"]
+    assert rows[1]["complete"] is False
+
+
+def test_elements_are_described(tmp_path):
+    text, _ = _write(tmp_path, [
+        _result("Capped", "FailMatchingElements", [1, 2], count=1500)],
+        describe=lambda element_id: [element_id, "Wall <{}>".format(
+            element_id)], columns=("Id", "Name"))
+    assert "<th>Id</th><th>Name</th>" in text
+    assert _pages(text, "check-1") == [[[1, "Wall <1>"], [2, "Wall <2>"]]]
+    assert "(1500 elements)" in text
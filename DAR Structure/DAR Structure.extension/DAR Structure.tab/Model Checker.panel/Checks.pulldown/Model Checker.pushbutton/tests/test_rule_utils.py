@@ -0,0 +1,256 @@
+""" Tests of compiling and evaluating checks in rule_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import pytest
+
+from template_utils import CheckSpec, FilterSpec
+from rule_utils import (
+    CAPPED_LIST, COUNT_ONLY, FAIL, FIRST_MATCH, FULL_LIST, LIST_LIMIT, PASS,
+    SKIPPED, CategoryIndex, CheckResult, ResultCollector, bind_tables,
+    check_categories, collect_result, collection_strategy, compile_check,
+    compile_filter, evaluate_checks, make_element, split_branches)
+from bitset_utils import evaluate_shared
+
+
+def _filter(operator, category, prop, condition, value=""):
+    return FilterSpec(None, operator, category, prop, condition, value)
+
+
+def _check(filters, result_condition="FailMatchingElements"):
+    return compile_check(CheckSpec("c", "Check", result_condition,
+                                   filters=filters))
+
+
+ELEMENTS = [
+    make_element(1, "OST_Walls", "Walls", family="Basic Wall",
+                 params={"Mark": "W1"}),
+    make_element(2, "OST_Walls", "Walls", family="Curtain Wall",
+                 params={"Mark": ""}),
+    make_element(3, "OST_Floors", "Floors", family="Floor",
+                 params={"Mark": "F1"}),
+    make_element(4, "OST_StructuralColumns", "Structural Columns",
+                 family="Column"),
+]
+
+
+def _ids(check):
+    return evaluate_checks([check], ELEMENTS, full=True)[0].element_ids
+
+
+def test_or_starts_a_branch():
+    filters = [_filter("And", "Family", "", "Equal", "A"),
+               _filter("And", "Family", "", "Equal", "B"),
+               _filter("Or", "Family", "", "Equal", "C"),
+               _filter("Exclude", "Family", "", "Equal", "D")]
+    branches = split_branches(filters)
+    assert [len(branch) for branch in branches] == [2, 2]
+    assert branches[1][0].operator == "Or"
+
+
+def test_category_selectors_select_any_category():
+    check = _check([_filter("And", "Category", "Walls", "Included", "True"),
+                    _filter("And", "Category", "Floors", "Included", "True")])
+    assert check.branches[0].categories >= set(["Walls", "OST_Walls",
+                                                 "Floors", "OST_Floors"])
+    assert _ids(check) == [1, 2, 3]
+
+
+def test_branches_are_ored_and_excludes_removed():
+    check = _check([
+        _filter("And", "Category", "Walls", "Included", "True"),
+        _filter("Exclude", "Family", "", "Equal", "Curtain Wall"),
+        _filter("Or", "Category", "Structural Columns", "Included", "True")])
+    assert len(check.branches) == 2
+    assert _ids(check) == [1, 4]
+
+
+def test_presence_conditions():
+    has_no_value = _check([_filter("And", "Parameter", "Mark",
+                                   "HasNoValue")])
+    undefined = _check([_filter("And", "Parameter", "Mark", "Undefined")])
+    assert _ids(has_no_value) == [2]
+    assert _ids(undefined) == [4]
+
+
+def test_unsupported_filter_skips_the_check():
+    check = _check([_filter("And", "Parameter", "Height", "LessOrEqual",
+                            "tall")])
+    assert not check.supported
+    assert "numeric value" in check.skip_reason
+    result = evaluate_checks([check], ELEMENTS)[0]
+    assert result.status == SKIPPED and result.element_ids == []
+
+
+def test_result_condition_decides_the_status():
+    walls = [_filter("And", "Category", "Walls", "Included", "True")]
+    doors = [_filter("And", "Category", "Doors", "Included", "True")]
+    results = evaluate_checks(
+        [_check(walls), _check(doors), _check(walls, "FailNoElements"),
+         _check(doors, "FailNoElements")], ELEMENTS)
+    assert [result.status for result in results] == [FAIL, PASS, PASS, FAIL]
+    # FailNoElements checks stop at the first match
+    assert results[2].element_ids == [1] and not results[2].complete
+
+
+def test_coded_fields_match_names(template_checks, elements, coded):
+    records, tables = coded
+    by_name = evaluate_checks(template_checks, elements, full=True)
+    by_code = evaluate_checks(template_checks, records, full=True,
+                              tables=tables)
+    assert any(result.element_ids for result in by_name)
+    assert [result.element_ids for result in by_code] == \
+        [result.element_ids for result in by_name]
+
+
+def test_category_index_lists_the_checks_of_a_category():
+    walls = _check([_filter("And", "Category", "Walls", "Included", "True")])
+    columns = _check([_filter("And", "Category", "OST_StructuralColumns",
+                              "Included", "True"),
+                      _filter("Or", "Category", "Walls", "Included",
+                              "True")])
+    marks = _check([_filter("And", "Parameter", "Mark", "HasNoValue")])
+    index = CategoryIndex([walls, columns, marks])
+    assert index.categories == ["OST_StructuralColumns", "OST_Walls"]
+    # Display names are looked up by their OST_* name
+    assert index.affected_checks(["Walls"], include_any=False) == \
+        [walls, columns]
+    assert index.affected_checks(["OST_StructuralColumns"]) == \
+        [columns, marks]
+    assert index.affected_checks(["OST_Doors"]) == [marks]
+    assert check_categories([walls, columns]) == \
+        set(["OST_Walls", "OST_StructuralColumns"])
+    assert check_categories([walls, marks]) is None
+
+
+def test_affected_checks_give_the_results_of_a_full_run(template_checks,
+                                                        elements):
+    index = CategoryIndex(template_checks)
+    changed = set(["OST_Walls", "OST_Floors"])
+    affected = index.affected_checks(changed)
+    assert 0 < len(affected) < len(template_checks)
+    full = evaluate_checks(template_checks, elements, full=True)
+    # Elements of other categories do not change the unaffected checks
+    others = [element for element in elements
+              if element["category"] not in changed]
+    partial = evaluate_checks(template_checks, others, full=True)
+    rerun = set(id(check) for check in affected)
+    for check, before, after in zip(template_checks, full, partial):
+        if id(check) not in rerun:
+            assert after.element_ids == before.element_ids
+
+
+def test_result_condition_decides_the_collection_strategy():
+    walls = [_filter("And", "Category", "Walls", "Included", "True")]
+    strategies = dict(
+        (condition, collection_strategy(_check(walls, condition)))
+        for condition in ("FailMatchingElements", "FailNoElements",
+                          "CountOnly", "ListElements"))
+    assert strategies == {
+        "FailMatchingElements": CAPPED_LIST, "FailNoElements": FIRST_MATCH,
+        "CountOnly": COUNT_ONLY, "ListElements": FULL_LIST}
+    assert collection_strategy(_check(walls, "CountOnly"), full=True) == \
+        FULL_LIST
+
+
+def test_collectors_keep_what_their_strategy_needs():
+    check = _check([])
+    ids = list(range(LIST_LIMIT + 500))
+    collectors = dict((strategy, ResultCollector(check, strategy))
+                      for strategy in (FULL_LIST, CAPPED_LIST, COUNT_ONLY,
+                                       FIRST_MATCH))
+    for element_id in ids:
+        for collector in collectors.values():
+            if not collector.done:
+                collector.add(element_id)
+    results = dict((strategy, collector.result())
+                   for strategy, collector in collectors.items())
+    assert results[FULL_LIST].element_ids == ids
+    # CAPPED_LIST stops listing at LIST_LIMIT but keeps counting
+    assert results[CAPPED_LIST].element_ids == ids[:LIST_LIMIT]
+    assert results[CAPPED_LIST].count == len(ids)
+    assert results[COUNT_ONLY].element_ids == []
+    assert results[COUNT_ONLY].count == len(ids)
+    assert collectors[FIRST_MATCH].done
+    assert results[FIRST_MATCH].element_ids == [0]
+    assert results[FIRST_MATCH].count_text == "1+"
+    for strategy in (FULL_LIST, CAPPED_LIST, COUNT_ONLY):
+        assert collect_result(check, ids, strategy).element_ids == \
+            results[strategy].element_ids
+        assert results[strategy].complete
+
+
+def test_merged_parts_are_capped():
+    check = _check([])
+    collector = ResultCollector(check, CAPPED_LIST, limit=5)
+    collector.merge(CheckResult(check, [1, 2, 3]))
+    collector.merge(CheckResult(check, [4, 5, 6], 4))
+    assert collector.element_ids == [1, 2, 3, 4, 5]
+    assert collector.count == 7
+    first = ResultCollector(check, FIRST_MATCH)
+    first.merge(CheckResult(check, []))
+    assert not first.done
+    first.merge(CheckResult(check, [9], complete=False))
+    assert first.done and first.result().element_ids == [9]
+
+
+def test_strategies_give_the_statuses_of_a_full_run(template_checks,
+                                                    elements):
+    full = evaluate_checks(template_checks, elements, full=True)
+    for results in (evaluate_checks(template_checks, elements),
+                    evaluate_shared(template_checks, elements)):
+        for check, result, expected in zip(template_checks, results, full):
+            assert result.status == expected.status
+            strategy = collection_strategy(check)
+            if strategy == FIRST_MATCH:
+                assert result.element_ids == expected.element_ids[:1]
+            else:
+                assert result.count == expected.count
+                assert result.element_ids == collect_result(
+                    check, expected.element_ids, strategy).element_ids
+
+
+# Name tables of a snapshot with coded worksets and phases
+TABLES = {
+    "workset": {-1: "", 0: "ST_Concrete", 1: "ST_Steel", 2: "Workset1"},
+    "phase_created": {-1: "", 5: "Existing", 6: "New Construction"},
+}
+
+
+@pytest.mark.parametrize("category, condition, value, codes", [
+    ("Workset", "Equal", "ST_Steel", [1]),
+    ("Workset", "NotEqual", "ST_Steel", [-1, 0, 2]),
+    ("Workset", "Contains", "st_", []),
+    ("Workset", "WildCard", "^ST_", [0, 1]),
+    ("PhaseCreated", "Equal", "Existing", [5]),
+    ("PhaseCreated", "DoesNotContain", "Construction", [-1, 5]),
+])
+def test_coded_filters_match_codes(category, condition, value, codes):
+    spec = _filter("And", category, category, condition, value)
+    field = "workset" if category == "Workset" else "phase_created"
+    predicate = compile_filter(spec, TABLES)
+    assert [code for code in sorted(TABLES[field])
+            if predicate(make_element(1, **{field: code}))] == codes
+
+
+def test_case_insensitive_coded_filters():
+    spec = FilterSpec(None, "And", "Workset", "Workset", "Contains", "st_",
+                      case_insensitive=True)
+    predicate = compile_filter(spec, TABLES)
+    assert [code for code in sorted(TABLES["workset"])
+            if predicate(make_element(1, workset=code))] == [0, 1]
+
+
+def test_checks_are_bound_to_the_tables():
+    check = _check([_filter("And", "Workset", "Workset", "Equal",
+                            "ST_Concrete"),
+                    _filter("And", "Category", "Walls", "Included", "True")])
+    assert bind_tables([check], None) == [check]
+    bound = bind_tables([check], TABLES)[0]
+    assert bound is not check and bound.spec is check.spec
+    named = make_element(1, "OST_Walls", "Walls", workset="ST_Concrete")
+    coded = make_element(1, "OST_Walls", "Walls", workset=0)
+    assert check.matches(named) and not check.matches(coded)
+    assert bound.matches(coded)
+    # Other codes and codes missing from the table do not match
+    for code in (1, 99):
+        assert not bound.matches(make_element(1, "OST_Walls", "Walls",
+                                              workset=code))
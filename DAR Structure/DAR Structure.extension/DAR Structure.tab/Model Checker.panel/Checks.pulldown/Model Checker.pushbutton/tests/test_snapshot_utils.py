@@ -0,0 +1,98 @@
+""" Tests of writing and reading snapshot files in snapshot_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import json
+
+import pytest
+
+from report_utils import ReportWriter
+from rule_utils import compile_check
+from snapshot_utils import (
+    SNAPSHOT_KIND, iter_snapshot, missing_data, read_snapshot,
+    read_snapshot_header, read_snapshot_tables, tables_to_data,
+    write_snapshot)
+from template_utils import CheckSpec, FilterSpec
+
+
+def _write_lines(path, header, records=()):
+    with open(path, "w") as snapshot:
+        for line in [header] + list(records):
+            snapshot.write(json.dumps(line) + "\n")
+
+
+def test_round_trip(coded, tmp_path):
+    records, tables = coded
+    path = str(tmp_path.joinpath("model.jsonl"))
+    assert write_snapshot(path, iter(records), tables, model="A") == \
+        len(records)
+    header = read_snapshot_header(path)
+    assert header["kind"] == SNAPSHOT_KIND and header["model"] == "A"
+    assert read_snapshot(path) == records
+    # JSON keys are text, the codes of the tables are restored as integers
+    assert read_snapshot_tables(path) == tables
+
+
+def test_encoded_fields_are_codes(elements, coded):
+    records, tables = coded
+    for element, record in zip(elements[:50], records):
+        for field, names in tables.items():
+            assert names[record[field]] == element[field]
+
+
+def test_reports_are_not_read_as_snapshots(tmp_path):
+    path = str(tmp_path.joinpath("model.report.jsonl"))
+    ReportWriter(str(tmp_path.joinpath("model.report.html")), "Report",
+                 jsonl_path=path).close()
+    with pytest.raises(ValueError):
+        read_snapshot_header(path)
+    with pytest.raises(ValueError):
+        list(iter_snapshot(path))
+
+
+def test_unknown_format_is_refused(tmp_path):
+    path = str(tmp_path.joinpath("model.jsonl"))
+    _write_lines(path, {"kind": SNAPSHOT_KIND, "format": 99})
+    with pytest.raises(ValueError):
+        read_snapshot(path)
+    _write_lines(path, {"model": "A"})
+    with pytest.raises(ValueError):
+        read_snapshot(path)
+
+
+def test_snapshots_without_a_kind_are_read(elements, coded, tmp_path):
+    # Format 1 records hold names, format 2 records hold codes
+    records, tables = coded
+    old = str(tmp_path.joinpath("old.jsonl"))
+    _write_lines(old, {"format": 1, "model": "A"}, elements[:20])
+    assert read_snapshot(old) == elements[:20]
+    assert read_snapshot_tables(old) is None
+    coded_path = str(tmp_path.joinpath("coded.jsonl"))
+    _write_lines(coded_path, {"format": 2, "model": "A",
+                              "tables": tables_to_data(tables)},
+                 records[:20])
+    assert read_snapshot(coded_path) == records[:20]
+    assert read_snapshot_tables(coded_path) == tables
+
+
+def test_missing_data_of_a_check():
+    check = compile_check(CheckSpec("c", "Check", "FailMatchingElements",
+                                    filters=[
+                                        FilterSpec(None, "And", "Category",
+                                                   "Walls", "Included",
+                                                   "True"),
+                                        FilterSpec(None, "And", "Parameter",
+                                                   "Mark", "HasNoValue", ""),
+                                        FilterSpec(None, "And",
+                                                   "APIParameter", "Pinned",
+                                                   "Equal", "True")]))
+    # Snapshots without a list of their contents hold everything
+    assert missing_data({"format": 2}, check) == []
+    assert missing_data({"parameters": ["Mark"], "api": ["Pinned"],
+                         "categories": None}, check) == []
+    assert missing_data({"parameters": ["Mark", "Comments"], "api": [],
+                         "categories": ["OST_Walls", "OST_Floors"]},
+                        check) == ["API properties not in the snapshot: "
+                                   "Pinned"]
+    assert missing_data({"parameters": [], "categories": ["OST_Floors"]},
+                        check) == [
+                            "Parameters not in the snapshot: Mark",
+                            "Categories not in the snapshot: OST_Walls"]
@@ -0,0 +1,49 @@
+""" Tests of the synthetic models and the template benchmark """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import os
+
+from snapshot_utils import read_snapshot, write_snapshot
+from synthetic_utils import STRUCTURAL_CATEGORIES, synthetic_elements
+
+BENCHMARKS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+
+def test_equal_seeds_give_equal_models(template_checks):
+    first = list(synthetic_elements(300, template_checks, seed=3))
+    assert len(first) == 300
+    assert [element["id"] for element in first] == list(range(1, 301))
+    assert list(synthetic_elements(300, template_checks, seed=3)) == first
+    assert list(synthetic_elements(300, template_checks, seed=4)) != first
+
+
+def test_checks_shape_the_model(template_checks, elements):
+    plain = set(category for category, _, _ in STRUCTURAL_CATEGORIES)
+    assert set(element["category"] for element in elements) - plain
+    shaped = set()
+    for element in elements:
+        shaped.update(element["params"])
+    assert not set(element["category"] for element in
+                   synthetic_elements(500)) - plain
+    assert shaped - set(name for element in synthetic_elements(500)
+                        for name in element["params"])
+
+
+def test_synthetic_snapshots_round_trip(template_checks, tmp_path):
+    path = str(tmp_path.joinpath("synthetic.jsonl"))
+    expected = list(synthetic_elements(200, template_checks))
+    assert write_snapshot(path, iter(expected), model="synthetic") == 200
+    assert read_snapshot(path) == expected
+
+
+def test_benchmark_measures_every_template(monkeypatch):
+    monkeypatch.syspath_prepend(BENCHMARKS)
+    import bench_templates
+    report = bench_templates.run_size(200, 0)
+    assert report["size"] == 200
+    assert [item["template"] for item in report["templates"]] == \
+        [os.path.relpath(path, bench_templates.TEMPLATES)
+         for path in bench_templates.shipped_templates()]
+    for item in report["templates"]:
+        assert item["checks"] and item["filters"]
+        assert item["costs"] == sorted(item["costs"], reverse=True)
@@ -0,0 +1,72 @@
+""" Tests of caching parsed templates on disk in template_cache """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import os
+
+from template_cache import TemplateCache, check_to_data
+from template_utils import load_template
+
+TEMPLATE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "Templates", "SC", "SC-Model Element Checks.xml")
+
+
+def _content():
+    with open(TEMPLATE, "rb") as template_file:
+        return template_file.read()
+
+
+def _checks(template):
+    return [check_to_data(check) for check in template.iter_checks(False)]
+
+
+def test_cached_template_is_the_parsed_template(tmp_path):
+    folder = str(tmp_path)
+    expected = _checks(load_template(TEMPLATE))
+    cold = TemplateCache(folder)
+    assert _checks(cold.load(TEMPLATE)) == expected
+    assert (cold.hits, cold.misses) == (0, 1)
+    warm = TemplateCache(folder)
+    assert _checks(warm.load(TEMPLATE)) == expected
+    assert (warm.hits, warm.misses, warm.expanded) == (1, 0, 0)
+
+
+def test_expanded_sections_are_added_to_the_entry(tmp_path):
+    folder = str(tmp_path)
+    cache = TemplateCache(folder)
+    outline = cache.load_content(TEMPLATE, _content())
+    sections = [section for _, section in outline.iter_sections(False)]
+    assert cache.expand(outline, sections[:1]) == sections[:1]
+    assert cache.expanded == 1
+    cache = TemplateCache(folder)
+    outline = cache.load_content(TEMPLATE, _content())
+    sections = [section for _, section in outline.iter_sections(False)]
+    assert sections[0].loaded and not any(section.loaded
+                                          for section in sections[1:])
+    assert cache.expand(outline, sections[:1]) == []
+    assert cache.expanded == 0
+
+
+def test_changed_template_is_a_new_entry(tmp_path):
+    folder = str(tmp_path)
+    content = _content()
+    TemplateCache(folder).load_content(TEMPLATE, content)
+    changed = content.replace(b'IsChecked="True"', b'IsChecked="False"', 1)
+    cache = TemplateCache(folder)
+    template = cache.load_content(TEMPLATE, changed)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert len(os.listdir(folder)) == 2
+    assert cache.load_content(TEMPLATE, changed) is not template
+    assert cache.hits == 1
+
+
+def test_unreadable_entries_are_rebuilt(tmp_path):
+    folder = str(tmp_path)
+    TemplateCache(folder).load(TEMPLATE)
+    for name in os.listdir(folder):
+        with open(os.path.join(folder, name), "wb") as entry:
+            entry.write(b"not marshal data")
+    cache = TemplateCache(folder)
+    assert _checks(cache.load(TEMPLATE)) == _checks(load_template(TEMPLATE))
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert TemplateCache(folder).load_content(TEMPLATE, _content()) \
+        .lint is not None
@@ -0,0 +1,72 @@
+""" Tests of comparing templates check by check in template_diff """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import io
+
+from template_utils import load_template
+from template_diff import diff_templates
+
+HEAD = b"""<MCSettings Name="Diff Test">
+<Heading ID="h1" HeadingText="Heading"><Section ID="s1" SectionName="Main">
+"""
+
+TAIL = b"""</Section></Heading></MCSettings>"""
+
+WALLS = b"""<Check ID="c1" CheckName="Walls">
+<Filter ID="f1" Operator="And" Category="Category" Property="OST_Walls" Condition="Included" Value="True" />
+<Filter ID="f2" Operator="And" Category="Parameter" Property="Mark" Condition="HasNoValue" />
+</Check>
+"""
+
+FLOORS = b"""<Check ID="c2" CheckName="Floors">
+<Filter ID="f3" Operator="And" Category="Category" Property="OST_Floors" Condition="Included" Value="True" />
+</Check>
+"""
+
+
+def _template(*checks):
+    return load_template("test.xml", io.BytesIO(HEAD + b"".join(checks) +
+                                                TAIL))
+
+
+def test_same_template_has_no_changes():
+    diff = diff_templates(_template(WALLS, FLOORS), _template(WALLS, FLOORS))
+    assert not diff and diff.unchanged == 2
+    assert diff.changed_ids() == set()
+
+
+def test_added_and_removed_checks():
+    diff = diff_templates(_template(WALLS), _template(FLOORS))
+    assert [spec.id for spec in diff.added] == ["c2"]
+    assert [spec.id for spec in diff.removed] == ["c1"]
+    assert diff.changed_ids() == set(["c2"])
+
+
+def test_text_changes_only_count_without_content_only():
+    renamed = WALLS.replace(b'CheckName="Walls"', b'CheckName="Wall Marks"')
+    diff = diff_templates(_template(WALLS), _template(renamed))
+    assert [change.fields for change in diff.modified] == \
+        [[("name", "Walls", "Wall Marks")]]
+    # A renamed check does not need compiling again
+    assert diff.changed_ids() == set()
+    assert not diff_templates(_template(WALLS), _template(renamed),
+                              content_only=True)
+
+
+def test_modified_and_reordered_filters():
+    edited = WALLS.replace(b'Condition="HasNoValue"', b'Condition="HasValue"')
+    change = diff_templates(_template(WALLS), _template(edited)).modified[0]
+    assert [(old.id, new.id) for old, new in change.modified_filters] == \
+        [("f2", "f2")]
+    lines = WALLS.splitlines(True)
+    swapped = b"".join([lines[0], lines[2], lines[1], lines[3]])
+    diff = diff_templates(_template(WALLS), _template(swapped))
+    assert diff.modified[0].reordered
+    assert diff.changed_ids() == set(["c1"])
+
+
+def test_copied_check_is_paired_by_content():
+    copied = WALLS.replace(b'ID="c1"', b'ID="c9"')
+    diff = diff_templates(_template(WALLS), _template(copied))
+    assert not diff.added and not diff.removed
+    assert diff.modified[0].new_id and diff.modified[0].new.id == "c9"
+    assert diff.to_data()["modified"][0]["new_id"]
@@ -0,0 +1,119 @@
+""" Tests of linting templates and keeping the lint in the template cache """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import io
+import os
+
+import pytest
+
+import template_cache
+from rule_utils import (
+    FAIL, SKIPPED, compile_template, result_status, skip_checks)
+from template_cache import TemplateCache
+from template_lint import (
+    WARNING, TemplateError, lint_template, validate_template)
+from template_utils import load_template
+
+TEMPLATE = b"""<?xml version="1.0" encoding="utf-8"?>
+<MCSettings Name="Lint Test">
+  <Heading ID="h1" HeadingText="Heading" IsChecked="True">
+    <Section ID="s1" SectionName="Walls" IsChecked="True">
+      <Check ID="c1" CheckName="Thin Walls" ResultCondition="FailMatchingElements">
+        <Filter ID="f1" Operator="And" Category="Category" Property="OST_Walls" Condition="Included" Value="True" />
+        <Filter ID="f2" Operator="And" Category="Parameter" Property="Width" Condition="LessThan" Value="thin" />
+      </Check>
+      <Check ID="c2" CheckName="No Filters" ResultCondition="FailMatchingElements" />
+    </Section>
+    <Section ID="s2" SectionName="Floors" IsChecked="True">
+      <Check ID="c3" CheckName="Floors" ResultCondition="FailMatchingElements">
+        <Filter ID="f3" Operator="And" Category="Category" Property="OST_Floors" Condition="Included" Value="True" />
+      </Check>
+      <Check ID="c4" CheckName="Disabled" ResultCondition="Sometimes" IsChecked="False">
+        <Filter ID="f4" Operator="Maybe" Category="Category" Property="OST_Floors" Condition="Included" Value="True" />
+      </Check>
+    </Section>
+  </Heading>
+</MCSettings>
+"""
+
+ILOD = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "Templates", "SC", "SC-iLOD and Standard Checks.xml")
+
+
+def test_problems_are_found():
+    lint = lint_template("test.xml", source=TEMPLATE)
+    assert lint.checks == 4 and lint.filters == 4
+    # Problems of single checks are warnings, the template still runs
+    assert lint.errors(enabled_only=False) == []
+    warnings = lint.warnings()
+    assert [(problem.check, problem.skips) for problem in warnings] == \
+        [("Thin Walls", True), ("No Filters", True), ("Floors", False)]
+    assert "numeric value" in warnings[0].message
+    assert str(warnings[0]).endswith(", the check is skipped")
+    assert all(problem.severity == WARNING for problem in warnings)
+    disabled = [problem for problem in lint.warnings(enabled_only=False)
+                if not problem.enabled]
+    assert [problem.check for problem in disabled] == ["Disabled"] * 3
+
+
+def test_checks_with_bad_filters_are_skipped():
+    lint = lint_template("test.xml", source=TEMPLATE)
+    lint.raise_errors()
+    assert validate_template("test.xml", source=TEMPLATE).checks == 4
+    skipped = lint.skipped_checks()
+    assert sorted(skipped) == ["c1", "c2", "c4"]
+    assert skipped["c4"] == ('Unknown result condition "Sometimes"; '
+                             'Unknown operator "Maybe", expected And, Or, '
+                             'Exclude')
+    assert sorted(lint.skipped_checks(sections=[1])) == ["c4"]
+    template = load_template("test.xml", io.BytesIO(TEMPLATE))
+    checks = skip_checks(compile_template(template, False), skipped)
+    assert [(check.spec.id, result_status(check, 1)) for check in checks] \
+        == [("c1", SKIPPED), ("c2", SKIPPED), ("c3", FAIL), ("c4", SKIPPED)]
+    assert checks[3].skip_reason == skipped["c4"]
+
+
+def test_malformed_template_is_an_error():
+    lint = lint_template("test.xml", source=TEMPLATE[:-40])
+    malformed = lint.errors()[-1]
+    assert malformed.message.startswith("Malformed XML")
+    # Problems of the template itself are raised for any section
+    assert malformed.section is None
+    with pytest.raises(TemplateError) as raised:
+        lint.raise_errors(sections=[1])
+    assert raised.value.problems == [malformed]
+    with pytest.raises(TemplateError):
+        validate_template("test.xml", source=TEMPLATE[:-40])
+
+
+def test_unknown_categories():
+    lint = lint_template("test.xml", set(["OST_Walls"]), TEMPLATE)
+    assert lint.skipped_checks()["c3"] == \
+        'Unknown category "OST_Floors", use its OST_* name'
+
+
+def test_shipped_ilod_template_skips_its_bad_filter():
+    lint = validate_template(ILOD)
+    damp = [problem for problem in lint.warnings()
+            if problem.check == "Damp Proofing"]
+    assert damp and damp[0].skips and "LessOrEqual" in damp[0].message
+    assert damp[0].check_id in lint.skipped_checks()
+
+
+def test_lint_is_cached_with_the_template(tmp_path, monkeypatch):
+    calls = []
+
+    def counted(*args):
+        calls.append(args[1])
+        return lint_template(*args)
+    monkeypatch.setattr(template_cache, "lint_template", counted)
+    folder = str(tmp_path)
+    first = TemplateCache(folder).load_content("test.xml", TEMPLATE)
+    cached = TemplateCache(folder).load_content("test.xml", TEMPLATE)
+    assert len(calls) == 1
+    assert [str(problem) for problem in cached.lint.problems] == \
+        [str(problem) for problem in first.lint.problems]
+    # Another set of category names is linted again
+    TemplateCache(folder).load_content("test.xml", TEMPLATE,
+                                       known_categories=set(["OST_Walls"]))
+    assert len(calls) == 2
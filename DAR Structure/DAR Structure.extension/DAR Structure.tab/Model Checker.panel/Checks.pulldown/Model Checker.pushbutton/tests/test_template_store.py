@@ -0,0 +1,57 @@
+""" Tests of sharing templates and checks within a run in template_store """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import os
+import shutil
+
+from template_cache import TemplateCache
+from template_store import TemplateStore, session_store
+
+TEMPLATES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Templates")
+
+SC = os.path.join(TEMPLATES, "SC", "SC-iLOD and Standard Checks.xml")
+SS = os.path.join(TEMPLATES, "SS", "SS-iLOD and Standard Checks.xml")
+
+
+def _expand_all(store, template):
+    sections = [section for _, section in template.iter_sections(False)]
+    store.expand(template, sections)
+    return list(template.iter_checks(False))
+
+
+def test_copies_of_a_template_are_loaded_once(tmp_path):
+    copy = str(tmp_path.joinpath("copy.xml"))
+    shutil.copy(SC, copy)
+    store = TemplateStore(TemplateCache(str(tmp_path.joinpath("cache"))))
+    template = store.load(SC)
+    assert store.load(copy) is template
+    assert store.reused_templates == 1
+    assert store.cache.misses == 1
+
+
+def test_shared_checks_are_built_and_compiled_once(tmp_path):
+    store = TemplateStore(TemplateCache(str(tmp_path)))
+    sc_checks = _expand_all(store, store.load(SC))
+    ss_checks = _expand_all(store, store.load(SS))
+    shared = [check for check in ss_checks
+              if any(check is other for other in sc_checks)]
+    assert shared and store.reused_checks >= len(shared)
+    assert len(store.checks) == len(sc_checks) + len(ss_checks) - \
+        len(shared)
+    assert store.compile(shared[0]) is store.compile(shared[0])
+
+
+def test_a_new_run_reads_the_disk_cache(tmp_path):
+    folder = str(tmp_path)
+    first = TemplateStore(TemplateCache(folder))
+    expected = [check.id for check in _expand_all(first, first.load(SC))]
+    # Each pyRevit run starts with an empty store
+    second = TemplateStore(TemplateCache(folder))
+    template = second.load(SC)
+    assert (second.cache.hits, second.cache.misses) == (1, 0)
+    assert [check.id for check in _expand_all(second, template)] == expected
+    assert second.cache.expanded == 0
+
+
+def test_session_store_is_shared():
+    assert session_store() is session_store()
@@ -0,0 +1,78 @@
+""" Tests of the streaming, lazily expanded template loader """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import glob
+import io
+import os
+
+import pytest
+
+from template_utils import expand_sections, load_outline, load_template
+
+TEMPLATES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Templates")
+
+# Every shipped template
+TEMPLATE_PATHS = sorted(glob.glob(os.path.join(TEMPLATES, "*", "*.xml")))
+
+NESTED = b"""<MCSettings Name="Nested" Author="A">
+<Heading ID="h1" HeadingText="One">
+<Section ID="s1" SectionName="Outer" IsChecked="False">
+<Check ID="c1" CheckName="First"><Filter ID="f1" Category="Category" Property="OST_Walls" Condition="Included" Value="True" /></Check>
+<Section ID="s2" SectionName="Inner"><Check ID="c2" CheckName="Second" /></Section>
+</Section>
+</Heading>
+<Heading ID="h2" HeadingText="Two">
+<Section ID="s3" SectionName="Last"><Check ID="c3" CheckName="Third" IsChecked="False" /></Section>
+</Heading>
+</MCSettings>
+"""
+
+
+def _specs(checks):
+    return [(check.id, check.name, check.heading, check.section,
+             check.is_checked, [repr(spec) for spec in check.filters])
+            for check in checks]
+
+
+@pytest.mark.parametrize("path", TEMPLATE_PATHS,
+                         ids=[os.path.basename(path)
+                              for path in TEMPLATE_PATHS])
+def test_expanded_outline_is_the_full_template(path):
+    full = load_template(path)
+    outline = load_outline(path)
+    sections = [section for _, section in outline.iter_sections(False)]
+    assert not any(section.loaded or section.checks for section in sections)
+    assert [section.check_count for section in sections] == \
+        [len(section.checks) for _, section in full.iter_sections(False)]
+    loaded = expand_sections(outline, sections)
+    assert sorted(loaded, key=lambda section: section.position) == sections
+    assert _specs(outline.iter_checks(False)) == \
+        _specs(full.iter_checks(False))
+    assert _specs(outline.iter_checks()) == _specs(full.iter_checks())
+    # Loaded sections are not read again
+    assert expand_sections(outline, sections) == []
+
+
+def test_only_the_picked_sections_are_expanded():
+    outline = load_outline("nested.xml", io.BytesIO(NESTED))
+    outer, inner, last = [section for _, section in
+                          outline.iter_sections(False)]
+    assert inner.parent is outer and inner.full_name == "Outer / Inner"
+    assert [section.check_count for section in (outer, inner, last)] == \
+        [1, 1, 1]
+    assert expand_sections(outline, [inner], io.BytesIO(NESTED)) == [inner]
+    assert [check.id for check in inner.checks] == ["c2"]
+    assert not outer.loaded and not last.loaded
+    # Sections nested in an unchecked section are not enabled
+    assert not inner.enabled
+    assert [section.name for _, section in outline.iter_sections()] == \
+        ["Last"]
+
+
+def test_checks_of_nested_sections_stay_in_their_section():
+    template = load_template("nested.xml", io.BytesIO(NESTED))
+    assert template.name == "Nested" and template.author == "A"
+    assert [(check.id, check.section) for check in
+            template.iter_checks(False)] == \
+        [("c1", "Outer"), ("c2", "Inner"), ("c3", "Last")]
+    assert list(template.iter_checks()) == []
@@ -0,0 +1,46 @@
+""" Tests of converting Revit internal units in unit_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import pytest
+
+from rule_utils import UnsupportedFilter, compile_filter, make_element
+from template_utils import FilterSpec
+from unit_utils import UnknownUnit, unit_factor
+
+
+@pytest.mark.parametrize("unit, unit_class, factor", [
+    ("None", "None", 1.0),
+    ("", "", 1.0),
+    (None, None, 1.0),
+    ("Millimeters", "None", 304.8),
+    ("Millimeters", "Length", 304.8),
+    ("Default", "Length", 304.8),
+    ("None", "Angle", 57.29577951308232),
+    ("Meters", "", 0.3048),
+    ("SquareMeters", "Area", 0.09290304),
+])
+def test_unit_factors(unit, unit_class, factor):
+    assert unit_factor(unit, unit_class) == pytest.approx(factor)
+
+
+@pytest.mark.parametrize("unit, unit_class", [
+    ("Furlongs", "None"),
+    ("Default", "None"),
+    ("Default", "Mass"),
+    ("Degrees", "Length"),
+])
+def test_unknown_units(unit, unit_class):
+    with pytest.raises(UnknownUnit):
+        unit_factor(unit, unit_class)
+
+
+def test_filters_compare_in_their_unit():
+    # 0.75 ft is 228.6 mm
+    thick = make_element(1, params={"Thickness": 0.75})
+    thin = make_element(2, params={"Thickness": 0.5})
+    spec = FilterSpec(None, "And", "Parameter", "Thickness", "GreaterThan",
+                      "200", unit="Millimeters", unit_class="Length")
+    predicate = compile_filter(spec)
+    assert predicate(thick) and not predicate(thin)
+    spec.unit = "Furlongs"
+    with pytest.raises(UnsupportedFilter):
+        compile_filter(spec)
@@ -0,0 +1,66 @@
+""" Tests of evaluating numeric filters on NumPy arrays in vector_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+#pylint: disable=unused-argument
+import pytest
+
+import vector_utils
+from bitset_utils import bitset_from_indices, evaluate_shared
+from rule_utils import (
+    MISSING, ORDER_CONDITIONS, compile_check, evaluate_checks, make_element,
+    value_test)
+from template_utils import CheckSpec, FilterSpec
+
+# Tests of the array functions themselves
+numpy_only = pytest.mark.skipif(not vector_utils.available(),
+                                reason="NumPy is not installed")
+
+# Distinct values of a field, as read from elements
+VALUES = [0.5, 0.75, 1, True, False, "0.65", "thick", "", MISSING,
+          0.65616797900262469]
+
+
+@numpy_only
+@pytest.mark.parametrize("condition",
+                         list(ORDER_CONDITIONS) + ["Equal", "NotEqual"])
+def test_compare_agrees_with_value_test(condition):
+    column = vector_utils.NumericColumn(range(len(VALUES)), VALUES)
+    outcomes = list(vector_utils.compare(column, condition, 200.0, 304.8))
+    test = value_test(condition, "200", factor=304.8)
+    expected = [value is not MISSING and test(value) for value in VALUES]
+    if condition in ("Equal", "NotEqual"):
+        # Only plain numbers are decided on the arrays
+        plain = list(column.plain)
+        outcomes = [outcome for outcome, keep in zip(outcomes, plain)
+                    if keep]
+        expected = [outcome for outcome, keep in zip(expected, plain)
+                    if keep]
+    assert outcomes == expected
+
+
+@numpy_only
+def test_spread_bits_packs_element_outcomes():
+    codes = vector_utils.numpy.array([2, 0, 1, 1, 2, 0, 2, 2, 1, 0, 2],
+                                     dtype=vector_utils.numpy.intp)
+    bits = vector_utils.spread_bits(codes, [False, True, True])
+    expected = [index for index, code in enumerate(codes) if code]
+    assert bits == bitset_from_indices(expected, len(codes))
+    assert vector_utils.spread_bits(codes[:0], [True]) == 0
+
+
+def test_dimensional_checks_agree(vector_mode):
+    elements = [make_element(number, "OST_Floors", "Floors",
+                             params={"Thickness": number / 1000.0})
+                for number in range(1, 1500)]
+    checks = [compile_check(CheckSpec("c", "Check", "FailMatchingElements",
+                                      filters=[FilterSpec(
+                                          None, "And", "Parameter",
+                                          "Thickness", condition, "200",
+                                          unit="Millimeters",
+                                          unit_class="Length")]))
+              for condition in ORDER_CONDITIONS]
+    shared = evaluate_shared(checks, elements, full=True)
+    rows = evaluate_checks(checks, elements, full=True)
+    assert [result.element_ids for result in shared] == \
+        [result.element_ids for result in rows]
+    # 200 mm is 0.656 ft
+    assert shared[0].element_ids[0] == 657
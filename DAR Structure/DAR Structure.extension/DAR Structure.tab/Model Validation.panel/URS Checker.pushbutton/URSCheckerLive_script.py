@@ -10,35 +10,25 @@ from Autodesk.Revit.ApplicationServices import *
 from Autodesk.Revit.UI import UIDocument
 from pyrevit import revit, forms, script, output
 import os
+import sys
+import csv
 import math
+import shutil
+import tempfile
 
 script_dir = os.path.dirname(__file__)
+sys.path.append(os.path.join(script_dir, "lib"))
+from grid_utils import tolerance_settings, transform_data
+from urs_compare import ERROR_CODES, compare_snapshots
+from urs_snapshot import SnapshotCache, collect_snapshot, write_snapshot
+import urs_batch
+
 ui_doc  = __revit__.ActiveUIDocument
 doc     = __revit__.ActiveUIDocument.Document # Get the Active Document
 app     = __revit__.Application # Returns the Revit Application Object
 rvt_year = int(app.VersionNumber)
 output = script.get_output()
 
-# Function to get the bounding box of a grid
-def get_bounding_box(grid):
-    location_curve = grid.Curve
-    curve_start = location_curve.GetEndPoint(0)
-    curve_end = location_curve.GetEndPoint(1)
-    
-    # Create a bounding box that encompasses the curve
-    bbox = BoundingBoxXYZ()
-    
-    # Extend the box to include the grid's full extent
-    min_x = min(curve_start.X, curve_end.X)
-    min_y = min(curve_start.Y, curve_end.Y)
-    max_x = max(curve_start.X, curve_end.X)
-    max_y = max(curve_start.Y, curve_end.Y)
-    bbox.Min = XYZ(min_x, min_y, -100000000000000000000)  # Extend downward to cover vertical extent
-    bbox.Max = XYZ(max_x, max_y, 1000000000000000000000)   # Extend upward to cover vertical extent
-    
-    return bbox
-
-
 # Collect all linked instances
 linked_instance = FilteredElementCollector(doc).OfClass(RevitLinkInstance).ToElements()
 link_name = []
@@ -63,6 +53,73 @@ if not urs_doc:
     script.exit()
 
 
+# Check the active document alone, or the active document and all other loaded links
+run_mode = forms.CommandSwitchWindow.show(["Check Active Document", "Check All Loaded Links"], message="Select run mode:")
+
+if not run_mode:
+    script.exit()
+
+if run_mode == "Check All Loaded Links":
+    report_folder = forms.pick_folder(title="Select Folder for the URS Batch Report")
+    if not report_folder:
+        script.exit()
+
+    # Snapshot the URS once and every model to check, each with the transform
+    # from URS coordinates to its own coordinates
+    snapshot_folder = tempfile.mkdtemp(prefix="URSChecker")
+    model_folder = os.path.join(snapshot_folder, "models")
+    os.makedirs(model_folder)
+    urs_path = os.path.join(snapshot_folder, "urs.json")
+    write_snapshot(urs_path, SnapshotCache().snapshot(urs_doc))
+
+    models = [(doc.Title, doc, Transform.Identity)]
+    for link in linked_instance:
+        if link.Id != urs_instance.Id and link.GetLinkDocument():
+            models.append((link.Name, link.GetLinkDocument(), link.GetTotalTransform()))
+
+    for index, (model_name, model_doc, model_transform) in enumerate(models):
+        snapshot = collect_snapshot(model_doc)
+        snapshot["title"] = model_name
+        snapshot["urs_transform"] = transform_data(model_transform.Inverse.Multiply(urs_instance.GetTotalTransform()))
+        write_snapshot(os.path.join(model_folder, "{0:03d}.json".format(index)), snapshot)
+
+    # Compare the models in a pool of CPython workers, in Revit when there is no usable
+    # CPython, or the helper ran longer than its timeout or did not write the report
+    summary_path = os.path.join(report_folder, urs_batch.SUMMARY_FILE)
+    if os.path.exists(summary_path):
+        os.remove(summary_path)
+    python = urs_batch.find_python()
+    if python:
+        timeout = urs_batch.helper_timeout()
+        try:
+            code = urs_batch._call([python, os.path.join(script_dir, "lib", "urs_batch.py"), urs_path, model_folder, report_folder], timeout)
+            if code is None:
+                print("The URS batch helper stopped after {0:.0f} s, checking in Revit".format(timeout))
+                if os.path.exists(summary_path):
+                    os.remove(summary_path)
+        except OSError as e:
+            print("The URS batch helper could not be started, checking in Revit: {0}".format(e))
+    if not os.path.exists(summary_path):
+        results = urs_batch.run_batch(urs_path, urs_batch.find_snapshots(model_folder), workers=1)
+        urs_batch.write_reports(report_folder, results, urs_path)
+    shutil.rmtree(snapshot_folder, ignore_errors=True)
+
+    if not os.path.exists(summary_path):
+        forms.alert("The URS batch check did not write a report.", title = "Batch Check Failed", warn_icon = True)
+        script.exit()
+
+    with open(summary_path) as summary_file:
+        summary_rows = list(csv.DictReader(summary_file))
+
+    output.print_md('# URS Batch Comparison Report')
+    output.print_md('**URS File Path:** {}'.format(urs_doc.PathName))
+    output.print_md('**Report:** {}'.format(os.path.join(report_folder, urs_batch.MATRIX_FILE)))
+    matrix_data = []
+    for row in summary_rows:
+        matrix_data.append([row["model"] or row["snapshot"]] + [row[code] for code in ERROR_CODES] + [row["error"] or row["issues"]])
+    output.print_table(table_data=matrix_data, columns=["MODEL"] + list(ERROR_CODES) + ["ISSUES"]) # Print a Table
+    script.exit()
+
 
 # Metadata for the report
 report_metadata = {
@@ -76,87 +133,24 @@ output.print_md('# {}'.format(report_metadata['Title']))
 output.print_md('**URS File Path:** {}'.format(report_metadata['URS File Path']))
 output.print_md('**Test File Path:** {}'.format(report_metadata['Test File']))
 
-# Check for Site Locations
-
-active_site_location = doc.SiteLocation
-urs_site_location = urs_doc.SiteLocation
-
-
-urs_current_location = urs_doc.ActiveProjectLocation
-urs_project_position = urs_current_location.GetProjectPosition(XYZ(0,0,0))
-
-urs_northSouth = urs_project_position.NorthSouth * 304.8
-urs_eastWest = urs_project_position.EastWest * 304.8
-urs_elevation = urs_project_position.Elevation * 304.8
-urs_trueNorth = round(urs_project_position.Angle / (math.pi / 180), 3)
-
-active_current_location = doc.ActiveProjectLocation
-active_project_position = active_current_location.GetProjectPosition(XYZ(0,0,0))
-
-active_northSouth = active_project_position.NorthSouth * 304.8
-active_eastWest = active_project_position.EastWest * 304.8
-active_elevation = active_project_position.Elevation * 304.8
-active_trueNorth = round(active_project_position.Angle / (math.pi / 180), 3)
-
-# print(urs_northSouth)
-# print(urs_eastWest)
-# print(urs_elevation)
-# print(urs_trueNorth)
-# print("")
-# print(active_northSouth)
-# print(active_eastWest)
-# print(active_elevation)
-# print(active_trueNorth)
-
-failed_geo_data = []
-failed_project_data = []
-failed_location = False
-
-
-if not active_elevation == urs_elevation:
-    failed_location = True
-
-elif not active_trueNorth == urs_trueNorth:
-    failed_location = True
+# Collect the URS datums and location, from the local snapshot cache unless the
+# loaded URS link is another version than the cached one, and the datums and location
+# of the active document
+snapshot_cache = SnapshotCache()
+urs_snapshot = snapshot_cache.snapshot(urs_doc)
+active_snapshot = collect_snapshot(doc)
+if snapshot_cache.hits:
+    output.print_md('**URS Snapshot:** read from {}'.format(snapshot_cache.entry_path(urs_doc.PathName)))
+
+# Run the location, grid and level checks on the snapshots: the URS grids are
+# moved by the link transform and compared with the tolerances (mm / degrees)
+tolerances = tolerance_settings()
+comparison = compare_snapshots(active_snapshot, urs_snapshot,
+                               transform_data(urs_instance.GetTotalTransform()), tolerances)
 
-elif not active_eastWest == urs_eastWest:
-    failed_location = True
-
-elif not active_northSouth == urs_northSouth:
-    failed_location = True
-
-if not active_site_location.Elevation == urs_site_location.Elevation:
-    failed_location = True
-
-elif not active_site_location.GeoCoordinateSystemDefinition == urs_site_location.GeoCoordinateSystemDefinition:
-    failed_location = True
-
-elif not active_site_location.Latitude == urs_site_location.Latitude:
-    failed_location = True
-
-elif not active_site_location.Longitude == urs_site_location.Longitude:
-    failed_location = True
-
-elif not active_site_location.PlaceName == urs_site_location.PlaceName:
-    failed_location = True
-
-elif not active_site_location.TimeZone == urs_site_location.TimeZone:
-    failed_location = True
-
-elif not active_site_location.WeatherStationName == urs_site_location.WeatherStationName:
-    failed_location = True
-
-
-if failed_location:
-    failed_geo_data.append(["Site Elevation", urs_site_location.Elevation, active_site_location.Elevation])
-    failed_geo_data.append(["Geo Coordinate System", urs_site_location.GeoCoordinateSystemId, active_site_location.GeoCoordinateSystemId])
-    failed_geo_data.append(["Latitude", urs_site_location.Latitude, active_site_location.Latitude])
-    failed_geo_data.append(["Longitude", urs_site_location.Longitude, active_site_location.Longitude])
-
-    failed_project_data.append(["N/S", urs_northSouth, active_northSouth])
-    failed_project_data.append(["E/W", urs_eastWest, active_eastWest])
-    failed_project_data.append(["Elev", urs_elevation, active_elevation])
-    failed_project_data.append(["Angle to True North", urs_trueNorth, active_trueNorth])
+# Check for Site Locations
+failed_geo_data = comparison.location.geo_rows
+failed_project_data = comparison.location.project_rows
 
 if failed_geo_data:
     output.print_md("##⚠️ URS LOCATION - Checks Completed. Issues Found ☹️") # Markdown Heading 2
@@ -174,69 +168,36 @@ else:
 
 
 # Check for Grids
-active_grids = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Grids).WhereElementIsNotElementType().ToElements()
-urs_grids = FilteredElementCollector(urs_doc).OfCategory(BuiltInCategory.OST_Grids).WhereElementIsNotElementType().ToElements()
+active_grids = active_snapshot["grids"]
 
 if not active_grids:
     forms.alert("No grids found in the active document", title = "Grids Missing", warn_icon = True)
     script.exit()
 
-active_grids_name = []
-urs_grids_name = []
-for grid in active_grids:
-    active_grids_name.append(grid.Name)
-
-for grid in urs_grids:
-    urs_grids_name.append(grid.Name)
-
-
-# Check if all URS Grid Names are present in the Active Doc Grids List
+# Report the missing, extra and renamed grids and the grids deviating from the URS
 failed_data = []
-for grid in urs_grids:
-    failed_urs_grid = []
-    if not grid.Name in active_grids_name:
-        failed_urs_grid.append(output.linkify(grid.Id))
-        failed_urs_grid.append(grid.Name) # Grid Name
-        failed_urs_grid.append("GRID MISSING IN ACTIVE DOCUMENT") # Error Code
-        failed_data.append(failed_urs_grid)
-
-# Check if all Active Grid Names are present in the URS Doc Grids List
-for grid in active_grids:
-    failed_urs_grid = []
-    if not grid.Name in urs_grids_name:
-        failed_urs_grid.append(output.linkify(grid.Id))
-        failed_urs_grid.append(grid.Name) # Grid Name
-        failed_urs_grid.append("GRID MISSING IN URS DOCUMENT") # Error Code
-        failed_data.append(failed_urs_grid)
-
-# Check the location of all Active grids against the URS Grids
-for active_grid in active_grids:
-    failed_urs_grid = []
-    for urs_grid in urs_grids:
-        if active_grid.Name == urs_grid.Name:
-            urs_grid_bbox = get_bounding_box(urs_grid)
-            active_grid_bbox = get_bounding_box(active_grid)
-            urs_grid_outline = Outline(urs_grid_bbox.Min, urs_grid_bbox.Max)
-            active_grid_outline = Outline(active_grid_bbox.Min, active_grid_bbox.Max)
-            if not urs_grid_outline.Intersects(active_grid_outline, 0.0001):
-                failed_urs_grid.append(output.linkify(active_grid.Id))
-                failed_urs_grid.append(active_grid.Name) # Grid Name
-                failed_urs_grid.append("GRID LOCATION INCORRECT") # Error Code
-                failed_data.append(failed_urs_grid)
+for grid_id, grid_name, error_code, offset, angle, extent in comparison.grid_issues:
+    failed_data.append([output.linkify(ElementId(grid_id)), grid_name, error_code,
+                        "" if offset is None else "{0:.2f}".format(offset),
+                        "" if angle is None else "{0:.3f}".format(angle),
+                        "" if extent is None else "{0:.2f}".format(extent)])
 
 
 if failed_data:
     output.print_md("##⚠️ URS GRIDS - Checks Completed. Issues Found ☹️") # Markdown Heading 2
     output.print_md("---") # Markdown Line Break
     output.print_md("❌ There are Issues in your Model. Refer to the **Table Report** below for reference")  # Print a Line
-    output.print_table(table_data=failed_data, columns=["ELEMENT ID", "GRID NAME", "ERROR CODE"]) # Print a Table
+    output.print_table(table_data=failed_data, columns=["ELEMENT ID", "GRID NAME", "ERROR CODE", "OFFSET (MM)", "ANGLE (DEG)", "EXTENT (MM)"]) # Print a Table
     print("\n\n")
     output.print_md("---") # Markdown Line Break
     output.print_md("***✅ ERROR CODE REFERENCE***")  # Print a Line
     output.print_md("---") # Markdown Line Break
     output.print_md("**GRID MISSING IN ACTIVE DOCUMENT**  - The active document has missing grids. It must match the URS.") # Print a Quote
     output.print_md("**GRID MISSING IN URS DOCUMENT**     - There are extra grids or grids with incorrect names in the active document. They must match the URS.") # Print a Quote
-    output.print_md("**GRID LOCATION INCORRECT**          - The grid location in the active document is incorrect. It must match the URS") # Print a Quote
+    output.print_md("**GRID RENAMED**                     - The grid lies on a URS grid of another name. It must be renamed to match the URS.") # Print a Quote
+    output.print_md("**GRID LOCATION INCORRECT**          - The grid is offset from the URS grid by more than {0} mm. It must match the URS".format(tolerances.offset)) # Print a Quote
+    output.print_md("**GRID ANGLE INCORRECT**             - The grid is rotated from the URS grid by more than {0} degrees. It must match the URS".format(tolerances.angle)) # Print a Quote
+    output.print_md("**GRID EXTENT INCORRECT**            - The grid ends are more than {0} mm from the URS grid ends. It must match the URS".format(tolerances.extent)) # Print a Quote
     output.print_md("---") # Markdown Line Break
 
 else:
@@ -246,52 +207,16 @@ else:
 ##############################################
 
 # Check for Levels
-active_levels = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Levels).WhereElementIsNotElementType().ToElements()
-urs_levels = FilteredElementCollector(urs_doc).OfCategory(BuiltInCategory.OST_Levels).WhereElementIsNotElementType().ToElements()
+active_levels = active_snapshot["levels"]
 
 if not active_levels:
     forms.alert("No levels found in the active document", title = "Levels Missing", warn_icon = True)
     script.exit()
 
-active_levels_name = []
-urs_levels_name = []
-
-for level in active_levels:
-    active_levels_name.append(level.Name)
-
-for level in urs_levels:
-    urs_levels_name.append(level.Name)
-
-
-# Check if all URS Levels Names are present in the Active Doc Levels List
+# Report the missing and extra levels and the levels at another elevation than in the URS
 failed_data = []
-for level in urs_levels:
-    failed_urs_level = []
-    if not level.Name in active_levels_name:
-        failed_urs_level.append(output.linkify(level.Id))
-        failed_urs_level.append(level.Name) # Level Name
-        failed_urs_level.append("LEVEL MISSING IN ACTIVE DOCUMENT") # Error Code
-        failed_data.append(failed_urs_level)
-
-# Check if all Active Level Names are present in the URS Doc Levels List
-for level in active_levels:
-    failed_urs_level = []
-    if not level.Name in urs_levels_name:
-        failed_urs_level.append(output.linkify(level.Id))
-        failed_urs_level.append(level.Name) # Level Name
-        failed_urs_level.append("LEVEL MISSING IN URS DOCUMENT") # Error Code
-        failed_data.append(failed_urs_level)
-
-# Check the location of all Active levels against the URS Levels
-for active_level in active_levels:
-    failed_urs_level = []
-    for urs_level in urs_levels:
-        if active_level.Name == urs_level.Name:
-            if not urs_level.LookupParameter("Elevation").AsValueString() == active_level.LookupParameter("Elevation").AsValueString():
-                failed_urs_level.append(output.linkify(active_level.Id))
-                failed_urs_level.append(active_level.Name) # Level Name
-                failed_urs_level.append("LEVEL LOCATION INCORRECT") # Error Code
-                failed_data.append(failed_urs_level)
+for level_id, level_name, error_code in comparison.level_issues:
+    failed_data.append([output.linkify(ElementId(level_id)), level_name, error_code])
 
 
 if failed_data:
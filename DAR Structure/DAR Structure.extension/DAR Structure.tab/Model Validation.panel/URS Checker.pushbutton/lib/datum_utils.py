@@ -0,0 +1,122 @@
+""" Module to match the datums of a document with the datums of the URS
+
+Grids and levels are indexed by name once per document, so the missing,
+extra and common datums of two documents are found with set operations in
+one linear pass over each side instead of comparing every pair.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+
+
+def id_value(element_id):
+    """ Integer value of an ElementId for all Revit versions. """
+    value = getattr(element_id, "Value", None)
+    if value is None:
+        value = element_id.IntegerValue
+    return int(value)
+
+
+def datum_name(datum):
+    """ Name of a Revit grid or level. """
+    return datum.Name
+
+
+def _item_name(item):
+    return item[0]
+
+
+def index_by_name(datums, name=datum_name):
+    """
+    Indexes datums by name.
+
+    Parameters
+    ----------
+    datums : iterable
+        Grids, levels or datum records
+    name : function
+        Returns the name of a datum
+
+    Returns
+    -------
+    dict
+        Name -> datum. Revit keeps datum names unique per document; should
+        a name repeat, the first datum is kept.
+    """
+    index = {}
+    for datum in datums:
+        index.setdefault(name(datum), datum)
+    return index
+
+
+class DatumMatch:
+    """
+    Datums of the active document matched with the URS by name.
+
+    Attributes
+    ----------
+    missing : list
+        URS datums without a datum of the same name in the active document
+    extra : list
+        Active datums without a datum of the same name in the URS
+    pairs : list
+        (active datum, URS datum) items with the same name
+    """
+    def __init__(self, missing, extra, pairs):
+        self.missing = missing
+        self.extra = extra
+        self.pairs = pairs
+
+
+def match_datums(active_datums, urs_datums, name=datum_name):
+    """
+    Matches the datums of the active document with the URS datums by name.
+
+    Parameters
+    ----------
+    active_datums : iterable
+        Grids or levels of the active document
+    urs_datums : iterable
+        Grids or levels of the URS document
+    name : function
+        Returns the name of a datum
+
+    Returns
+    -------
+    DatumMatch
+        Lists keep the collection order of their document
+    """
+    # Names are read once, Revit datums look them up through the API
+    active_items = [(name(datum), datum) for datum in active_datums]
+    urs_items = [(name(datum), datum) for datum in urs_datums]
+    active = index_by_name(active_items, _item_name)
+    urs = index_by_name(urs_items, _item_name)
+    return DatumMatch(
+        [datum for key, datum in urs_items if key not in active],
+        [datum for key, datum in active_items if key not in urs],
+        [(datum, urs[key][1]) for key, datum in active_items
+         if key in urs and active[key][1] is datum])
+
+
+def record_name(record):
+    """ Name of a grid or level record. """
+    return record["name"]
+
+
+def level_record(level):
+    """
+    Reads a Revit level into a level record.
+
+    Parameters
+    ----------
+    level : Autodesk.Revit.DB.Level
+        Level of a document
+
+    Returns
+    -------
+    dict
+        id, name, elevation (internal units) and elevation_text, the
+        Elevation parameter as shown in the document
+    """
+    return {"id": id_value(level.Id), "name": level.Name,
+            "elevation": level.Elevation,
+            "elevation_text": level.LookupParameter(
+                "Elevation").AsValueString()}
@@ -0,0 +1,230 @@
+""" Module to find the grids that were renamed between the URS and a document
+
+A grid renamed on one side shows up as one missing and one extra grid.
+Both lie on the same line, so the unmatched grids are indexed by the
+parameters of their line in plan: direction angle (0 to 180 degrees) and
+signed distance of the line from the middle of the indexed grids. The
+index is a uniform grid of cells as large as the match tolerances; a
+lookup only visits the few cells around the line of a grid, so pairing n
+grids takes about n lookups instead of n x m comparisons.
+
+The candidates found through the index are measured with grid_utils and
+paired best first, every grid at most once. Grids on the same line only
+pair when they overlap along it, grids further along the line are other
+grids.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import math
+
+from grid_utils import MM_PER_FOOT, grid_deviations, move_grid
+
+# Largest offset (mm) and angle (degrees) between the lines of a renamed grid
+RENAME_OFFSET_TOLERANCE = 50.0
+RENAME_ANGLE_TOLERANCE = 0.5
+
+# Error code of a grid paired with a grid of another name
+RENAMED = "GRID RENAMED"
+
+
+def _middle(record):
+    return ((record["start"][0] + record["end"][0]) / 2.0,
+            (record["start"][1] + record["end"][1]) / 2.0)
+
+
+def line_key(record, origin=(0.0, 0.0)):
+    """
+    Parameters of the line of a grid in plan.
+
+    Parameters
+    ----------
+    record : dict
+        Grid record, see grid_utils.make_grid
+    origin : tuple
+        (x, y) the distance is measured from, internal units
+
+    Returns
+    -------
+    tuple
+        (angle in degrees from 0 to 180, signed distance of the line from
+        the origin in mm, distance of the middle of the grid from the
+        origin in mm), None for a grid of zero length
+    """
+    start, end = record["start"], record["end"]
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    if not math.hypot(dx, dy):
+        return None
+    angle = math.degrees(math.atan2(dy, dx)) % 180.0
+    direction = math.radians(angle)
+    x, y = _middle(record)
+    x -= origin[0]
+    y -= origin[1]
+    distance = y * math.cos(direction) - x * math.sin(direction)
+    return angle, distance * MM_PER_FOOT, math.hypot(x, y) * MM_PER_FOOT
+
+
+def overlap(first, second):
+    """
+    Checks if two grids on about the same line share part of it in plan.
+
+    Parameters
+    ----------
+    first, second : dict
+        Grid records in the same coordinates
+
+    Returns
+    -------
+    bool
+        The ends of first projected on the line of second span part of
+        second, touching ends do not count
+    """
+    start, end = second["start"], second["end"]
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    length = dx * dx + dy * dy
+    if not length:
+        return False
+    along = [((point[0] - start[0]) * dx + (point[1] - start[1]) * dy) /
+             length for point in (first["start"], first["end"])]
+    return max(along) > 0.0 and min(along) < 1.0
+
+
+class GridIndex:
+    """
+    Uniform cell index of grid lines.
+
+    Attributes
+    ----------
+    angle_cell : float
+        Cell size along the angle, degrees
+    distance_cell : float
+        Cell size along the distance from the origin, mm
+    origin : tuple
+        (x, y) middle of the grids given on creation, the distances of the
+        lines are measured from it
+    cells : dict
+        (angle cell, distance cell) -> list of grid records
+
+    Methods
+    -------
+    add(record)
+        Adds a grid record to the index
+    candidates(record)
+        Indexed grids whose line is close to the line of a grid
+    """
+    def __init__(self, records=(), angle_cell=RENAME_ANGLE_TOLERANCE,
+                 distance_cell=RENAME_OFFSET_TOLERANCE):
+        self.angle_cell = angle_cell
+        self.distance_cell = distance_cell
+        self._angle_cells = int(math.ceil(180.0 / angle_cell))
+        records = list(records)
+        middles = [_middle(record) for record in records]
+        self.origin = (0.0, 0.0)
+        if middles:
+            self.origin = (sum(x for x, _ in middles) / len(middles),
+                           sum(y for _, y in middles) / len(middles))
+        self.cells = {}
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        """ Adds a grid record, grids of zero length are left out. """
+        key = line_key(record, self.origin)
+        if key is not None:
+            cell = (int(key[0] / self.angle_cell) % self._angle_cells,
+                    int(math.floor(key[1] / self.distance_cell)))
+            self.cells.setdefault(cell, []).append(record)
+
+    def candidates(self, record):
+        """
+        Indexed grids in the cells around the line of a grid.
+
+        A line turned by the angle tolerance about the middle of the grid
+        moves its distance from the origin by up to the distance of that
+        middle times the sine of the angle, the distance cells searched
+        are widened by it. Lines at an angle close to 0 and close to 180
+        degrees are the same line with the opposite sign of the distance,
+        the angle cells wrap around accordingly.
+
+        Returns
+        -------
+        list
+            Grid records, each at most once
+        """
+        key = line_key(record, self.origin)
+        if key is None:
+            return []
+        angle_cell = int(key[0] / self.angle_cell) % self._angle_cells
+        reach = self.distance_cell + key[2] * math.sin(
+            math.radians(self.angle_cell))
+        found = []
+        seen = set()
+        for angle_step in (-1, 0, 1):
+            cell = angle_cell + angle_step
+            distance = key[1]
+            if cell < 0 or cell >= self._angle_cells:
+                cell %= self._angle_cells
+                distance = -distance
+            first = int(math.floor((distance - reach) / self.distance_cell))
+            last = int(math.floor((distance + reach) / self.distance_cell))
+            for distance_cell in range(first, last + 1):
+                for other in self.cells.get((cell, distance_cell), ()):
+                    if id(other) not in seen:
+                        seen.add(id(other))
+                        found.append(other)
+        return found
+
+
+def pair_renamed(missing, extra, transform=None,
+                 offset_tolerance=RENAME_OFFSET_TOLERANCE,
+                 angle_tolerance=RENAME_ANGLE_TOLERANCE):
+    """
+    Pairs unmatched URS grids with unmatched grids of the active document.
+
+    Parameters
+    ----------
+    missing : list
+        Records of URS grids without an active grid of the same name
+    extra : list
+        Records of active grids without a URS grid of the same name
+    transform : tuple
+        Transform of the URS link instance, see grid_utils.transform_data
+    offset_tolerance : float
+        Largest offset of the lines of a pair, mm
+    angle_tolerance : float
+        Largest angle between the lines of a pair, degrees
+
+    Returns
+    -------
+    tuple
+        (GridDeviation items of the renamed pairs, URS records left
+        missing, active records left extra). Only grids that overlap are
+        paired, those with the smallest offset, then angle, then extent
+        first.
+    """
+    if not missing or not extra:
+        return [], list(missing), list(extra)
+    moved = [move_grid(record, transform) for record in missing]
+    urs_records = dict((id(record), original)
+                       for record, original in zip(moved, missing))
+    index = GridIndex(moved, angle_tolerance, offset_tolerance)
+    candidates = [(active, urs) for active in extra
+                  for urs in index.candidates(active)]
+    deviations = [deviation for deviation in grid_deviations(candidates)
+                  if deviation.offset <= offset_tolerance and
+                  deviation.angle <= angle_tolerance and
+                  overlap(deviation.active, deviation.urs)]
+    deviations.sort(key=lambda item: (item.offset, item.angle, item.extent))
+    renamed = []
+    paired = set()
+    for deviation in deviations:
+        if id(deviation.active) in paired or id(deviation.urs) in paired:
+            continue
+        paired.add(id(deviation.active))
+        paired.add(id(deviation.urs))
+        deviation.urs = urs_records[id(deviation.urs)]
+        renamed.append(deviation)
+    return (renamed,
+            [record for record, moved_record in zip(missing, moved)
+             if id(moved_record) not in paired],
+            [record for record in extra if id(record) not in paired])
@@ -0,0 +1,319 @@
+""" Module to measure how far the grids of a document deviate from the URS
+
+A grid is reduced to a plain record of its end points in internal units
+(decimal feet). The URS grids are moved into the active document with the
+transform of the link instance, then every matched pair is compared in
+plan:
+
+- offset: distance of the middle of the active grid from the URS grid line
+- angle: angle between the two grid lines
+- extent: largest distance between the ends of the two grids along the
+  URS grid line
+
+With NumPy all pairs are transformed and measured in one pass of array
+operations. Without it (IronPython inside Revit) the same measures are
+computed pair by pair.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import math
+import os
+
+from datum_utils import id_value
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Millimeters per internal unit (decimal foot)
+MM_PER_FOOT = 304.8
+
+# Environment variables overriding the default tolerances
+OFFSET_TOLERANCE_VARIABLE = "URS_OFFSET_TOLERANCE_MM"
+ANGLE_TOLERANCE_VARIABLE = "URS_ANGLE_TOLERANCE_DEG"
+EXTENT_TOLERANCE_VARIABLE = "URS_EXTENT_TOLERANCE_MM"
+
+# Default tolerances, in millimeters and degrees
+OFFSET_TOLERANCE = 1.0
+ANGLE_TOLERANCE = 0.01
+EXTENT_TOLERANCE = 10.0
+
+# Error codes of a grid pair outside the tolerances
+LOCATION_INCORRECT = "GRID LOCATION INCORRECT"
+ANGLE_INCORRECT = "GRID ANGLE INCORRECT"
+EXTENT_INCORRECT = "GRID EXTENT INCORRECT"
+
+# Transform that leaves points where they are
+IDENTITY = ((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0),
+            (0.0, 0.0, 1.0))
+
+
+def available():
+    """ Checks if NumPy can be used. """
+    return numpy is not None
+
+
+def _xyz(point):
+    return (point.X, point.Y, point.Z)
+
+
+def make_grid(id, name, start, end, curved=False):
+    """
+    Builds a grid record.
+
+    Parameters
+    ----------
+    id : int
+        Element id
+    name : str
+        Grid name
+    start : tuple
+        (x, y, z) of the first end point, internal units
+    end : tuple
+        (x, y, z) of the second end point, internal units
+    curved : bool
+        The grid is an arc, it is measured along its chord
+
+    Returns
+    -------
+    dict
+    """
+    return {"id": id, "name": name, "start": tuple(start),
+            "end": tuple(end), "curved": curved}
+
+
+def grid_record(grid):
+    """
+    Reads a Revit grid into a grid record.
+
+    Parameters
+    ----------
+    grid : Autodesk.Revit.DB.Grid
+        Grid of a document
+
+    Returns
+    -------
+    dict
+        See make_grid
+    """
+    curve = grid.Curve
+    return make_grid(id_value(grid.Id), grid.Name,
+                     _xyz(curve.GetEndPoint(0)), _xyz(curve.GetEndPoint(1)),
+                     curve.GetType().Name != "Line")
+
+
+def transform_data(transform):
+    """
+    Reads a Revit transform into plain data.
+
+    Parameters
+    ----------
+    transform : Autodesk.Revit.DB.Transform
+        e.g. RevitLinkInstance.GetTotalTransform()
+
+    Returns
+    -------
+    tuple
+        (origin, basis x, basis y, basis z) as (x, y, z) tuples
+    """
+    return (_xyz(transform.Origin), _xyz(transform.BasisX),
+            _xyz(transform.BasisY), _xyz(transform.BasisZ))
+
+
+def _apply(transform, point):
+    origin, basis_x, basis_y, basis_z = transform
+    return tuple(origin[axis] + point[0] * basis_x[axis] +
+                 point[1] * basis_y[axis] + point[2] * basis_z[axis]
+                 for axis in range(3))
+
+
+def move_grid(record, transform=None):
+    """
+    Returns
+    -------
+    dict
+        Copy of a grid record with its end points moved by a transform
+        (see transform_data), the record itself without one
+    """
+    if transform is None:
+        return record
+    moved = dict(record)
+    moved["start"] = _apply(transform, record["start"])
+    moved["end"] = _apply(transform, record["end"])
+    return moved
+
+
+class Tolerances:
+    """
+    Largest deviations of a grid pair that still pass.
+
+    Attributes
+    ----------
+    offset : float
+        Millimeters
+    angle : float
+        Degrees
+    extent : float
+        Millimeters
+    """
+    def __init__(self, offset=OFFSET_TOLERANCE, angle=ANGLE_TOLERANCE,
+                 extent=EXTENT_TOLERANCE):
+        self.offset = offset
+        self.angle = angle
+        self.extent = extent
+
+
+def _setting(variable, default):
+    try:
+        value = float(os.environ.get(variable, ""))
+    except ValueError:
+        return default
+    return value if value >= 0 else default
+
+
+def tolerance_settings():
+    """
+    Returns
+    -------
+    Tolerances
+        Tolerances from the URS_*_TOLERANCE_* variables, else the defaults
+    """
+    return Tolerances(_setting(OFFSET_TOLERANCE_VARIABLE, OFFSET_TOLERANCE),
+                      _setting(ANGLE_TOLERANCE_VARIABLE, ANGLE_TOLERANCE),
+                      _setting(EXTENT_TOLERANCE_VARIABLE, EXTENT_TOLERANCE))
+
+
+class GridDeviation:
+    """
+    Deviation of an active grid from the URS grid of the same name.
+
+    Attributes
+    ----------
+    active : dict
+        Grid record of the active document
+    urs : dict
+        Grid record of the URS document
+    offset : float
+        Millimeters between the middle of the active grid and the URS line
+    angle : float
+        Degrees between the two grid lines
+    extent : float
+        Millimeters between the ends of the grids along the URS line
+    """
+    def __init__(self, active, urs, offset, angle, extent):
+        self.active = active
+        self.urs = urs
+        self.offset = offset
+        self.angle = angle
+        self.extent = extent
+
+    def errors(self, tolerances):
+        """
+        Returns
+        -------
+        list
+            Error codes of the measures outside the tolerances
+        """
+        codes = []
+        if self.offset > tolerances.offset:
+            codes.append(LOCATION_INCORRECT)
+        if self.angle > tolerances.angle:
+            codes.append(ANGLE_INCORRECT)
+        if self.extent > tolerances.extent:
+            codes.append(EXTENT_INCORRECT)
+        return codes
+
+
+def _measure(active_start, active_end, urs_start, urs_end):
+    """ (offset, angle, extent) of one pair in plan, internal units. """
+    ux = urs_end[0] - urs_start[0]
+    uy = urs_end[1] - urs_start[1]
+    length = math.hypot(ux, uy)
+    ax = active_end[0] - active_start[0]
+    ay = active_end[1] - active_start[1]
+    active_length = math.hypot(ax, ay)
+    if not length or not active_length:
+        return float("inf"), float("inf"), float("inf")
+    ux, uy = ux / length, uy / length
+    angle = math.atan2(abs(ux * ay - uy * ax), abs(ux * ax + uy * ay))
+    middle_x = (active_start[0] + active_end[0]) / 2.0 - urs_start[0]
+    middle_y = (active_start[1] + active_end[1]) / 2.0 - urs_start[1]
+    offset = abs(middle_y * ux - middle_x * uy)
+    along = [(point[0] - urs_start[0]) * ux + (point[1] - urs_start[1]) * uy
+             for point in (active_start, active_end)]
+    extent = max(abs(min(along)), abs(max(along) - length))
+    return offset, math.degrees(angle), extent
+
+
+def _deviations_python(pairs, transform):
+    deviations = []
+    for active, urs in pairs:
+        offset, angle, extent = _measure(
+            active["start"], active["end"],
+            _apply(transform, urs["start"]), _apply(transform, urs["end"]))
+        deviations.append(GridDeviation(active, urs, offset * MM_PER_FOOT,
+                                        angle, extent * MM_PER_FOOT))
+    return deviations
+
+
+def _deviations_numpy(pairs, transform):
+    # (pairs, end, axis) arrays of the end points
+    active = numpy.array([(a["start"], a["end"]) for a, _ in pairs],
+                         dtype=float)
+    urs = numpy.array([(u["start"], u["end"]) for _, u in pairs],
+                      dtype=float)
+    origin = numpy.array(transform[0], dtype=float)
+    basis = numpy.array(transform[1:], dtype=float)
+    urs = numpy.dot(urs, basis) + origin
+    active = active[:, :, :2]
+    urs = urs[:, :, :2]
+
+    urs_vector = urs[:, 1] - urs[:, 0]
+    active_vector = active[:, 1] - active[:, 0]
+    length = numpy.hypot(urs_vector[:, 0], urs_vector[:, 1])
+    active_length = numpy.hypot(active_vector[:, 0], active_vector[:, 1])
+    valid = (length > 0) & (active_length > 0)
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        direction = urs_vector / length[:, None]
+        angle = numpy.degrees(numpy.arctan2(
+            numpy.abs(direction[:, 0] * active_vector[:, 1] -
+                      direction[:, 1] * active_vector[:, 0]),
+            numpy.abs(numpy.einsum("ij,ij->i", direction, active_vector))))
+        middle = active.mean(axis=1) - urs[:, 0]
+        offset = numpy.abs(middle[:, 1] * direction[:, 0] -
+                           middle[:, 0] * direction[:, 1])
+        along = numpy.einsum("ijk,ik->ij", active - urs[:, :1], direction)
+        extent = numpy.maximum(numpy.abs(along.min(axis=1)),
+                               numpy.abs(along.max(axis=1) - length))
+    offset = numpy.where(valid, offset * MM_PER_FOOT, numpy.inf)
+    angle = numpy.where(valid, angle, numpy.inf)
+    extent = numpy.where(valid, extent * MM_PER_FOOT, numpy.inf)
+    return [GridDeviation(pair[0], pair[1], float(offset[index]),
+                          float(angle[index]), float(extent[index]))
+            for index, pair in enumerate(pairs)]
+
+
+def grid_deviations(pairs, transform=None):
+    """
+    Measures matched grid pairs.
+
+    Parameters
+    ----------
+    pairs : list
+        (active grid record, URS grid record) items
+    transform : tuple
+        Transform of the URS link instance, see transform_data. The URS
+        grids are moved by it into the active document.
+
+    Returns
+    -------
+    list
+        GridDeviation items in the order of the pairs. Grids of zero
+        length deviate infinitely.
+    """
+    transform = transform or IDENTITY
+    if not pairs:
+        return []
+    if numpy is not None:
+        return _deviations_numpy(pairs, transform)
+    return _deviations_python(pairs, transform)
@@ -0,0 +1,112 @@
+""" Module to compare the shared location of a document with the URS
+
+The project position of the active project location and the fields of the
+site location are read into a plain record, so the location of a document
+can be compared live or from a snapshot.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+import math
+
+# Millimeters per internal unit (decimal foot)
+MM_PER_FOOT = 304.8
+
+# SiteLocation properties that must match the URS
+SITE_FIELDS = ("Elevation", "GeoCoordinateSystemDefinition",
+               "GeoCoordinateSystemId", "Latitude", "Longitude", "PlaceName",
+               "TimeZone", "WeatherStationName")
+
+# SiteLocation properties listed in the report: (property, row label)
+SITE_ROWS = (("Elevation", "Site Elevation"),
+             ("GeoCoordinateSystemId", "Geo Coordinate System"),
+             ("Latitude", "Latitude"), ("Longitude", "Longitude"))
+
+
+def location_record(doc):
+    """
+    Reads the shared location of a document.
+
+    Parameters
+    ----------
+    doc : Autodesk.Revit.DB.Document
+        Active document or URS link document
+
+    Returns
+    -------
+    dict
+        north_south, east_west, elevation (internal units) and angle
+        (radians) of the project position at the internal origin, and
+        site: SITE_FIELDS of the site location
+    """
+    from Autodesk.Revit.DB import XYZ
+    position = doc.ActiveProjectLocation.GetProjectPosition(XYZ(0, 0, 0))
+    site = doc.SiteLocation
+    return {"north_south": position.NorthSouth,
+            "east_west": position.EastWest,
+            "elevation": position.Elevation,
+            "angle": position.Angle,
+            "site": dict((field, getattr(site, field))
+                         for field in SITE_FIELDS)}
+
+
+def project_position(location):
+    """
+    Returns
+    -------
+    list
+        (label, value) of the project position in mm and degrees
+    """
+    return [("N/S", location["north_south"] * MM_PER_FOOT),
+            ("E/W", location["east_west"] * MM_PER_FOOT),
+            ("Elev", location["elevation"] * MM_PER_FOOT),
+            ("Angle to True North",
+             round(location["angle"] / (math.pi / 180), 3))]
+
+
+class LocationCheck:
+    """
+    Outcome of comparing two locations.
+
+    Attributes
+    ----------
+    failed : bool
+        The project position or the site location differs
+    geo_rows : list
+        [label, URS value, document value] rows of the site location
+    project_rows : list
+        [label, URS value, document value] rows of the project position
+    """
+    def __init__(self, failed, geo_rows, project_rows):
+        self.failed = failed
+        self.geo_rows = geo_rows
+        self.project_rows = project_rows
+
+
+def compare_locations(active, urs):
+    """
+    Compares the location of the active document with the URS location.
+
+    Parameters
+    ----------
+    active : dict
+        Location record of the active document
+    urs : dict
+        Location record of the URS document
+
+    Returns
+    -------
+    LocationCheck
+        With the rows of all compared values when anything differs
+    """
+    active_position = project_position(active)
+    urs_position = project_position(urs)
+    failed = active_position != urs_position or any(
+        active["site"][field] != urs["site"][field]
+        for field in SITE_FIELDS if field != "GeoCoordinateSystemId")
+    if not failed:
+        return LocationCheck(False, [], [])
+    geo_rows = [[label, urs["site"][field], active["site"][field]]
+                for field, label in SITE_ROWS]
+    project_rows = [[label, urs_value, active_value]
+                    for (label, urs_value), (_, active_value)
+                    in zip(urs_position, active_position)]
+    return LocationCheck(True, geo_rows, project_rows)
@@ -0,0 +1,435 @@
+""" Module to check many models against the URS in a pool of worker processes
+
+Every model is a snapshot file (see urs_snapshot) holding its grids,
+levels and location, and optionally the transform from URS to model
+coordinates under "urs_transform". The URS snapshot is read once by every
+worker; the models are checked one snapshot per task with the location,
+grid and level checks of urs_compare. The results go to one matrix report:
+a CSV and an HTML table with a row per model and a column per error code,
+followed by the issues of every model.
+
+Usage:
+    python urs_batch.py <urs snapshot.json> <snapshot folder> <report folder>
+                        [--workers N] [--pattern *.json]
+"""
+#pylint: disable=invalid-name,broad-except,superfluous-parens,global-statement
+#pylint: disable=undefined-variable
+from __future__ import print_function
+import codecs
+import csv
+import fnmatch
+import os
+import signal
+import subprocess
+import sys
+import time
+from xml.sax.saxutils import escape
+
+from urs_snapshot import read_snapshot
+from urs_compare import ERROR_CODES, compare_snapshots
+
+# Environment variable naming the CPython interpreter of the helper process
+PYTHON_VARIABLE = "URSCHECKER_PYTHON"
+
+# Seconds an interpreter gets to run the probe of usable_python
+PROBE_TIMEOUT = 15
+
+# Environment variable overriding the seconds the helper process may run
+TIMEOUT_VARIABLE = "URSCHECKER_HELPER_TIMEOUT"
+
+# Seconds the helper process may run before it is stopped and the models
+# are checked in Revit instead
+HELPER_TIMEOUT = 900
+
+# Process creation flag that keeps a console window from opening (Windows)
+CREATE_NO_WINDOW = 0x08000000
+
+# Probe run by usable_python: the helper needs Python 2.7 or 3 with
+# multiprocessing, csv and json
+PROBE_CODE = ("import sys, csv, json, multiprocessing; "
+              "sys.exit(0 if sys.version_info[:2] >= (2, 7) else 3)")
+
+# Interpreter path -> result of usable_python, probed once per session
+_probed = {}
+
+# Columns of the summary table
+SUMMARY_FIELDS = (("snapshot", "model", "grids", "levels") + ERROR_CODES +
+                  ("issues", "seconds", "error"))
+
+# File names of the matrix report in the report folder
+SUMMARY_FILE = "urs_summary.csv"
+MATRIX_FILE = "urs_matrix.html"
+
+STYLE = """
+body { font-family: Arial, sans-serif; background-color: #f4f4f9; color: #333; }
+h1 { color: #00539C; }
+table { border-collapse: collapse; margin: 20px 0; }
+table, th, td { border: 1px solid #ccc; padding: 6px; }
+th { background-color: #f4f4f4; color: #00539C; font-size: 12px; }
+td.pass { background-color: #dff0d8; text-align: center; }
+td.fail { background-color: #f2dede; text-align: center; font-weight: bold; }
+details { margin: 10px 0; }
+summary { cursor: pointer; font-weight: bold; }
+"""
+
+# URS snapshot of a worker process
+_urs = None
+
+
+def find_snapshots(folder, pattern="*.json"):
+    """
+    Returns
+    -------
+    list
+        Snapshot files in a folder matching the pattern, sorted by name
+    """
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if fnmatch.fnmatch(name, pattern))
+
+
+def _kill(process):
+    """ Stops a process together with the worker processes it started. """
+    try:
+        if os.name == "nt":
+            with open(os.devnull, "w") as devnull:
+                subprocess.call(["taskkill", "/F", "/T", "/PID",
+                                 str(process.pid)], stdout=devnull,
+                                stderr=devnull, creationflags=CREATE_NO_WINDOW)
+        elif hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+
+
+def _call(command, timeout):
+    """
+    Runs a command without a console window.
+
+    On POSIX the command runs in a session of its own, so that the worker
+    processes it starts are stopped with it.
+
+    Returns
+    -------
+    int or None
+        Exit code of the command, None when it ran longer than timeout
+        seconds and was stopped
+    """
+    options = {}
+    if os.name == "nt":
+        options["creationflags"] = CREATE_NO_WINDOW
+    elif hasattr(os, "setsid"):
+        options["preexec_fn"] = os.setsid
+    with open(os.devnull, "w") as devnull:
+        process = subprocess.Popen(command, stdout=devnull, stderr=devnull,
+                                   **options)
+        deadline = time.time() + timeout
+        while process.poll() is None:
+            if time.time() > deadline:
+                _kill(process)
+                return None
+            time.sleep(0.05)
+    return process.returncode
+
+
+def helper_timeout(default=HELPER_TIMEOUT):
+    """
+    Returns
+    -------
+    float
+        Seconds from the URSCHECKER_HELPER_TIMEOUT variable, else default
+    """
+    try:
+        timeout = float(os.environ.get(TIMEOUT_VARIABLE, ""))
+    except ValueError:
+        return default
+    return timeout if timeout > 0 else default
+
+
+def usable_python(python):
+    """
+    Runs a short probe in an interpreter.
+
+    A python.exe found on the PATH can be the WindowsApps stub that opens
+    the Microsoft Store instead of running anything, or an interpreter too
+    old for the helper.
+
+    Returns
+    -------
+    bool
+        The interpreter starts, is Python 2.7 or later and has the modules
+        the helper needs
+    """
+    if python not in _probed:
+        try:
+            _probed[python] = _call([python, "-c", PROBE_CODE],
+                                    PROBE_TIMEOUT) == 0
+        except (OSError, ValueError):
+            _probed[python] = False
+    return _probed[python]
+
+
+def find_python():
+    """
+    Returns
+    -------
+    str or None
+        CPython interpreter for the helper process, taken from the
+        URSCHECKER_PYTHON variable or the PATH. Interpreters that fail
+        usable_python are passed over.
+    """
+    python = os.environ.get(PYTHON_VARIABLE)
+    if python:
+        return python if os.path.isfile(python) and usable_python(python) \
+            else None
+    if not sys.platform.startswith("cli") and sys.executable:
+        return sys.executable
+    names = ("python.exe", "python3.exe") if os.name == "nt" \
+        else ("python3", "python")
+    for folder in os.environ.get("PATH", "").split(os.pathsep):
+        for name in names:
+            candidate = os.path.join(folder.strip('"'), name)
+            if os.path.isfile(candidate) and usable_python(candidate):
+                return candidate
+    return None
+
+
+def _init_worker(urs_path):
+    global _urs
+    _urs = read_snapshot(urs_path)
+
+
+def check_model(snapshot_path):
+    """
+    Checks one model snapshot against the URS, runs in a worker.
+
+    Parameters
+    ----------
+    snapshot_path : str
+        Snapshot of the model
+
+    Returns
+    -------
+    tuple
+        (summary row with the SUMMARY_FIELDS, issues) where issues holds
+        the location, grid and level rows of the comparison
+    """
+    start = time.time()
+    summary = dict((field, "") for field in SUMMARY_FIELDS)
+    summary["snapshot"] = os.path.basename(snapshot_path)
+    issues = {"location": [], "grids": [], "levels": []}
+    try:
+        snapshot = read_snapshot(snapshot_path)
+        summary["model"] = snapshot.get("title") or os.path.splitext(
+            summary["snapshot"])[0]
+        result = compare_snapshots(snapshot, _urs,
+                                   snapshot.get("urs_transform"))
+        counts = result.counts()
+        summary.update(counts)
+        summary["grids"] = len(snapshot["grids"])
+        summary["levels"] = len(snapshot["levels"])
+        summary["issues"] = sum(counts.values())
+        issues["location"] = result.location.geo_rows + \
+            result.location.project_rows
+        issues["grids"] = result.grid_issues
+        issues["levels"] = result.level_issues
+    except Exception as err:
+        summary["error"] = "{}: {}".format(err.__class__.__name__, err)
+    summary["seconds"] = round(time.time() - start, 2)
+    return summary, issues
+
+
+def run_batch(urs_path, snapshot_paths, workers=None):
+    """
+    Checks every model snapshot against one URS snapshot.
+
+    Parameters
+    ----------
+    urs_path : str
+        URS snapshot, read once per worker
+    snapshot_paths : list
+        Model snapshots
+    workers : int
+        Number of worker processes, all cores when omitted. With one worker
+        (and always in IronPython) the models are checked in this process.
+
+    Returns
+    -------
+    list
+        (summary, issues) items of check_model sorted by snapshot file
+    """
+    if sys.platform.startswith("cli"):
+        workers = 1
+    else:
+        import multiprocessing
+        workers = min(workers or multiprocessing.cpu_count(),
+                      len(snapshot_paths) or 1)
+    if workers <= 1:
+        _init_worker(urs_path)
+        results = [check_model(path) for path in snapshot_paths]
+    else:
+        pool = multiprocessing.Pool(workers, _init_worker, (urs_path,))
+        try:
+            results = list(pool.imap_unordered(check_model, snapshot_paths))
+        finally:
+            pool.close()
+            pool.join()
+    return sorted(results, key=lambda result: result[0]["snapshot"])
+
+
+def write_summary(path, results):
+    """ Writes the summary rows to a CSV file. """
+    mode = "wb" if sys.version_info[0] < 3 else "w"
+    kwargs = {} if sys.version_info[0] < 3 else {"newline": ""}
+    with open(path, mode, **kwargs) as summary_file:
+        writer = csv.DictWriter(summary_file, SUMMARY_FIELDS)
+        writer.writeheader()
+        for summary, _ in results:
+            if sys.version_info[0] < 3:
+                # The csv module of Python 2 only writes byte strings
+                summary = dict((field, value.encode("utf-8")
+                                if isinstance(value, unicode) else value)
+                               for field, value in summary.items())
+            writer.writerow(summary)
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return "{:.3f}".format(value)
+    return escape(u"{}".format(value))
+
+
+def _table(columns, rows):
+    lines = [u"<table>\n<tr>{}</tr>\n".format(
+        u"".join(u"<th>{}</th>".format(_text(column)) for column in columns))]
+    for row in rows:
+        lines.append(u"<tr>{}</tr>\n".format(
+            u"".join(u"<td>{}</td>".format(_text(cell)) for cell in row)))
+    lines.append(u"</table>\n")
+    return u"".join(lines)
+
+
+def write_matrix(path, results, urs_path):
+    """
+    Writes the matrix report of a batch to an HTML file.
+
+    Parameters
+    ----------
+    path : str
+        HTML file
+    results : list
+        (summary, issues) items of run_batch
+    urs_path : str
+        URS snapshot the models were checked against
+    """
+    with codecs.open(path, "w", "utf-8") as report:
+        write = report.write
+        write(u"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"UTF-8\">\n")
+        write(u"<title>URS Batch Report</title>\n<style>{}</style>\n"
+              u"</head>\n<body>\n<h1>URS Batch Report</h1>\n".format(STYLE))
+        write(u"<p>URS: {}</p>\n<p>Created: {}</p>\n".format(
+            _text(urs_path), _text(time.strftime("%Y-%m-%d %H:%M:%S"))))
+        write(u"<table>\n<tr><th>Model</th>{}<th>Issues</th></tr>\n".format(
+            u"".join(u"<th>{}</th>".format(_text(code))
+                     for code in ERROR_CODES)))
+        for summary, _ in results:
+            write(u"<tr><td><a href=\"#{}\">{}</a></td>".format(
+                _text(summary["snapshot"]), _text(summary["model"] or
+                                                  summary["snapshot"])))
+            if summary["error"]:
+                write(u"<td class=\"fail\" colspan=\"{}\">{}</td></tr>\n"
+                      .format(len(ERROR_CODES) + 1, _text(summary["error"])))
+                continue
+            for code in ERROR_CODES + ("issues",):
+                write(u"<td class=\"{}\">{}</td>".format(
+                    "fail" if summary[code] else "pass", summary[code]))
+            write(u"</tr>\n")
+        write(u"</table>\n")
+        for summary, issues in results:
+            if summary["error"] or not summary["issues"]:
+                continue
+            write(u"<details id=\"{}\">\n<summary>{} ({} issues)</summary>\n"
+                  .format(_text(summary["snapshot"]),
+                          _text(summary["model"]), summary["issues"]))
+            if issues["location"]:
+                write(_table(["LOCATION DATA", "URS VALUE", "MODEL VALUE"],
+                             issues["location"]))
+            if issues["grids"]:
+                write(_table(["ELEMENT ID", "GRID NAME", "ERROR CODE",
+                              "OFFSET (MM)", "ANGLE (DEG)", "EXTENT (MM)"],
+                             issues["grids"]))
+            if issues["levels"]:
+                write(_table(["ELEMENT ID", "LEVEL NAME", "ERROR CODE"],
+                             issues["levels"]))
+            write(u"</details>\n")
+        write(u"</body>\n</html>\n")
+
+
+def write_reports(report_folder, results, urs_path):
+    """
+    Writes the summary CSV and the matrix HTML of a batch.
+
+    Returns
+    -------
+    tuple
+        (summary path, matrix path)
+    """
+    if not os.path.isdir(report_folder):
+        os.makedirs(report_folder)
+    summary_path = os.path.join(report_folder, SUMMARY_FILE)
+    matrix_path = os.path.join(report_folder, MATRIX_FILE)
+    write_summary(summary_path, results)
+    write_matrix(matrix_path, results, urs_path)
+    return summary_path, matrix_path
+
+
+def print_summary(results):
+    row = u"{:<30} {:>6} {:>6} {:>8} {:>7} {:>7} {:>7} {:>8}"
+    print(row.format("Model", "Grids", "Levels", "Location", "Grid",
+                     "Level", "Issues", "Seconds"))
+    for summary, issues in results:
+        if summary["error"]:
+            print(u"{:<30} {}".format(summary["snapshot"][-30:],
+                                     summary["error"]))
+            continue
+        print(row.format(summary["model"][-30:], summary["grids"],
+                         summary["levels"], len(issues["location"]) and
+                         "FAIL" or "ok", len(issues["grids"]),
+                         len(issues["levels"]), summary["issues"],
+                         summary["seconds"]))
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("urs", help="URS snapshot file")
+    parser.add_argument("snapshots", help="folder of model snapshot files")
+    parser.add_argument("reports", help="folder to write the reports to")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--pattern", default="*.json",
+                        help="file name pattern of the model snapshots")
+    args = parser.parse_args(argv)
+    urs_path = os.path.abspath(args.urs)
+    snapshot_paths = [path for path in find_snapshots(args.snapshots,
+                                                      args.pattern)
+                      if os.path.abspath(path) != urs_path]
+    if not snapshot_paths:
+        print("No snapshots matching {} in {}".format(args.pattern,
+                                                      args.snapshots))
+        return 2
+    start = time.time()
+    results = run_batch(urs_path, snapshot_paths, args.workers)
+    summary_path, matrix_path = write_reports(args.reports, results,
+                                              urs_path)
+    print_summary(results)
+    print("{} models checked in {:.1f}s, report: {}".format(
+        len(results), time.time() - start, matrix_path))
+    return 1 if any(summary["error"] for summary, _ in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
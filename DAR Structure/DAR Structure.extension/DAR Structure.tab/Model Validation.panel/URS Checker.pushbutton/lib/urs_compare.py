@@ -0,0 +1,153 @@
+""" Module to compare the snapshot of a document with the URS snapshot
+
+Runs the location, grid and level checks of the URS Checker on snapshots
+(see urs_snapshot), so the same comparison serves the live check in Revit
+and the batch check of many models outside of it.
+"""
+#pylint: disable=invalid-name,superfluous-parens
+from datum_utils import match_datums, record_name
+from grid_utils import (
+    ANGLE_INCORRECT, EXTENT_INCORRECT, LOCATION_INCORRECT, grid_deviations,
+    tolerance_settings)
+from grid_index import RENAMED, pair_renamed
+from location_utils import compare_locations
+
+# Error codes besides the grid deviation codes of grid_utils
+LOCATION_MISMATCH = "LOCATION MISMATCH"
+GRID_MISSING_IN_ACTIVE = "GRID MISSING IN ACTIVE DOCUMENT"
+GRID_MISSING_IN_URS = "GRID MISSING IN URS DOCUMENT"
+LEVEL_MISSING_IN_ACTIVE = "LEVEL MISSING IN ACTIVE DOCUMENT"
+LEVEL_MISSING_IN_URS = "LEVEL MISSING IN URS DOCUMENT"
+LEVEL_LOCATION_INCORRECT = "LEVEL LOCATION INCORRECT"
+
+# All error codes in report order
+ERROR_CODES = (LOCATION_MISMATCH, GRID_MISSING_IN_ACTIVE, GRID_MISSING_IN_URS,
+               RENAMED, LOCATION_INCORRECT, ANGLE_INCORRECT, EXTENT_INCORRECT,
+               LEVEL_MISSING_IN_ACTIVE, LEVEL_MISSING_IN_URS,
+               LEVEL_LOCATION_INCORRECT)
+
+
+class URSComparison:
+    """
+    Outcome of comparing a document with the URS.
+
+    Attributes
+    ----------
+    location : LocationCheck
+        Location comparison, see location_utils
+    grid_issues : list
+        [element id, grid name, error code, offset mm, angle degrees,
+        extent mm] rows, the measures are None for missing grids. Ids of
+        missing grids are URS element ids.
+    level_issues : list
+        [element id, level name, error code] rows
+
+    Methods
+    -------
+    counts()
+        Number of issues per error code
+    """
+    def __init__(self, location, grid_issues, level_issues):
+        self.location = location
+        self.grid_issues = grid_issues
+        self.level_issues = level_issues
+
+    def counts(self):
+        """
+        Returns
+        -------
+        dict
+            Error code -> number of issues, for all ERROR_CODES
+        """
+        counts = dict((code, 0) for code in ERROR_CODES)
+        counts[LOCATION_MISMATCH] = int(self.location.failed)
+        for row in self.grid_issues + self.level_issues:
+            counts[row[2]] += 1
+        return counts
+
+
+def compare_grids(active_grids, urs_grids, transform=None, tolerances=None):
+    """
+    Compares grid records.
+
+    Parameters
+    ----------
+    active_grids : list
+        Grid records of the document
+    urs_grids : list
+        Grid records of the URS
+    transform : tuple
+        Transform from URS to document coordinates, see
+        grid_utils.transform_data
+    tolerances : Tolerances
+        tolerance_settings() when omitted
+
+    Returns
+    -------
+    list
+        Issue rows, see URSComparison.grid_issues
+    """
+    tolerances = tolerances or tolerance_settings()
+    match = match_datums(active_grids, urs_grids, record_name)
+    renamed, missing, extra = pair_renamed(match.missing, match.extra,
+                                           transform)
+    issues = [[grid["id"], grid["name"], GRID_MISSING_IN_ACTIVE, None, None,
+               None] for grid in missing]
+    issues += [[grid["id"], grid["name"], GRID_MISSING_IN_URS, None, None,
+                None] for grid in extra]
+    for deviation in renamed:
+        issues.append([deviation.active["id"], "{} (URS: {})".format(
+            deviation.active["name"], deviation.urs["name"]), RENAMED,
+                       deviation.offset, deviation.angle, deviation.extent])
+    for deviation in grid_deviations(match.pairs, transform):
+        for code in deviation.errors(tolerances):
+            issues.append([deviation.active["id"], deviation.active["name"],
+                           code, deviation.offset, deviation.angle,
+                           deviation.extent])
+    return issues
+
+
+def compare_levels(active_levels, urs_levels):
+    """
+    Compares level records by name and elevation as shown in the documents.
+
+    Returns
+    -------
+    list
+        Issue rows, see URSComparison.level_issues
+    """
+    match = match_datums(active_levels, urs_levels, record_name)
+    issues = [[level["id"], level["name"], LEVEL_MISSING_IN_ACTIVE]
+              for level in match.missing]
+    issues += [[level["id"], level["name"], LEVEL_MISSING_IN_URS]
+               for level in match.extra]
+    issues += [[active["id"], active["name"], LEVEL_LOCATION_INCORRECT]
+               for active, urs in match.pairs
+               if active["elevation_text"] != urs["elevation_text"]]
+    return issues
+
+
+def compare_snapshots(active, urs, transform=None, tolerances=None):
+    """
+    Runs the location, grid and level checks on two snapshots.
+
+    Parameters
+    ----------
+    active : dict
+        Snapshot of the document to check
+    urs : dict
+        Snapshot of the URS
+    transform : tuple
+        Transform from URS to document coordinates, see
+        grid_utils.transform_data
+    tolerances : Tolerances
+        Grid tolerances, tolerance_settings() when omitted
+
+    Returns
+    -------
+    URSComparison
+    """
+    return URSComparison(
+        compare_locations(active["location"], urs["location"]),
+        compare_grids(active["grids"], urs["grids"], transform, tolerances),
+        compare_levels(active["levels"], urs["levels"]))
@@ -0,0 +1,225 @@
+""" Module to snapshot the datums and location of a document for the URS Checker
+
+A snapshot holds everything the URS Checker compares: grid records, level
+records and the location record of a document, as JSON-ready data. The
+snapshot of the URS link is cached on disk, keyed by the path of the link
+file and stamped with the version of the link document it was collected
+from (Document.GetDocumentVersion). The entry is only used while the link
+loaded in Revit has the same version, so a file saved again after the link
+was loaded cannot be paired with the data of the older link. The URS
+changes a few times per project, so most runs read it from the cache and
+only collect the active document.
+"""
+#pylint: disable=invalid-name,broad-except,superfluous-parens
+import hashlib
+import json
+import os
+import tempfile
+
+from datum_utils import level_record
+from grid_utils import grid_record
+from location_utils import location_record
+
+# Bump when the layout of a snapshot changes
+SNAPSHOT_FORMAT = 1
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("LOCALAPPDATA") or tempfile.gettempdir(),
+    "DAR Structure", "URSCheckerCache")
+
+
+def collect_snapshot(doc):
+    """
+    Collects the grids, levels and location of a document.
+
+    Parameters
+    ----------
+    doc : Autodesk.Revit.DB.Document
+        Active document or URS link document
+
+    Returns
+    -------
+    dict
+        format, path, title, grids (see grid_utils.make_grid), levels (see
+        datum_utils.level_record) and location (see
+        location_utils.location_record)
+    """
+    from Autodesk.Revit.DB import BuiltInCategory, FilteredElementCollector
+
+    def collect(category):
+        return FilteredElementCollector(doc).OfCategory(category) \
+            .WhereElementIsNotElementType().ToElements()
+
+    return {"format": SNAPSHOT_FORMAT,
+            "path": doc.PathName,
+            "title": doc.Title,
+            "grids": [grid_record(grid)
+                      for grid in collect(BuiltInCategory.OST_Grids)],
+            "levels": [level_record(level)
+                       for level in collect(BuiltInCategory.OST_Levels)],
+            "location": location_record(doc)}
+
+
+def _restore(snapshot):
+    # JSON has no tuples, grid end points are compared as tuples
+    for grid in snapshot["grids"]:
+        grid["start"] = tuple(grid["start"])
+        grid["end"] = tuple(grid["end"])
+    return snapshot
+
+
+def write_snapshot(path, snapshot):
+    """ Writes a snapshot to a JSON file. """
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "w") as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(temporary, path)
+
+
+def read_snapshot(path):
+    """
+    Reads a snapshot written by write_snapshot.
+
+    Raises
+    ------
+    ValueError
+        The file is not a snapshot of this format
+    """
+    with open(path) as snapshot_file:
+        snapshot = json.load(snapshot_file)
+    if not isinstance(snapshot, dict) or \
+            snapshot.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError("{} is not a URS Checker snapshot of format {}"
+                         .format(path, SNAPSHOT_FORMAT))
+    return _restore(snapshot)
+
+
+def document_stamp(doc):
+    """
+    Version of a document as loaded in Revit.
+
+    Parameters
+    ----------
+    doc : Autodesk.Revit.DB.Document
+        Link document, e.g. the URS
+
+    Returns
+    -------
+    list or None
+        [version GUID, number of saves], None for documents that were never
+        saved and before Revit 2021 (no DocumentVersion)
+    """
+    try:
+        from Autodesk.Revit.DB import Document
+        version = Document.GetDocumentVersion(doc)
+    except Exception:
+        return None
+    if version is None or not doc.PathName:
+        return None
+    return [str(version.VersionGUID), version.NumberOfSaves]
+
+
+class SnapshotCache:
+    """
+    Disk cache of document snapshots keyed by the path of the document.
+
+    Attributes
+    ----------
+    directory : str
+        Folder holding the cache entries
+    hits : int
+        Snapshots read from the cache
+    misses : int
+        Snapshots collected from the document
+
+    Methods
+    -------
+    snapshot(doc)
+        Returns the snapshot of a document, from the cache when possible
+    """
+    def __init__(self, directory=None):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, path):
+        """ Path of the cache entry for a document path. """
+        digest = hashlib.sha1(path.lower().encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "{}.json".format(digest))
+
+    def load(self, path, stamp):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the document
+        stamp : list
+            document_stamp of the loaded document
+
+        Returns
+        -------
+        dict or None
+            Cached snapshot of the document at path, None when there is no
+            entry or it was collected from another version of the document
+        """
+        entry = self.entry_path(path)
+        if stamp is None or not os.path.exists(entry):
+            return None
+        try:
+            snapshot = read_snapshot(entry)
+        except Exception:
+            # Unreadable entries are collected again
+            return None
+        if snapshot.get("stamp") != stamp or snapshot.get("path") != path:
+            return None
+        return snapshot
+
+    def save(self, snapshot, stamp):
+        """
+        Stores a snapshot under the path of its document.
+
+        Parameters
+        ----------
+        snapshot : dict
+            Snapshot collected from the document
+        stamp : list
+            document_stamp of the document the snapshot was collected
+            from, nothing is stored without it
+        """
+        if stamp is None:
+            return
+        snapshot["stamp"] = stamp
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        write_snapshot(self.entry_path(snapshot["path"]), snapshot)
+
+    def snapshot(self, doc):
+        """
+        Snapshot of a document, collected only when the loaded version of
+        the document is not the cached one.
+
+        Parameters
+        ----------
+        doc : Autodesk.Revit.DB.Document
+            Link document, e.g. the URS
+
+        Returns
+        -------
+        dict
+            See collect_snapshot
+        """
+        stamp = document_stamp(doc)
+        snapshot = self.load(doc.PathName, stamp)
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+        self.misses += 1
+        snapshot = collect_snapshot(doc)
+        try:
+            self.save(snapshot, stamp)
+        except (IOError, OSError):
+            # A read-only cache folder only costs the next run
+            pass
+        return snapshot
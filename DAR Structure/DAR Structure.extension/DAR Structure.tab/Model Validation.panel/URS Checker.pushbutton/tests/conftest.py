@@ -0,0 +1,84 @@
+""" Fixtures of the URS Checker tests
+
+The tests run headless on CPython on grid, level and location records as
+they are read from Revit into a snapshot.
+
+Usage:
+    python -m pytest tests
+"""
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import math
+import os
+import random
+import sys
+
+import pytest
+
+BUNDLE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BUNDLE, "lib"))
+
+import grid_utils  # noqa: E402
+from grid_utils import make_grid  # noqa: E402
+
+# Grids of the random grid layouts
+GRID_COUNT = 300
+
+# Angle (degrees) and origin of the URS link instance
+LINK_ANGLE = 30.0
+LINK_ORIGIN = (3000.0, -2000.0, 0.0)
+
+
+@pytest.fixture(params=["numpy", "python"])
+def grid_mode(request, monkeypatch):
+    """ Runs a test with NumPy and again with the pure Python fallback. """
+    if request.param == "numpy":
+        if not grid_utils.available():
+            pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(grid_utils, "numpy", None)
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def transform():
+    """ Transform of a rotated and moved URS link instance. """
+    angle = math.radians(LINK_ANGLE)
+    return (LINK_ORIGIN, (math.cos(angle), math.sin(angle), 0.0),
+            (-math.sin(angle), math.cos(angle), 0.0), (0.0, 0.0, 1.0))
+
+
+@pytest.fixture(scope="session")
+def urs_grids():
+    """ Random grid records of the URS in link coordinates. """
+    generator = random.Random(1)
+    grids = []
+    for index in range(GRID_COUNT):
+        x = generator.uniform(-500.0, 500.0)
+        y = generator.uniform(-500.0, 500.0)
+        angle = generator.choice([0.0, math.pi / 2, math.pi - 1e-4,
+                                  generator.uniform(0.0, math.pi)])
+        length = generator.uniform(20.0, 300.0)
+        grids.append(make_grid(
+            1000 + index, "G{}".format(index), (x, y, 0.0),
+            (x + length * math.cos(angle), y + length * math.sin(angle),
+             0.0)))
+    return grids
+
+
+@pytest.fixture
+def urs():
+    """ Snapshot of a small URS document, see urs_snapshot. """
+    site = {"Elevation": 0.0, "GeoCoordinateSystemDefinition": "",
+            "GeoCoordinateSystemId": "", "Latitude": 0.9, "Longitude": 0.1,
+            "PlaceName": "Site", "TimeZone": 0.0, "WeatherStationName": ""}
+    return {"format": 1, "path": "C:/URS.rvt", "title": "URS",
+            "grids": [make_grid(index, "G{}".format(index),
+                                (index * 20.0, 0.0, 0.0),
+                                (index * 20.0, 100.0, 0.0))
+                      for index in range(10)],
+            "levels": [{"id": 100 + index, "name": "L{}".format(index),
+                        "elevation": index * 10.0,
+                        "elevation_text": str(index * 3048)}
+                       for index in range(3)],
+            "location": {"north_south": 0.0, "east_west": 0.0,
+                         "elevation": 0.0, "angle": 0.0, "site": site}}
@@ -0,0 +1,76 @@
+""" Tests of matching datums by name in datum_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import copy
+import random
+
+from datum_utils import (
+    datum_name, id_value, index_by_name, match_datums, record_name)
+
+
+class Datum:
+    """ Stands in for a Revit grid or level, counting Name lookups. """
+    lookups = 0
+
+    def __init__(self, name):
+        self._name = name
+
+    @property
+    def Name(self):
+        Datum.lookups += 1
+        return self._name
+
+
+class ElementId:
+    """ Stands in for an ElementId of Revit before 2024. """
+    def __init__(self, value):
+        self.IntegerValue = value
+
+
+def _naive(active, urs, name):
+    """ Pairwise matching as the URS Checker did it before. """
+    active_names = [name(datum) for datum in active]
+    urs_names = [name(datum) for datum in urs]
+    return ([datum for datum in urs if name(datum) not in active_names],
+            [datum for datum in active if name(datum) not in urs_names],
+            [(datum, other) for datum in active for other in urs
+             if name(datum) == name(other)])
+
+
+def test_first_datum_of_a_name_is_kept():
+    first, second = Datum("A"), Datum("A")
+    index = index_by_name([first, second, Datum("B")])
+    assert sorted(index) == ["A", "B"] and index["A"] is first
+    assert datum_name(first) == "A"
+
+
+def test_matches_agree_with_pairwise_matching(urs_grids):
+    generator = random.Random(2)
+    active = copy.deepcopy(urs_grids)
+    generator.shuffle(active)
+    del active[:25]
+    for grid in active[:10]:
+        grid["name"] += "-new"
+    match = match_datums(active, urs_grids, record_name)
+    missing, extra, pairs = _naive(active, urs_grids, record_name)
+    assert match.missing == missing and len(missing) == 35
+    assert match.extra == extra and len(extra) == 10
+    assert match.pairs == pairs and len(pairs) == len(active) - 10
+
+
+def test_names_are_read_once_per_datum():
+    active = [Datum(name) for name in ("L1", "L2", "L3")]
+    urs = [Datum(name) for name in ("L2", "L3", "L4", "L5")]
+    Datum.lookups = 0
+    match = match_datums(active, urs)
+    assert Datum.lookups == len(active) + len(urs)
+    assert [datum.Name for datum in match.missing] == ["L4", "L5"]
+    assert [datum.Name for datum in match.extra] == ["L1"]
+    assert [(one.Name, other.Name) for one, other in match.pairs] == \
+        [("L2", "L2"), ("L3", "L3")]
+
+
+def test_id_values():
+    assert id_value(ElementId(42)) == 42
+    newer = ElementId(7)
+    newer.Value = 2 ** 40
+    assert id_value(newer) == 2 ** 40
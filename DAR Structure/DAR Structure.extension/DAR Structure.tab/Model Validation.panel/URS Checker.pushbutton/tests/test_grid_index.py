@@ -0,0 +1,111 @@
+""" Tests of pairing renamed grids through the index of grid_index """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import math
+import random
+
+from grid_utils import grid_deviations, make_grid, move_grid
+from grid_index import (
+    RENAME_ANGLE_TOLERANCE, RENAME_OFFSET_TOLERANCE, GridIndex, line_key,
+    overlap, pair_renamed)
+
+
+def _renamed(urs_grids, transform):
+    """ Active grids of all URS grids, renamed and slightly off. """
+    generator = random.Random(2)
+    active = []
+    for grid in urs_grids:
+        moved = move_grid(grid, transform)
+        angle = math.radians(generator.uniform(-0.3, 0.3))
+        offset = generator.uniform(0.0, 0.1)
+        x = (moved["start"][0] + moved["end"][0]) / 2.0
+        y = (moved["start"][1] + moved["end"][1]) / 2.0
+        direction = math.atan2(moved["end"][1] - moved["start"][1],
+                               moved["end"][0] - moved["start"][0]) + angle
+        half = math.hypot(moved["end"][0] - moved["start"][0],
+                          moved["end"][1] - moved["start"][1]) / 2.0
+        x -= offset * math.sin(direction)
+        y += offset * math.cos(direction)
+        active.append(make_grid(
+            grid["id"] - 1000, "A" + grid["name"],
+            (x - half * math.cos(direction), y - half * math.sin(direction),
+             0.0),
+            (x + half * math.cos(direction), y + half * math.sin(direction),
+             0.0)))
+    generator.shuffle(active)
+    return active
+
+
+def test_renamed_grids_are_paired(grid_mode, urs_grids, transform):
+    urs = urs_grids[:-5]
+    active = _renamed(urs_grids, transform)[5:]
+    far = make_grid(1, "Far", (9000.0, 9000.0, 0.0), (9000.0, 9100.0, 0.0))
+    renamed, missing, extra = pair_renamed(urs, active + [far], transform)
+    pairs = dict((deviation.active["name"], deviation.urs["name"])
+                 for deviation in renamed)
+    names = set(grid["name"] for grid in urs)
+    assert set(pairs) == set(grid["name"] for grid in active
+                             if grid["name"][1:] in names)
+    # Random grids may lie on about the same line, either pairing is right
+    shared = set()
+    for deviation in grid_deviations([(grid, other) for grid in urs
+                                      for other in urs if grid is not other]):
+        if deviation.offset <= 2 * RENAME_OFFSET_TOLERANCE and \
+                deviation.angle <= 2 * RENAME_ANGLE_TOLERANCE:
+            shared.add("A" + deviation.active["name"])
+    assert all(pairs[name] == name[1:] for name in pairs
+               if name not in shared)
+    assert len(shared) < len(pairs) / 10
+    # Pairs refer to the URS records as given, not to the moved copies
+    assert all(any(deviation.urs is grid for grid in urs)
+               for deviation in renamed)
+    assert len(renamed) + len(missing) == len(urs)
+    assert len(renamed) + len(extra) == len(active) + 1 and far in extra
+    assert all(deviation.offset <= RENAME_OFFSET_TOLERANCE and
+               deviation.angle <= RENAME_ANGLE_TOLERANCE
+               for deviation in renamed)
+
+
+def test_index_finds_every_close_line(urs_grids, transform):
+    active = _renamed(urs_grids, transform)
+    moved = [move_grid(grid, transform) for grid in urs_grids]
+    index = GridIndex(moved)
+    found = set((id(grid), id(other)) for grid in active
+                for other in index.candidates(grid))
+    # Every pair within the tolerances, as found comparing all pairs
+    for deviation in grid_deviations([(grid, other) for grid in active
+                                      for other in moved]):
+        if deviation.offset <= RENAME_OFFSET_TOLERANCE and \
+                deviation.angle <= RENAME_ANGLE_TOLERANCE:
+            assert (id(deviation.active), id(deviation.urs)) in found
+    assert len(found) < len(active) * len(moved) / 10
+
+
+def test_lines_near_0_and_180_degrees_are_the_same():
+    grid = make_grid(1, "A", (0.0, 0.0, 0.0), (100.0, 0.0001, 0.0))
+    turned = make_grid(2, "B", (100.0, -0.0001, 0.0), (0.0, 0.0001, 0.0))
+    assert line_key(grid)[0] < 1.0 and line_key(turned)[0] > 179.0
+    index = GridIndex([turned, make_grid(3, "C", (0.0, 10.0, 0.0),
+                                         (100.0, 10.0, 0.0))])
+    assert index.candidates(grid) == [turned]
+
+
+def test_grids_of_zero_length_are_not_indexed():
+    point = make_grid(1, "Point", (1.0, 1.0, 0.0), (1.0, 1.0, 0.0))
+    assert line_key(point) is None
+    index = GridIndex([point])
+    assert not index.cells and index.candidates(point) == []
+    assert pair_renamed([], [point]) == ([], [], [point])
+
+
+def test_collinear_grids_only_pair_when_they_overlap(grid_mode):
+    urs = make_grid(1, "G1", (0.0, 0.0, 0.0), (0.0, 100.0, 0.0))
+    far = make_grid(2, "X1", (0.0, 3000.0, 0.0), (0.0, 3100.0, 0.0))
+    after = make_grid(3, "X2", (0.0, 100.0, 0.0), (0.0, 200.0, 0.0))
+    assert pair_renamed([urs], [far, after]) == ([], [urs], [far, after])
+    shifted = make_grid(4, "X3", (0.0, 150.0, 0.0), (0.0, 50.0, 0.0))
+    longer = make_grid(5, "X4", (0.0, -50.0, 0.0), (0.0, 150.0, 0.0))
+    for active in (shifted, longer):
+        assert overlap(active, urs) and overlap(urs, active)
+        renamed, missing, extra = pair_renamed([urs], [far, active])
+        assert [deviation.active for deviation in renamed] == [active]
+        assert (missing, extra) == ([], [far])
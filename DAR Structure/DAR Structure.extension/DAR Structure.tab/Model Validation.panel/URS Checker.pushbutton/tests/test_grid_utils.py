@@ -0,0 +1,108 @@
+""" Tests of measuring grid deviations in grid_utils """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import math
+
+import pytest
+
+import grid_utils
+from grid_utils import (
+    ANGLE_INCORRECT, EXTENT_INCORRECT, LOCATION_INCORRECT, MM_PER_FOOT,
+    Tolerances, grid_deviations, make_grid, move_grid, tolerance_settings)
+
+
+def _direction(record):
+    dx = record["end"][0] - record["start"][0]
+    dy = record["end"][1] - record["start"][1]
+    length = math.hypot(dx, dy)
+    return dx / length, dy / length
+
+
+def _shifted(record, offset):
+    """ Grid moved sideways by an offset, internal units. """
+    dx, dy = _direction(record)
+    return make_grid(record["id"], record["name"],
+                     (record["start"][0] - dy * offset,
+                      record["start"][1] + dx * offset, 0.0),
+                     (record["end"][0] - dy * offset,
+                      record["end"][1] + dx * offset, 0.0))
+
+
+def _turned(record, degrees):
+    """ Grid turned about its middle. """
+    angle = math.radians(degrees)
+    x = (record["start"][0] + record["end"][0]) / 2.0
+    y = (record["start"][1] + record["end"][1]) / 2.0
+
+    def turn(point):
+        px, py = point[0] - x, point[1] - y
+        return (x + px * math.cos(angle) - py * math.sin(angle),
+                y + px * math.sin(angle) + py * math.cos(angle), 0.0)
+    return make_grid(record["id"], record["name"], turn(record["start"]),
+                     turn(record["end"]))
+
+
+def _measures(deviations):
+    return [(deviation.offset, deviation.angle, deviation.extent)
+            for deviation in deviations]
+
+
+def test_moved_urs_grids_do_not_deviate(grid_mode, urs_grids, transform):
+    active = [move_grid(grid, transform) for grid in urs_grids]
+    deviations = grid_deviations(list(zip(active, urs_grids)), transform)
+    assert max(max(measure) for measure in _measures(deviations)) < 1e-6
+    # Reversed URS grids lie on the same line
+    reversed_grids = [make_grid(grid["id"], grid["name"], grid["end"],
+                                grid["start"]) for grid in urs_grids]
+    deviations = grid_deviations(list(zip(active, reversed_grids)),
+                                 transform)
+    assert max(max(measure) for measure in _measures(deviations)) < 1e-6
+
+
+def test_known_deviations(grid_mode, urs_grids, transform):
+    urs = urs_grids[0]
+    moved = move_grid(urs, transform)
+    longer = make_grid(1, "G0", moved["start"], tuple(
+        value + step * 0.1 for value, step in
+        zip(moved["end"], _direction(moved) + (0.0,))))
+    pairs = [(_shifted(moved, 1.0), urs), (_turned(moved, 1.0), urs),
+             (longer, urs)]
+    shifted, turned, extended = grid_deviations(pairs, transform)
+    assert shifted.offset == pytest.approx(MM_PER_FOOT)
+    assert turned.angle == pytest.approx(1.0)
+    assert turned.offset == pytest.approx(0.0, abs=1e-6)
+    assert extended.extent == pytest.approx(0.1 * MM_PER_FOOT)
+    tolerances = Tolerances()
+    assert shifted.errors(tolerances) == [LOCATION_INCORRECT]
+    assert turned.errors(tolerances) == [ANGLE_INCORRECT]
+    assert extended.errors(tolerances) == [EXTENT_INCORRECT]
+
+
+def test_grids_of_zero_length_deviate_infinitely(grid_mode, urs_grids):
+    point = make_grid(1, "Point", (1.0, 1.0, 0.0), (1.0, 1.0, 0.0))
+    deviation = grid_deviations([(point, urs_grids[0])])[0]
+    assert _measures([deviation]) == [(float("inf"),) * 3]
+    assert grid_deviations([]) == []
+
+
+def test_numpy_and_python_agree(urs_grids, transform, monkeypatch):
+    if not grid_utils.available():
+        pytest.skip("NumPy is not installed")
+    active = [_turned(_shifted(move_grid(grid, transform), 0.002 * index),
+                      0.001 * index)
+              for index, grid in enumerate(urs_grids)]
+    pairs = list(zip(active, urs_grids))
+    expected = _measures(grid_deviations(pairs, transform))
+    monkeypatch.setattr(grid_utils, "numpy", None)
+    for measures, fallback in zip(expected, _measures(
+            grid_deviations(pairs, transform))):
+        assert measures == pytest.approx(fallback, abs=1e-6)
+
+
+def test_tolerance_settings(monkeypatch):
+    monkeypatch.setenv(grid_utils.OFFSET_TOLERANCE_VARIABLE, "2.5")
+    monkeypatch.setenv(grid_utils.ANGLE_TOLERANCE_VARIABLE, "-1")
+    monkeypatch.setenv(grid_utils.EXTENT_TOLERANCE_VARIABLE, "wide")
+    tolerances = tolerance_settings()
+    assert tolerances.offset == 2.5
+    assert tolerances.angle == grid_utils.ANGLE_TOLERANCE
+    assert tolerances.extent == grid_utils.EXTENT_TOLERANCE
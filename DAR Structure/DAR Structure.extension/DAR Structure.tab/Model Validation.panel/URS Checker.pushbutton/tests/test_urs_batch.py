@@ -0,0 +1,119 @@
+""" Tests of checking many model snapshots against the URS in urs_batch """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import copy
+import csv
+import io
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+import urs_batch
+from grid_utils import move_grid
+from urs_compare import GRID_MISSING_IN_ACTIVE, LEVEL_LOCATION_INCORRECT
+from urs_snapshot import write_snapshot
+
+
+@pytest.fixture
+def folders(urs, transform, tmp_path):
+    """ (URS snapshot, folder of model snapshots, report folder) """
+    models = tmp_path.joinpath("models")
+    models.mkdir()
+    urs_path = str(tmp_path.joinpath("urs.json"))
+    write_snapshot(urs_path, urs)
+    for index in range(6):
+        model = copy.deepcopy(urs)
+        model["title"] = u"Model <{}> é".format(index)
+        # Odd models are placed through the transform of their URS link
+        if index % 2:
+            model["grids"] = [move_grid(grid, transform)
+                              for grid in model["grids"]]
+            model["urs_transform"] = transform
+        if index >= 4:
+            del model["grids"][index]
+            model["levels"][2]["elevation_text"] = "1"
+        write_snapshot(str(models.joinpath("{:03}.json".format(index))),
+                       model)
+    with open(str(models.joinpath("broken.json")), "w") as broken:
+        broken.write("{}")
+    return urs_path, str(models), str(tmp_path.joinpath("reports"))
+
+
+def _rows(results):
+    return [dict((field, value) for field, value in summary.items()
+                 if field != "seconds") for summary, _ in results]
+
+
+def test_models_are_checked(folders):
+    urs_path, models, _ = folders
+    results = urs_batch.run_batch(urs_path, urs_batch.find_snapshots(models),
+                                  workers=1)
+    assert [summary["snapshot"] for summary, _ in results] == \
+        ["000.json", "001.json", "002.json", "003.json", "004.json",
+         "005.json", "broken.json"]
+    issues = [summary["issues"] for summary, _ in results[:-1]]
+    assert issues == [0, 0, 0, 0, 2, 2]
+    assert results[4][0][GRID_MISSING_IN_ACTIVE] == 1
+    assert results[5][0][LEVEL_LOCATION_INCORRECT] == 1
+    assert "not a URS Checker snapshot" in results[-1][0]["error"]
+
+
+def test_worker_processes_agree(folders):
+    urs_path, models, _ = folders
+    paths = urs_batch.find_snapshots(models)
+    assert _rows(urs_batch.run_batch(urs_path, paths, workers=2)) == \
+        _rows(urs_batch.run_batch(urs_path, paths, workers=1))
+
+
+def test_reports(folders):
+    urs_path, models, reports = folders
+    # The URS snapshot in the model folder is not checked as a model
+    os.rename(urs_path, os.path.join(models, "urs.json"))
+    urs_path = os.path.join(models, "urs.json")
+    assert urs_batch.main([urs_path, models, reports, "--workers", "1"]) == 1
+    with io.open(os.path.join(reports, urs_batch.SUMMARY_FILE),
+                 newline="") as summary_file:
+        rows = list(csv.DictReader(summary_file))
+    assert [row["snapshot"] for row in rows][-1] == "broken.json"
+    assert len(rows) == 7
+    with io.open(os.path.join(reports, urs_batch.MATRIX_FILE),
+                 encoding="utf-8") as matrix:
+        html = matrix.read()
+    assert u"Model &lt;4&gt; é" in html and "<Model" not in html
+    assert html.count("<details") == 2
+    assert urs_batch.main([urs_path, reports, reports]) == 2
+
+
+def test_unusable_interpreters_are_passed_over(monkeypatch, tmp_path):
+    assert urs_batch.usable_python(sys.executable)
+    assert not urs_batch.usable_python(str(tmp_path.joinpath("python")))
+    monkeypatch.setenv(urs_batch.PYTHON_VARIABLE,
+                       str(tmp_path.joinpath("python")))
+    assert urs_batch.find_python() is None
+    monkeypatch.setenv(urs_batch.PYTHON_VARIABLE, sys.executable)
+    assert urs_batch.find_python() == sys.executable
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Shell script helper")
+def test_hanging_helper_is_stopped(tmp_path):
+    helper = tmp_path.joinpath("helper")
+    child = tmp_path.joinpath("child")
+    helper.write_text(u"#!/bin/sh\n(sleep 2; touch {})&\nsleep 60\n"
+                      .format(child))
+    helper.chmod(helper.stat().st_mode | stat.S_IEXEC)
+    start = time.time()
+    assert urs_batch._call([str(helper)], 1) is None
+    assert time.time() - start < 10
+    # The processes started by the helper are stopped with it
+    time.sleep(2)
+    assert not child.exists()
+    assert urs_batch._call([sys.executable, "-c", "exit(3)"], 10) == 3
+
+
+def test_helper_timeout_setting(monkeypatch):
+    monkeypatch.setenv(urs_batch.TIMEOUT_VARIABLE, "30")
+    assert urs_batch.helper_timeout() == 30
+    monkeypatch.setenv(urs_batch.TIMEOUT_VARIABLE, "never")
+    assert urs_batch.helper_timeout() == urs_batch.HELPER_TIMEOUT
@@ -0,0 +1,59 @@
+""" Tests of comparing snapshots with the URS in urs_compare """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import copy
+
+from grid_utils import LOCATION_INCORRECT, make_grid, move_grid
+from grid_index import RENAMED
+from urs_compare import (
+    ERROR_CODES, GRID_MISSING_IN_ACTIVE, GRID_MISSING_IN_URS,
+    LEVEL_LOCATION_INCORRECT, LEVEL_MISSING_IN_ACTIVE, LEVEL_MISSING_IN_URS,
+    LOCATION_MISMATCH, compare_grids, compare_snapshots)
+
+
+def _issues(comparison):
+    return dict((code, count) for code, count in comparison.counts().items()
+                if count)
+
+
+def test_same_snapshot_has_no_issues(grid_mode, urs):
+    comparison = compare_snapshots(copy.deepcopy(urs), urs)
+    assert _issues(comparison) == {}
+    assert sorted(comparison.counts()) == sorted(ERROR_CODES)
+
+
+def test_grids_are_compared_in_document_coordinates(grid_mode, urs,
+                                                    transform):
+    active = [move_grid(grid, transform) for grid in urs["grids"]]
+    assert compare_grids(active, urs["grids"], transform) == []
+    misplaced = set(row[1] for row in compare_grids(active, urs["grids"])
+                    if row[2] == LOCATION_INCORRECT)
+    assert misplaced == set(grid["name"] for grid in urs["grids"])
+
+
+def test_grid_and_level_issues(grid_mode, urs):
+    active = copy.deepcopy(urs)
+    grids = active["grids"]
+    # G0 renamed, G1 deleted, G2 moved 1 mm sideways, one grid added
+    grids[0]["name"] = "X0"
+    del grids[1]
+    grids[1] = make_grid(grids[1]["id"], "G2",
+                         (40.0 + 2.0 / 304.8, 0.0, 0.0),
+                         (40.0 + 2.0 / 304.8, 100.0, 0.0))
+    grids.append(make_grid(50, "New", (0.0, 500.0, 0.0),
+                           (100.0, 500.0, 0.0)))
+    active["levels"][0]["name"] = "Ground"
+    active["levels"][1]["elevation_text"] = "3000"
+    active["location"]["north_south"] = 1.0
+    comparison = compare_snapshots(active, urs)
+    assert _issues(comparison) == {
+        LOCATION_MISMATCH: 1, GRID_MISSING_IN_ACTIVE: 1,
+        GRID_MISSING_IN_URS: 1, RENAMED: 1, LOCATION_INCORRECT: 1,
+        LEVEL_MISSING_IN_ACTIVE: 1, LEVEL_MISSING_IN_URS: 1,
+        LEVEL_LOCATION_INCORRECT: 1}
+    rows = dict((row[2], row) for row in comparison.grid_issues)
+    assert rows[RENAMED][1] == "X0 (URS: G0)"
+    # Missing grids are listed with the ids of the URS grids
+    assert rows[GRID_MISSING_IN_ACTIVE][:2] == [1, "G1"]
+    assert rows[GRID_MISSING_IN_URS][1] == "New"
+    assert round(rows[LOCATION_INCORRECT][3], 6) == 2.0
+    assert comparison.location.project_rows[0][1:] == [0.0, 304.8]
@@ -0,0 +1,100 @@
+""" Tests of URS snapshot files and the stamped snapshot cache """
+#pylint: disable=invalid-name,superfluous-parens,redefined-outer-name
+import json
+import sys
+import types
+
+import pytest
+
+import urs_snapshot
+from urs_snapshot import SnapshotCache, read_snapshot, write_snapshot
+
+
+class Version:
+    """ DocumentVersion of a fake document. """
+    def __init__(self, guid, saves):
+        self.VersionGUID = guid
+        self.NumberOfSaves = saves
+
+
+class Document:
+    """ Fake link document, GetDocumentVersion as in the Revit API. """
+    def __init__(self, guid, saves, path="C:/URS.rvt"):
+        self.PathName = path
+        self.version = Version(guid, saves)
+
+    @staticmethod
+    def GetDocumentVersion(doc):
+        return doc.version
+
+
+@pytest.fixture
+def revit(monkeypatch):
+    """ Autodesk.Revit.DB with the Document of the fake documents. """
+    module = types.ModuleType("Autodesk.Revit.DB")
+    module.Document = Document
+    monkeypatch.setitem(sys.modules, "Autodesk",
+                        types.ModuleType("Autodesk"))
+    monkeypatch.setitem(sys.modules, "Autodesk.Revit",
+                        types.ModuleType("Autodesk.Revit"))
+    monkeypatch.setitem(sys.modules, "Autodesk.Revit.DB", module)
+
+
+@pytest.fixture
+def collected(urs, monkeypatch):
+    """ Documents collect_snapshot was called with. """
+    documents = []
+
+    def collect(doc):
+        documents.append(doc)
+        return dict(urs, path=doc.PathName)
+    monkeypatch.setattr(urs_snapshot, "collect_snapshot", collect)
+    return documents
+
+
+def test_round_trip(urs, tmp_path):
+    path = str(tmp_path.joinpath("urs.json"))
+    write_snapshot(path, urs)
+    snapshot = read_snapshot(path)
+    assert snapshot == urs
+    assert isinstance(snapshot["grids"][0]["start"], tuple)
+
+
+def test_other_files_are_refused(urs, tmp_path):
+    path = str(tmp_path.joinpath("urs.json"))
+    for data in ({}, [], dict(urs, format=2)):
+        with open(path, "w") as snapshot_file:
+            json.dump(data, snapshot_file)
+        with pytest.raises(ValueError):
+            read_snapshot(path)
+
+
+def test_cache_is_used_while_the_version_is_loaded(revit, collected,
+                                                   tmp_path):
+    cache = SnapshotCache(str(tmp_path))
+    for doc in (Document("a", 3), Document("a", 3), Document("b", 4),
+                Document("b", 4), Document("a", 3)):
+        cache.snapshot(doc)
+    assert (cache.hits, cache.misses) == (2, 3)
+    assert len(collected) == 3
+    # Another session reads the entry of the loaded version
+    cache = SnapshotCache(str(tmp_path))
+    assert cache.snapshot(Document("a", 3))["stamp"] == ["a", 3]
+    assert cache.hits == 1
+
+
+def test_nothing_is_cached_without_a_stamp(revit, collected, tmp_path):
+    cache = SnapshotCache(str(tmp_path))
+    cache.snapshot(Document("a", 3, path=""))
+    cache.snapshot(Document("a", 3, path=""))
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert not list(tmp_path.iterdir())
+
+
+def test_nothing_is_cached_without_the_revit_api(collected, tmp_path,
+                                                 monkeypatch):
+    monkeypatch.setitem(sys.modules, "Autodesk.Revit.DB", None)
+    cache = SnapshotCache(str(tmp_path))
+    cache.snapshot(Document("a", 3))
+    cache.snapshot(Document("a", 3))
+    assert (cache.hits, cache.misses) == (0, 2)